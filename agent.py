@@ -2,27 +2,28 @@ from typing import Annotated, TypedDict
 
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langgraph.checkpoint.memory import InMemorySaver
 from langgraph.types import interrupt, Command
+from langgraph.config import get_stream_writer
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
 
-from langchain_core.prompts import PromptTemplate
-from langchain_core.runnables import RunnableConfig
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 from langchain.chat_models import init_chat_model
 from langchain.messages import HumanMessage
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 
 from rich.logging import RichHandler
 from rich.prompt import Prompt
 from datetime import datetime
 import logging
 
-import operator
+import asyncio
+import threading
+import time
+from concurrent.futures import as_completed
 import dotenv
-import docker
-import docker.errors
-import tempfile
-import os
 import uuid
 from enum import Enum
 
@@ -30,14 +31,38 @@ from pathlib import Path
 
 dotenv.load_dotenv()
 
-log_dir = Path("logs")
-if not log_dir.exists():
-    log_dir.mkdir()
+from runner import docker_client, render, manim_symbols, release_workspace, RenderTier, output_dir, render_cache, rendering, scheduler
+from preflight import preflight
+from settings import settings
+from llm_cache import LLMCache
+from prompt_templates import load_prompt
+from code_store import CodeStore
+from media import MediaStore
+from checkpointer import DurableSaver
+from patching import CodeEdit, apply_edits
+from log_digest import digest_output
+from metrics import instrument, record_cache_hit, record_cache_miss, record_llm
+from routing import Router
+from prefetch import Prefetcher
 
-file_handler = logging.FileHandler(f"logs/{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.log", encoding="utf-8")
-
-logging.basicConfig(level=logging.INFO, format="[%(name)s] %(message)s", handlers=[RichHandler(), file_handler])
 logger = logging.getLogger("Masim")
+logging_ready = False
+
+# Called by the entry points rather than on import, so only processes that
+# actually run the agent open a log file.
+def setup_logging():
+    global logging_ready
+    if logging_ready:
+        return
+    logging_ready = True
+
+    log_dir = Path("logs")
+    if not log_dir.exists():
+        log_dir.mkdir()
+
+    file_handler = logging.FileHandler(f"logs/{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.log", encoding="utf-8", delay=True)
+
+    logging.basicConfig(level=logging.INFO, format="[%(name)s] %(message)s", handlers=[RichHandler(), file_handler])
 
 class Interruption(Enum):
     PLAN_REVIEW = "plan_review"
@@ -62,11 +87,19 @@ class CodeAnalysis(TypedDict):
     issue: str
     fix: str
 
+# Only the latest code version is read back; a few older ones are kept so a
+# thread's code store refs (and blobs) stop growing once checkpoints are trimmed.
+CODE_HISTORY = 5
+
+def recent_codes(left: list[str], right: list[str]) -> list[str]:
+    return (left + right)[-CODE_HISTORY:]
+
 class State(TypedDict):
     messages: Annotated[list, add_messages]
     plans: list[Plan]
     goal: str
-    codes: Annotated[list[str], operator.add]
+    # sha256 refs into code_store, oldest first
+    codes: Annotated[list[str], recent_codes]
     stdout: str
     stderr: str
     analysis: list[CodeAnalysis]
@@ -77,23 +110,33 @@ class State(TypedDict):
     session_id: str
     human_request: str
     plan_feedback: str
-
-llms = {
-    "nano": init_chat_model("openai:gpt-5-nano"),
-    "mini": init_chat_model("openai:gpt-5-mini")
-}
-
-docker_client = docker.from_env()
+    render_tier: RenderTier
+    preflight_error: str | None
+    speculative_spent: int
+    # Model that wrote the latest fix, credited with code_analyzer's verdict on it
+    fix_model: str | None
+
+# Chat models are created on first use; assigning a key replaces the model.
+class ChatModels(dict):
+    def __init__(self, specs: dict[str, str]):
+        super().__init__()
+        self.specs = specs
+
+    def __missing__(self, name: str):
+        model = self[name] = init_chat_model(self.specs[name])
+        return model
+
+llms = ChatModels({
+    "nano": "openai:gpt-5-nano",
+    "mini": "openai:gpt-5-mini"
+})
 
 def docker_prerequirements(build_image: bool = False):
     if build_image:
         logger.info("Building Docker Image...")
-        docker_client.images.build(path="./sandbox", tag="sandbox:latest", encoding="utf8")
+        docker_client().images.build(path="./sandbox", tag="sandbox:latest", encoding="utf8")
         logger.info("...Done!")
 
-def clean_docker_log(log: str) -> str:
-    return "\n".join(map(lambda line: line.strip(), filter(lambda line: not('\r' in line and ('%|' in line or 'it/s]' in line)), log.split("\n"))))
-
 # ======================
 
 class GoalExtractorResponse(BaseModel):
@@ -105,110 +148,214 @@ class PlanningAgentResponse(BaseModel):
 class CodingAgentResponse(BaseModel):
     code: str
 
+class CodingAgentPatchResponse(BaseModel):
+    edits: list[CodeEdit]
+
 class CodeAnalyzerResponse(BaseModel):
     need_fix: bool
     analysis: list[CodeAnalysis]
 
 # =====================
+
+code_store = CodeStore(Path(settings.checkpoint_db))
+
+def latest_code(state: State) -> str:
+    return code_store.get(state["codes"][-1])
+
+media_store = MediaStore(
+    Path(settings.checkpoint_db),
+    {"output": output_dir, "cache": render_cache.path},
+    quota_bytes=settings.media_quota_mb * 1024 * 1024,
+    ffmpeg=settings.ffmpeg_binary,
+    preview_height=settings.media_preview_height,
+    preview_bitrate=settings.media_preview_bitrate,
+    rendering=rendering,
+)
+
+def kept_attempt(state: State, result: dict) -> dict:
+    if result.get("output_path"):
+        media_store.record_attempt(state["session_id"], result["output_path"])
+    return result
+
+llm_limit = asyncio.Semaphore(settings.llm_concurrency)
+render_limit = asyncio.Semaphore(settings.render_concurrency)
+
+router = Router(
+    overrides=settings.model_overrides,
+    cheap="nano",
+    large="mini",
+    escalate_after=settings.routing_escalate_after,
+    simple_max_issues=settings.routing_simple_max_issues,
+    min_success_rate=settings.routing_min_success_rate,
+    min_samples=settings.routing_min_samples,
+)
+
+prefetcher = Prefetcher(scheduler, enabled=settings.prefetch_enabled, max_expressions=settings.prefetch_max_expressions)
+
+# Formulas in the plan go into the Tex cache while coding_agent writes the script.
+def prefetch_plans(state: State, plans: list[Plan]) -> list[Plan]:
+    prefetcher.precompile(state["session_id"], [text for plan in plans for text in (plan["title"], plan["description"])])
+    return plans
+
+llm_cache = LLMCache(Path(settings.llm_cache_path), settings.llm_cache_ttl, settings.llm_cache_max_entries)
+
+def cache_key(node: str | None, model: str, schema: type[BaseModel], value) -> str | None:
+    if not settings.llm_cache_enabled or node not in settings.llm_cache_nodes:
+        return None
+    return llm_cache.key(getattr(llms[model], "model_name", model), value.to_string(), schema)
+
+# Structured output with include_raw, so token usage can be recorded before
+# handing back the parsed response.
+def parsed(output: dict):
+    record_llm(output["raw"].usage_metadata)
+    if output["parsing_error"] is not None:
+        raise output["parsing_error"]
+    return output["parsed"]
+
+def ask(model: str, schema: type[BaseModel], value, node: str | None = None):
+    key = cache_key(node, model, schema, value)
+    if key is not None and (cached := llm_cache.get(node, key, schema)) is not None: # type: ignore
+        record_cache_hit()
+        return cached
+    if key is not None:
+        record_cache_miss()
+
+    llm = llms[model].with_structured_output(method="json_mode", schema=schema, include_raw=True)
+    started = time.perf_counter()
+    response = parsed(llm.invoke(value))
+    router.record_call(model, time.perf_counter() - started)
+    if key is not None:
+        llm_cache.put(node, key, response) # type: ignore
+    return response # type: ignore
+
+async def aask(model: str, schema: type[BaseModel], value, node: str | None = None):
+    key = cache_key(node, model, schema, value)
+    if key is not None and (cached := await asyncio.to_thread(llm_cache.get, node, key, schema)) is not None: # type: ignore
+        record_cache_hit()
+        return cached
+    if key is not None:
+        record_cache_miss()
+
+    llm = llms[model].with_structured_output(method="json_mode", schema=schema, include_raw=True)
+    async with llm_limit:
+        started = time.perf_counter()
+        response = parsed(await llm.ainvoke(value))
+        router.record_call(model, time.perf_counter() - started)
+    if key is not None:
+        await asyncio.to_thread(llm_cache.put, node, key, response) # type: ignore
+    return response # type: ignore
+
+async def arender(code: str, tier: RenderTier, on_progress=None, cancel: threading.Event | None = None, workspace: str | None = None) -> dict:
+    async with render_limit:
+        return await asyncio.to_thread(render, code, tier, on_progress, cancel, workspace)
+
+# Forwards manim's per-animation progress to `stream_mode="custom"` consumers.
+def render_progress():
+    writer = get_stream_writer()
+    return lambda progress: writer({"render_progress": progress})
+
+# =====================
+
+def goal_extractor_prompt(state: State):
+    template = load_prompt("goal_extractor")
+    return template.invoke({"message": state["messages"][0]})
+
 def goal_extractor(state: State):
-    template = PromptTemplate.from_file("./prompts/goal_extractor.md", encoding="utf8")
-    value = template.invoke({"message": state["messages"][0]})
+    prefetcher.warm(state["session_id"])
+    response = ask(router.model("goal_extractor"), GoalExtractorResponse, goal_extractor_prompt(state), node="goal_extractor")
+    return { "goal" : response.goal }
 
-    llm = llms["nano"].with_structured_output(method="json_mode", schema=GoalExtractorResponse)
-    response: GoalExtractorResponse = llm.invoke(value) # type: ignore
-    goal = response.goal
+async def agoal_extractor(state: State):
+    prefetcher.warm(state["session_id"])
+    response = await aask(router.model("goal_extractor"), GoalExtractorResponse, goal_extractor_prompt(state), node="goal_extractor")
+    return { "goal" : response.goal }
 
-    return { "goal" : goal }
+def planing_agent_prompt(state: State):
+    template = load_prompt("planning_agent")
+    return template.invoke({"messages": state["messages"], "goal": state["goal"]})
 
 def planing_agent(state: State):
-    template = PromptTemplate.from_file("./prompts/planning_agent.md", encoding="utf8")
-    value = template.invoke({"messages": state["messages"], "goal": state["goal"]})
+    response = ask(router.model("planning_agent"), PlanningAgentResponse, planing_agent_prompt(state), node="planning_agent")
+    return { "plans" : prefetch_plans(state, response.plans) }
 
-    llm = llms["nano"].with_structured_output(method="json_mode", schema=PlanningAgentResponse)
-    response: PlanningAgentResponse = llm.invoke(value) # type: ignore
-    plans = response.plans
-
-    return { "plans" : plans }
+async def aplaning_agent(state: State):
+    response = await aask(router.model("planning_agent"), PlanningAgentResponse, planing_agent_prompt(state), node="planning_agent")
+    return { "plans" : prefetch_plans(state, response.plans) }
 
 def plan_review(state: State):
     feedback = interrupt(Interruption.PLAN_REVIEW)
     return { "plan_feedback": feedback }
 
+def plan_reviser_prompt(state: State):
+    template = load_prompt("plan_reviser")
+    return template.invoke({"goal": state["goal"], "plans": state["plans"], "feedback": state["plan_feedback"]})
+
 def plan_reviser(state: State):
-    template = PromptTemplate.from_file("./prompts/plan_reviser.md", encoding="utf8")
-    value = template.invoke({"goal": state["goal"], "plans": state["plans"], "feedback": state["plan_feedback"]})
+    response = ask(router.model("plan_reviser"), PlanningAgentResponse, plan_reviser_prompt(state), node="plan_reviser")
+    return { "plans": prefetch_plans(state, response.plans) }
 
-    llm = llms["nano"].with_structured_output(method="json_mode", schema=PlanningAgentResponse)
-    response: PlanningAgentResponse = llm.invoke(value) # type: ignore
-    plans = response.plans
+async def aplan_reviser(state: State):
+    response = await aask(router.model("plan_reviser"), PlanningAgentResponse, plan_reviser_prompt(state), node="plan_reviser")
+    return { "plans": prefetch_plans(state, response.plans) }
 
-    return { "plans": plans }
+def coding_agent_prompt(state: State):
+    template = load_prompt("coding_agent")
+    return template.invoke({"messages": state["messages"], "goal": state["goal"], "plans": state["plans"]})
 
 def coding_agnet(state: State):
-    template = PromptTemplate.from_file("./prompts/coding_agent.md", encoding="utf8")
-    value = template.invoke({"messages": state["messages"], "goal": state["goal"], "plans": state["plans"]})
+    response = ask(router.model("coding_agent"), CodingAgentResponse, coding_agent_prompt(state))
+    return { "codes" : [code_store.put(state["session_id"], response.code)] }
 
-    llm = llms["mini"].with_structured_output(method="json_mode", schema=CodingAgentResponse)
-    response: CodingAgentResponse = llm.invoke(value) # type: ignore
-    code = response.code
+async def acoding_agnet(state: State):
+    response = await aask(router.model("coding_agent"), CodingAgentResponse, coding_agent_prompt(state))
+    return { "codes" : [code_store.put(state["session_id"], response.code)] }
 
-    return { "codes" : [code] }
+def loop_render_tier(state: State) -> RenderTier:
+    return state.get("render_tier") or RenderTier(settings.loop_render_tier)
 
-def code_runner(state: State):
-    code = state["codes"][-1]
-    with tempfile.NamedTemporaryFile(suffix=".py", mode="w", delete=True, encoding="utf8") as f:
-        f.write(code)
-        f.flush()
-        filename = os.path.basename(f.name)
+def preflight_check(state: State):
+    if not settings.preflight_enabled:
+        return { "preflight_error": None }
 
-        try:
-            output_dir = Path.cwd() / "output"
-            output_dir.mkdir(exist_ok=True)
-            
-            logs = docker_client.containers.run(
-                image="sandbox:latest",
-                command=f"uv run manim -o output.mp4 -qh {filename} Main",
-                volumes={
-                    str(Path(f.name).absolute()): {"bind": f"/sandbox/{filename}", "mode": "ro"},
-                    str(output_dir.absolute()): {"bind": "/sandbox/media", "mode": "rw"}
-                },
-                working_dir="/sandbox",
-                network_disabled=False,
-                mem_limit="8g",
-                stderr=True,
-                stdout=True,
-                remove=True,
-                detach=False,
-                user="runner",
-                environment={"PYTHONUNBUFFERED": "1"},
-            )
-            stdout_full = logs.decode("utf-8")
-            stdout = clean_docker_log(stdout_full)
-
-            filename_without_extension = filename.split(".")[0]
-            output_file = (output_dir/"videos"/filename_without_extension/"1080p60"/"output.mp4").absolute()
-            if output_file.exists():
-                return {"stdout": stdout, "stderr": "", "output_path": str(output_file)}
-            else:
-                return {"stdout": stdout, "stderr": "", "output_path": None}
-        except docker.errors.ContainerError as e:
-            return {"stdout": "", "stderr": e.stderr.decode("utf-8"), "output_path": None} # type: ignore
-        except Exception as e:
-            return {"stdout": "", "stderr": str(e), "output_path": None}
+    error = preflight(latest_code(state), manim_symbols())
+    if error is None:
+        return { "preflight_error": None }
 
-def code_analyzer(state: State):
-    template = PromptTemplate.from_file("./prompts/code_analyzer.md", encoding="utf8")
-    value = template.invoke({"code": state["codes"][-1], "stdout": state["stdout"], "stderr": state["stderr"]})
+    logger.info("Pre-flight check failed, skipping render")
+    return { "preflight_error": error, "stdout": "", "stderr": error, "output_path": None }
 
-    llm = llms["nano"].with_structured_output(method="json_mode", schema=CodeAnalyzerResponse)
-    response: CodeAnalyzerResponse = llm.invoke(value) # type: ignore
+def code_runner(state: State):
+    prefetcher.cancel(state["session_id"], wait_for=True)
+    return kept_attempt(state, render(latest_code(state), loop_render_tier(state), render_progress(), workspace=state["session_id"]))
+
+async def acode_runner(state: State):
+    await asyncio.to_thread(prefetcher.cancel, state["session_id"], True)
+    result = await arender(latest_code(state), loop_render_tier(state), render_progress(), workspace=state["session_id"])
+    return await asyncio.to_thread(kept_attempt, state, result)
+
+def code_analyzer_prompt(state: State):
+    template = load_prompt("code_analyzer")
+    code = latest_code(state)
+    digest = digest_output(state["stdout"], state["stderr"], code, settings.analyzer_digest_tokens)
+    return template.invoke({"code": code, "digest": digest})
 
+def code_analyzer_update(state: State, response: CodeAnalyzerResponse):
     need_fix = response.need_fix
     analysis = response.analysis
     retry = state["retry"] + (1 if need_fix else 0)
-    
+    if fix_model := state.get("fix_model"):
+        router.record_outcome("fix_coding_agent", fix_model, success=not need_fix)
+
     return { "need_fix": need_fix, "analysis": analysis, "retry": retry }
 
+def code_analyzer(state: State):
+    response = ask(router.model("code_analyzer"), CodeAnalyzerResponse, code_analyzer_prompt(state))
+    return code_analyzer_update(state, response)
+
+async def acode_analyzer(state: State):
+    response = await aask(router.model("code_analyzer"), CodeAnalyzerResponse, code_analyzer_prompt(state))
+    return code_analyzer_update(state, response)
+
 def human_review(state: State):
     while True:
         need_fix = interrupt(Interruption.HUMAN_REVIEW_CONFIRM)
@@ -220,69 +367,259 @@ def human_review(state: State):
         else:
             request = interrupt(Interruption.HUMAN_REVIEW_COMMENT)
             return { "human_request": request, "need_fix": True }
-        
+
+# The approved render becomes the session's final video; its attempts and
+# render workspace are dropped.
+def finalized(state: State, result: dict) -> dict:
+    if not result.get("output_path"):
+        return result
+    try:
+        result = { **result, "output_path": media_store.finalize(state["session_id"], result["output_path"]) }
+    except OSError as e:
+        logger.warning(f"Could not keep the final render: {e}")
+        return result
+    release_workspace(state["session_id"])
+    return result
+
+def final_render(state: State):
+    prefetcher.cancel(state["session_id"])
+    if loop_render_tier(state) == RenderTier.FINAL:
+        return finalized(state, { "output_path": state.get("output_path") })
+
+    return finalized(state, render(latest_code(state), RenderTier.FINAL, render_progress(), workspace=state["session_id"]))
+
+async def afinal_render(state: State):
+    prefetcher.cancel(state["session_id"])
+    if loop_render_tier(state) == RenderTier.FINAL:
+        return await asyncio.to_thread(finalized, state, { "output_path": state.get("output_path") })
+
+    result = await arender(latest_code(state), RenderTier.FINAL, render_progress(), workspace=state["session_id"])
+    return await asyncio.to_thread(finalized, state, result)
+
+def fix_planner_prompt(state: State):
+    template = load_prompt("fix_planner")
+    return template.invoke({"code": latest_code(state), "human_request": state.get("human_request", "없음"), "analysis": state["analysis"]})
+
 def fix_planner(state: State):
-    template = PromptTemplate.from_file("./prompts/fix_planner.md", encoding="utf8")
-    value = template.invoke({"code": state["codes"][-1], "human_request": state.get("human_request", "없음"), "analysis": state["analysis"]})
+    response = ask(router.model("fix_planner"), PlanningAgentResponse, fix_planner_prompt(state))
+    return { "plans": response.plans }
 
-    llm = llms["nano"].with_structured_output(method="json_mode", schema=PlanningAgentResponse)
-    response: PlanningAgentResponse = llm.invoke(value) # type: ignore
-    plans = response.plans
+async def afix_planner(state: State):
+    response = await aask(router.model("fix_planner"), PlanningAgentResponse, fix_planner_prompt(state))
+    return { "plans": response.plans }
 
-    return { "plans": plans }
+def fix_coding_agent_prompt(state: State):
+    template = load_prompt("coding_agent_fix")
+    return template.invoke({"plans": state["plans"], "code": latest_code(state)})
 
-def fix_coding_agent(state: State):
-    template = PromptTemplate.from_file("./prompts/coding_agent_fix.md", encoding="utf8")
-    value = template.invoke({"plans": state["plans"], "code": state["codes"][-1]})
+def fix_coding_agent_patch_prompt(state: State):
+    template = load_prompt("coding_agent_patch")
+    return template.invoke({"plans": state["plans"], "code": latest_code(state)})
 
-    llm = llms["mini"].with_structured_output(method="json_mode", schema=CodingAgentResponse)
-    response: CodingAgentResponse = llm.invoke(value) # type: ignore
-    code = response.code
+# In patch mode the model only writes search/replace edits; a patch that
+# doesn't apply cleanly falls back to asking for the whole script.
+def fix_code(model: str, state: State) -> str:
+    if settings.fix_response_mode == "patch":
+        try:
+            response = ask(model, CodingAgentPatchResponse, fix_coding_agent_patch_prompt(state))
+        except (OutputParserException, ValidationError) as e:
+            logger.info(f"Patch response was malformed, falling back to a full rewrite: {e}")
+        else:
+            patched = apply_edits(latest_code(state), response.edits)
+            if patched is not None:
+                return patched
+            logger.info("Patch did not apply, falling back to a full rewrite")
+    return ask(model, CodingAgentResponse, fix_coding_agent_prompt(state)).code
+
+async def afix_code(model: str, state: State) -> str:
+    if settings.fix_response_mode == "patch":
+        try:
+            response = await aask(model, CodingAgentPatchResponse, fix_coding_agent_patch_prompt(state))
+        except (OutputParserException, ValidationError) as e:
+            logger.info(f"Patch response was malformed, falling back to a full rewrite: {e}")
+        else:
+            patched = apply_edits(latest_code(state), response.edits)
+            if patched is not None:
+                return patched
+            logger.info("Patch did not apply, falling back to a full rewrite")
+    return (await aask(model, CodingAgentResponse, fix_coding_agent_prompt(state))).code
 
-    return { "codes" : [code] }
+def fix_coding_agent(state: State):
+    model = router.fix_model(state)
+    code = fix_code(model, state)
+    return { "codes" : [code_store.put(state["session_id"], code)], "fix_model": model }
+
+async def afix_coding_agent(state: State):
+    model = router.fix_model(state)
+    code = await afix_code(model, state)
+    return { "codes" : [code_store.put(state["session_id"], code)], "fix_model": model }
+
+# Speculative fixing: K candidates from the configured models are written,
+# pre-flighted and rendered concurrently. The first clean render wins and the
+# rest are cancelled; if none is clean the first candidate's failure is kept
+# for code_analyzer.
+def speculative_count(state: State) -> int:
+    remaining = settings.speculative_budget - state.get("speculative_spent", 0)
+    return min(settings.speculative_candidates, remaining)
+
+def clean_run(result: dict, tier: RenderTier) -> bool:
+    return not result["stderr"] and (result["output_path"] is not None or tier == RenderTier.VALIDATE)
+
+def candidate_progress(index: int, on_progress):
+    return lambda progress: on_progress({"candidate": index, **progress})
+
+def check_candidate(code: str) -> dict | None:
+    error = preflight(code, manim_symbols()) if settings.preflight_enabled else None
+    if error is None:
+        return None
+    return { "preflight_error": error, "stdout": "", "stderr": error, "output_path": None }
+
+def speculative_update(state: State, count: int, code: str, result: dict):
+    kept_attempt(state, result)
+    return {
+        "codes": [code_store.put(state["session_id"], code)],
+        "preflight_error": result.get("preflight_error"),
+        "stdout": result["stdout"],
+        "stderr": result["stderr"],
+        "output_path": result["output_path"],
+        "speculative_spent": state.get("speculative_spent", 0) + count,
+        "fix_model": None,
+    }
+
+def speculative_result(state: State, count: int, results: dict[int, tuple[str, dict]]):
+    if not results:
+        raise RuntimeError("Speculative fix: every candidate failed")
+    code, result = results[min(results)]
+    return speculative_update(state, count, code, result)
+
+def speculative_fix(state: State):
+    count = speculative_count(state)
+    tier = loop_render_tier(state)
+    on_progress = render_progress()
+    cancel = threading.Event()
+
+    def candidate(index: int) -> tuple[int, str, dict]:
+        model = settings.speculative_models[index % len(settings.speculative_models)]
+        code = fix_code(model, state)
+        if cancel.is_set():
+            return index, code, { "stdout": "", "stderr": "Render cancelled", "output_path": None }
+        return index, code, check_candidate(code) or render(code, tier, candidate_progress(index, on_progress), cancel)
+
+    results = {}
+    executor = ContextThreadPoolExecutor(max_workers=count)
+    try:
+        for future in as_completed([executor.submit(candidate, index) for index in range(count)]):
+            try:
+                index, code, result = future.result()
+            except Exception as e:
+                logger.warning(f"Speculative fix: candidate failed: {e}")
+                continue
+            if clean_run(result, tier):
+                logger.info(f"Speculative fix: candidate {index} of {count} ran cleanly")
+                return speculative_update(state, count, code, result)
+            results[index] = (code, result)
+    finally:
+        cancel.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return speculative_result(state, count, results)
+
+async def aspeculative_fix(state: State):
+    count = speculative_count(state)
+    tier = loop_render_tier(state)
+    on_progress = render_progress()
+    cancel = threading.Event()
+
+    async def candidate(index: int) -> tuple[int, str, dict]:
+        model = settings.speculative_models[index % len(settings.speculative_models)]
+        code = await afix_code(model, state)
+        # Pre-flight may index the sandbox's symbols, which starts a container
+        error = await asyncio.to_thread(check_candidate, code)
+        return index, code, error or await arender(code, tier, candidate_progress(index, on_progress), cancel)
+
+    results = {}
+    tasks = [asyncio.create_task(candidate(index)) for index in range(count)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                index, code, result = await next_done
+            except Exception as e:
+                logger.warning(f"Speculative fix: candidate failed: {e}")
+                continue
+            if clean_run(result, tier):
+                logger.info(f"Speculative fix: candidate {index} of {count} ran cleanly")
+                return await asyncio.to_thread(speculative_update, state, count, code, result)
+            results[index] = (code, result)
+    finally:
+        cancel.set()
+        for task in tasks:
+            task.cancel()
+
+    return await asyncio.to_thread(speculative_result, state, count, results)
 
 # ======== Conditional  ==========
 
 def code_analyzer_router(state: State):
     return "FIX" if state["need_fix"] and state["retry"] <= state["max_retry"] else "GOOD"
 
+def fix_mode_router(state: State):
+    return "SPECULATE" if speculative_count(state) > 1 else "SINGLE"
+
+def preflight_router(state: State):
+    return "FAIL" if state.get("preflight_error") else "RUN"
+
 def plan_feedback_router(state: State):
     return "REVISE" if state.get("plan_feedback") else "APPROVE"
 
 # ====================
 
+def traced_node(name: str, func, afunc=None):
+    return RunnableLambda(instrument(name, func), afunc=instrument(name, afunc) if afunc else None)
+
 graph = StateGraph(State)
 
-graph.add_node("goal_extractor", goal_extractor)
-graph.add_node("planning_agent", planing_agent)
+# Nodes with an async twin run it under `astream`/`ainvoke` and the sync
+# function under `stream`/`invoke`, so one compiled graph serves both.
+graph.add_node("goal_extractor", traced_node("goal_extractor", goal_extractor, agoal_extractor))
+graph.add_node("planning_agent", traced_node("planning_agent", planing_agent, aplaning_agent))
 graph.add_node("plan_review", plan_review)
-graph.add_node("plan_reviser", plan_reviser)
-graph.add_node("coding_agent", coding_agnet)
-graph.add_node("code_runner", code_runner)
-graph.add_node("code_analyzer", code_analyzer)
+graph.add_node("plan_reviser", traced_node("plan_reviser", plan_reviser, aplan_reviser))
+graph.add_node("coding_agent", traced_node("coding_agent", coding_agnet, acoding_agnet))
+graph.add_node("preflight", traced_node("preflight", preflight_check))
+graph.add_node("code_runner", traced_node("code_runner", code_runner, acode_runner))
+graph.add_node("code_analyzer", traced_node("code_analyzer", code_analyzer, acode_analyzer))
 graph.add_node("human_review", human_review)
-graph.add_node("fix_planner", fix_planner)
-graph.add_node("fix_coding_agent", fix_coding_agent)
+graph.add_node("final_render", traced_node("final_render", final_render, afinal_render))
+graph.add_node("fix_planner", traced_node("fix_planner", fix_planner, afix_planner))
+graph.add_node("fix_coding_agent", traced_node("fix_coding_agent", fix_coding_agent, afix_coding_agent))
+graph.add_node("speculative_fix", traced_node("speculative_fix", speculative_fix, aspeculative_fix))
 
 graph.add_edge(START, "goal_extractor")
 graph.add_edge("goal_extractor", "planning_agent")
 graph.add_edge("planning_agent", "plan_review")
 graph.add_conditional_edges("plan_review", plan_feedback_router, { "REVISE": "plan_reviser", "APPROVE": "coding_agent" })
 graph.add_edge("plan_reviser", "plan_review")
-graph.add_edge("coding_agent", "code_runner")
+graph.add_edge("coding_agent", "preflight")
+graph.add_conditional_edges("preflight", preflight_router, { "RUN": "code_runner", "FAIL": "code_analyzer" })
 graph.add_edge("code_runner", "code_analyzer")
 graph.add_conditional_edges("code_analyzer", code_analyzer_router, { "FIX": "fix_planner", "GOOD": "human_review" })
-graph.add_conditional_edges("human_review", code_analyzer_router, { "FIX": "fix_planner", "GOOD": END })
-graph.add_edge("fix_planner", "fix_coding_agent")
-graph.add_edge("fix_coding_agent", "code_runner")
-
-checkpointer = InMemorySaver()
+graph.add_conditional_edges("human_review", code_analyzer_router, { "FIX": "fix_planner", "GOOD": "final_render" })
+graph.add_edge("final_render", END)
+graph.add_conditional_edges("fix_planner", fix_mode_router, { "SINGLE": "fix_coding_agent", "SPECULATE": "speculative_fix" })
+graph.add_edge("fix_coding_agent", "preflight")
+graph.add_edge("speculative_fix", "code_analyzer")
+
+# Checkpoints outlive the process now, so only our own types are revived from them.
+serde = JsonPlusSerializer(allowed_msgpack_modules=[Interruption, RenderTier])
+checkpointer = DurableSaver.open(Path(settings.checkpoint_db), keep=settings.checkpoint_keep, code_store=code_store, serde=serde)
 thread_id = str(uuid.uuid4())
 config: RunnableConfig = {"run_name": "Masim Agent", "configurable": {"thread_id": thread_id}}
 
 app = graph.compile(checkpointer=checkpointer).with_config(config=config)
 
 if __name__ == "__main__":
+    setup_logging()
+
     with open("graph.png", "wb") as f:
         f.write(app.get_graph().draw_mermaid_png())
 
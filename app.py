@@ -1,10 +1,14 @@
 import streamlit as st
-from agent import app, State, Command, Interruption, AgentState, logger
+from agent import app, State, Command, Interruption, AgentState, logger, setup_logging, media_store
 from langchain.messages import HumanMessage
+from metrics import log_event
+from settings import settings
 import uuid
 import time
 from enum import Enum
 
+setup_logging()
+
 st.set_page_config(page_title="Masim Agent", layout="wide")
 
 if "thread_id" not in st.session_state:
@@ -39,10 +43,26 @@ for msg in st.session_state.messages:
     with st.chat_message(msg["role"]):
         st.markdown(msg["content"])
 
+STREAM_MODE = ["updates", "custom"]
+
+# With MASIM_MEDIA_BASE_URL set the browser streams videos from server.py
+# instead of Streamlit sending the whole file on every rerun.
+def video_source(path: str) -> str:
+    url = media_store.url(path) if settings.media_base_url else None
+    return f"{settings.media_base_url.rstrip('/')}{url}" if url else path
+
 def process_stream(stream_generator):
+    progress = st.empty()
     try:
-        for event in stream_generator:
-            logger.info(event)
+        for mode, event in stream_generator:
+            if mode == "custom":
+                if "render_progress" in event:
+                    p = event["render_progress"]
+                    scene = f"{p['scene']} - " if "scene" in p else ""
+                    progress.caption(f"렌더링 중... {scene}애니메이션 {p['animation']} ({p['percent']}%)")
+                continue
+
+            log_event(event)
             if "__interrupt__" in event:
                 interrupts = event["__interrupt__"]
                 if interrupts:
@@ -75,10 +95,16 @@ def process_stream(stream_generator):
                     st.session_state.messages.append({"role": "assistant", "content": f"**수정된 계획:**\n\n{plans_text}"})
                 elif node_name == "coding_agent":
                     pass  # Silent
-                elif node_name == "code_runner":
+                elif node_name == "preflight":
+                    pass  # Silent
+                elif node_name in ("code_runner", "speculative_fix"):
                     if node_output.get("output_path"):
-                        st.video(node_output["output_path"])
+                        st.video(video_source(node_output["output_path"]))
                         st.session_state.messages.append({"role": "assistant", "content": f"비디오 생성 완료: {node_output['output_path']}"})
+                elif node_name == "final_render":
+                    if node_output and node_output.get("output_path"):
+                        st.video(video_source(node_output["output_path"]))
+                        st.session_state.messages.append({"role": "assistant", "content": f"최종 비디오 생성 완료: {node_output['output_path']}"})
                 elif node_name == "code_analyzer":
                     pass  # Silent
                 elif node_name == "fix_planner":
@@ -105,7 +131,7 @@ if st.session_state.agent_state == AgentState.IDLE:
                 logger.debug("Initializing State...")
                 data = State(session_id=thread_id, messages=[HumanMessage(user_input)], max_retry=5, retry=0)
                 logger.debug(f"invoking app with input: {user_input}")
-                stream = app.stream(data, config=config)
+                stream = app.stream(data, config=config, stream_mode=STREAM_MODE)
                 process_stream(stream)
             except Exception as e:
                 logger.error(f"An error occurred: {e}")
@@ -151,7 +177,7 @@ elif st.session_state.agent_state == AgentState.PLAN_REVIEW:
                 
                 with st.spinner("처리 중..."):
                     try:
-                        stream = app.stream(Command(resume=full_feedback), config=config)
+                        stream = app.stream(Command(resume=full_feedback), config=config, stream_mode=STREAM_MODE)
                         process_stream(stream)
                     except Exception as e:
                         logger.error(f"An error occurred: {e}")
@@ -166,7 +192,7 @@ elif st.session_state.agent_state == AgentState.PLAN_REVIEW:
                 st.session_state.agent_state = AgentState.RUNNING
                 with st.spinner("처리 중..."):
                     try:
-                        stream = app.stream(Command(resume=""), config=config)
+                        stream = app.stream(Command(resume=""), config=config, stream_mode=STREAM_MODE)
                         process_stream(stream)
                     except Exception as e:
                         logger.error(f"An error occurred: {e}")
@@ -185,7 +211,7 @@ elif st.session_state.agent_state == AgentState.HUMAN_REVIEW_CONFIRM:
             st.session_state.agent_state = AgentState.RUNNING
             with st.spinner("처리 중..."):
                 try:
-                    stream = app.stream(Command(resume="Y"), config=config)
+                    stream = app.stream(Command(resume="Y"), config=config, stream_mode=STREAM_MODE)
                     process_stream(stream)
                 except Exception as e:
                     logger.error(f"An error occurred: {e}")
@@ -197,7 +223,7 @@ elif st.session_state.agent_state == AgentState.HUMAN_REVIEW_CONFIRM:
             st.session_state.agent_state = AgentState.RUNNING
             with st.spinner("처리 중..."):
                 try:
-                    stream = app.stream(Command(resume="N"), config=config)
+                    stream = app.stream(Command(resume="N"), config=config, stream_mode=STREAM_MODE)
                     process_stream(stream)
                 except Exception as e:
                     logger.error(f"An error occurred: {e}")
@@ -215,7 +241,7 @@ elif st.session_state.agent_state == AgentState.HUMAN_REVIEW_COMMENT:
             st.session_state.agent_state = AgentState.RUNNING
             with st.spinner("처리 중..."):
                 try:
-                    stream = app.stream(Command(resume=request), config=config)
+                    stream = app.stream(Command(resume=request), config=config, stream_mode=STREAM_MODE)
                     process_stream(stream)
                 except Exception as e:
                     logger.error(f"An error occurred: {e}")
@@ -236,7 +262,7 @@ elif st.session_state.agent_state == AgentState.INTERRUPTED:
             
             with st.spinner("처리 중..."):
                 try:
-                    stream = app.stream(Command(resume=user_response), config=config)
+                    stream = app.stream(Command(resume=user_response), config=config, stream_mode=STREAM_MODE)
                     process_stream(stream)
                 except Exception as e:
                     logger.error(f"An error occurred: {e}")
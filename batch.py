@@ -0,0 +1,177 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from langchain.messages import HumanMessage
+from langgraph.types import Command
+
+import agent
+from agent import Interruption, State, app, checkpointer, logger, media_store, setup_logging
+from settings import settings
+
+
+# How a batch answers the graph's interrupts. Feedback and review comments are
+# given once; after that the plan is approved and the result accepted, so a
+# request can't loop on its own answers.
+@dataclass
+class InterruptPolicy:
+    plan_feedback: str = ""
+    review_comment: str = ""
+
+    def answer(self, interruption: Interruption, asked: dict[Interruption, int]) -> str:
+        first = asked.get(interruption, 0) == 0
+        asked[interruption] = asked.get(interruption, 0) + 1
+        if interruption == Interruption.PLAN_REVIEW:
+            return self.plan_feedback if first else ""
+        if interruption == Interruption.HUMAN_REVIEW_CONFIRM:
+            return "Y" if first and self.review_comment else "N"
+        return self.review_comment
+
+
+@dataclass
+class BatchRequest:
+    id: str
+    message: str
+    max_retry: int
+    policy: InterruptPolicy
+    # Input file the request came from
+    source: str = ""
+
+    # Threads live on in the shared checkpoint database, so the id also covers
+    # the input file and the message: another file reusing an id (or a line
+    # number) gets its own thread instead of resuming this one.
+    @property
+    def thread_id(self) -> str:
+        digest = hashlib.sha256(f"{self.source}\0{self.message}".encode("utf-8")).hexdigest()[:12]
+        return f"batch-{self.id}-{digest}"
+
+
+def read_requests(path: Path, default_policy: InterruptPolicy, default_max_retry: int) -> list[BatchRequest]:
+    requests = []
+    for number, line in enumerate(path.read_text(encoding="utf-8").splitlines(), start=1):
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        policy = InterruptPolicy(
+            plan_feedback=item.get("plan_feedback", default_policy.plan_feedback),
+            review_comment=item.get("review_comment", default_policy.review_comment),
+        )
+        requests.append(BatchRequest(str(item.get("id", number)), item["message"], item.get("max_retry", default_max_retry), policy, str(path.absolute())))
+    return requests
+
+
+# Ids already in the output file. Failed requests are only skipped when
+# `retry_failed` is off.
+def finished_ids(path: Path, retry_failed: bool) -> set[str]:
+    if not path.exists():
+        return set()
+    finished = set()
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        if result["status"] == "done" or not retry_failed:
+            finished.add(result["id"])
+    return finished
+
+
+async def pending_input(request: BatchRequest, config: dict, asked: dict[Interruption, int]):
+    # A thread left behind by an earlier, interrupted batch picks up from its
+    # last checkpoint instead of starting over.
+    snapshot = await app.aget_state(config)
+    if snapshot.interrupts:
+        return Command(resume=request.policy.answer(snapshot.interrupts[0].value, asked))
+    if snapshot.next:
+        return None
+    # A thread that already ran to the end failed (finished ones aren't run
+    # again), so the retry starts over on a clean thread.
+    if snapshot.values:
+        await checkpointer.adelete_thread(request.thread_id)
+        await asyncio.to_thread(media_store.delete_attempts, request.thread_id)
+    return State(session_id=request.thread_id, messages=[HumanMessage(request.message)], max_retry=request.max_retry, retry=0) # type: ignore
+
+
+async def run_request(request: BatchRequest) -> dict:
+    config = {"configurable": {"thread_id": request.thread_id}}
+    asked: dict[Interruption, int] = {}
+    started = time.perf_counter()
+    try:
+        result = await app.ainvoke(await pending_input(request, config, asked), config)
+        while result.get("__interrupt__"):
+            answer = request.policy.answer(result["__interrupt__"][0].value, asked)
+            result = await app.ainvoke(Command(resume=answer), config)
+        output_path = result.get("output_path")
+        error = None if output_path else (result.get("stderr") or "no output").strip().splitlines()[-1]
+    except Exception as e:
+        logger.error(f"Batch {request.id}: {e}")
+        result, output_path, error = {}, None, f"{type(e).__name__}: {e}"
+
+    return {
+        "id": request.id,
+        "thread_id": request.thread_id,
+        "status": "done" if error is None else "failed",
+        "output_path": output_path,
+        "retry": result.get("retry"),
+        "seconds": round(time.perf_counter() - started, 2),
+        "error": error,
+    }
+
+
+async def run_batch(requests: list[BatchRequest], output: Path, workers: int) -> list[dict]:
+    queue: asyncio.Queue[BatchRequest] = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+    results = []
+
+    async def worker():
+        while not queue.empty():
+            request = queue.get_nowait()
+            result = await run_request(request)
+            results.append(result)
+            # One line per finished request, flushed right away, so a killed
+            # batch resumes where it stopped.
+            with open(output, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            logger.info(f"Batch {request.id}: {result['status']} in {result['seconds']:.0f}s ({len(results)}/{len(requests)})")
+
+    await asyncio.gather(*(worker() for _ in range(min(workers, len(requests)))))
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Runs a JSONL of requests ({\"id\", \"message\", \"max_retry\", \"plan_feedback\", \"review_comment\"}) through the agent without a UI.")
+    parser.add_argument("input", type=Path)
+    parser.add_argument("output", type=Path, help="results JSONL; requests already in it are skipped")
+    parser.add_argument("--workers", type=int, default=settings.batch_workers, help="requests in flight at once")
+    parser.add_argument("--llm-concurrency", type=int, default=settings.llm_concurrency)
+    parser.add_argument("--render-concurrency", type=int, default=settings.render_concurrency)
+    parser.add_argument("--max-retry", type=int, default=5)
+    parser.add_argument("--plan-feedback", default="", help="feedback given once at PLAN_REVIEW (default: approve)")
+    parser.add_argument("--review-comment", default="", help="change requested once at HUMAN_REVIEW_CONFIRM (default: answer N)")
+    parser.add_argument("--retry-failed", action="store_true", help="run requests that failed in an earlier batch again")
+    args = parser.parse_args()
+
+    setup_logging()
+    agent.llm_limit = asyncio.Semaphore(args.llm_concurrency)
+    agent.render_limit = asyncio.Semaphore(args.render_concurrency)
+
+    requests = read_requests(args.input, InterruptPolicy(args.plan_feedback, args.review_comment), args.max_retry)
+    finished = finished_ids(args.output, args.retry_failed)
+    pending = [request for request in requests if request.id not in finished]
+    logger.info(f"Batch: {len(pending)} of {len(requests)} requests to run, {args.workers} at a time")
+
+    started = time.perf_counter()
+    results = asyncio.run(run_batch(pending, args.output, args.workers))
+    hours = (time.perf_counter() - started) / 3600
+    done = sum(result["status"] == "done" for result in results)
+    logger.info(f"Batch: {done} done, {len(results) - done} failed, {done / hours if hours else 0:.1f} videos/hour")
+    return 0 if done == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+BENCHMARK_DIR = Path(__file__).parent
+
+# Answers for the graph's interrupts: approve the plan, accept the result.
+INTERRUPT_ANSWERS = {"plan_review": "", "human_review_confirm": "N", "human_review_comment": ""}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Runs the agent graph on recorded LLM responses and reports where the time goes.")
+    parser.add_argument("--backend", choices=["local", "sandbox"], default="local", help="render with manim on this machine or in the Docker sandbox")
+    parser.add_argument("--python", default=sys.executable, help="interpreter with manim installed, for the local backend")
+    parser.add_argument("--cases", type=Path, default=BENCHMARK_DIR/"cases.json")
+    parser.add_argument("--only", nargs="*", help="run only these cases")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync", help="run the graph with invoke or ainvoke")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds each replayed LLM call sleeps")
+    parser.add_argument("--fix-mode", choices=["patch", "rewrite"], default="rewrite", help="MASIM_FIX_RESPONSE_MODE; the bundled recordings are full rewrites")
+    parser.add_argument("--baseline", type=Path, default=BENCHMARK_DIR/"baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline instead of comparing against it")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown over the baseline, as a fraction")
+    parser.add_argument("--output", type=Path, help="also write the summary as JSON here")
+    parser.add_argument("--record", type=Path, help="call the real models instead of replaying and write their responses here as cases")
+    return parser.parse_args()
+
+
+def configure(args, workdir: Path):
+    # Settings are read when agent is imported, so this runs first: state,
+    # spans and caches go to a scratch directory and nothing is served from a cache.
+    os.environ.update({
+        "MASIM_CHECKPOINT_DB": str(workdir/"bench.db"),
+        "MASIM_METRICS_PATH": str(workdir/"metrics.jsonl"),
+        "MASIM_SYMBOLS_INDEX": str(workdir/"manim_symbols.json"),
+        "MASIM_RENDER_CACHE_ENABLED": "false",
+        "MASIM_LLM_CACHE_ENABLED": "false",
+        "MASIM_LOG_SAMPLE_RATE": "0",
+        "MASIM_FIX_RESPONSE_MODE": args.fix_mode,
+        "MASIM_RENDER_BACKEND": "subprocess" if args.backend == "local" else "docker",
+        "MASIM_RENDER_PYTHON": args.python,
+    })
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+
+
+def resume_answer(result: dict) -> str | None:
+    interrupts = result.get("__interrupt__")
+    if not interrupts:
+        return None
+    return INTERRUPT_ANSWERS[interrupts[0].value.value]
+
+
+def run_case(agent, case: dict, mode: str) -> dict:
+    from langchain.messages import HumanMessage
+    from langgraph.types import Command
+
+    thread_id = f"{case['name']}-{uuid.uuid4().hex[:8]}"
+    config = {"configurable": {"thread_id": thread_id}}
+    state = agent.State(session_id=thread_id, messages=[HumanMessage(case["prompt"])], max_retry=case.get("max_retry", 3), retry=0) # type: ignore
+
+    async def arun():
+        result = await agent.app.ainvoke(state, config)
+        while (answer := resume_answer(result)) is not None:
+            result = await agent.app.ainvoke(Command(resume=answer), config)
+        return result
+
+    def run():
+        result = agent.app.invoke(state, config)
+        while (answer := resume_answer(result)) is not None:
+            result = agent.app.invoke(Command(resume=answer), config)
+        return result
+
+    started = time.perf_counter()
+    try:
+        result = asyncio.run(arun()) if mode == "async" else run()
+        error = None if result.get("output_path") is not None else result.get("stderr") or "no output"
+    except Exception as e:
+        result, error = {}, f"{type(e).__name__}: {e}"
+    return {
+        "retries": result.get("retry", 0),
+        "success": error is None,
+        "wall_seconds": time.perf_counter() - started,
+        "error": error,
+    }
+
+
+def main() -> int:
+    args = parse_args()
+    workdir = Path(tempfile.mkdtemp(prefix="masim-bench-"))
+    configure(args, workdir)
+
+    import agent
+    from langchain.chat_models import init_chat_model
+    from settings import settings
+
+    from benchmark.replay import RecordingModel, ReplayModel
+    from benchmark.report import compare, format_report, load_spans, summarize
+
+    cases = json.loads(args.cases.read_text(encoding="utf-8"))
+    if args.only:
+        cases = [case for case in cases if case["name"] in args.only]
+
+    recordings = []
+    results = []
+    for case in cases:
+        runs = []
+        for _ in range(args.repeat):
+            if args.record:
+                recorded: dict[str, list[dict]] = {}
+                for name in ("nano", "mini"):
+                    agent.llms[name] = RecordingModel(init_chat_model(agent.llms.specs[name]), recorded)
+            else:
+                replay = ReplayModel(case["responses"], args.llm_latency)
+                agent.llms["nano"] = agent.llms["mini"] = replay
+            runs.append(run_case(agent, case, args.mode))
+            if args.record:
+                recordings.append({**{k: v for k, v in case.items() if k != "responses"}, "responses": recorded})
+        results.append({
+            "name": case["name"],
+            "retries": max(run["retries"] for run in runs),
+            "success": all(run["success"] for run in runs),
+            "wall_seconds": sum(run["wall_seconds"] for run in runs) / len(runs),
+            "error": next((run["error"] for run in runs if run["error"]), None),
+        })
+
+    summary = summarize(load_spans(Path(settings.metrics_path)), results, settings.loop_render_tier)
+    print(format_report(summary))
+
+    if args.record:
+        args.record.write_text(json.dumps(recordings, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\nRecorded responses written to {args.record}")
+    if args.output:
+        args.output.write_text(json.dumps(summary, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(summary, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"\nBaseline saved to {args.baseline}")
+        return 0
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to store one")
+        return 0
+
+    regressions = compare(summary, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance)
+    if regressions:
+        print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+from manim import *
+
+
+class Main(MovingCameraScene):
+    def construct(self):
+        title = Text("Area of a circle").to_edge(UP)
+        self.play(Write(title))
+
+        circle = Circle(radius=1.5, color=BLUE, fill_opacity=0.5)
+        self.play(Create(circle))
+        self.play(self.camera.frame.animate.scale(0.7).move_to(circle))
+        self.wait(1)
+
+        formula = MathTex(r"A = \pi r^2").next_to(circle, DOWN)
+        self.play(Write(formula))
+        self.wait(2)
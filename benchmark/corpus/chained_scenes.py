@@ -0,0 +1,26 @@
+from manim import *
+
+
+class Intro(Scene):
+    def construct(self):
+        title = Text("Sine and cosine").to_edge(UP)
+        circle = Circle(radius=1.5, color=BLUE)
+        self.play(Write(title), Create(circle))
+        self.wait(1)
+        self.play(FadeOut(*self.mobjects))
+
+
+class Waves(Scene):
+    def construct(self):
+        axes = Axes(x_range=[0, TAU, PI / 2], y_range=[-1.5, 1.5, 1], x_length=8, y_length=3)
+        sine = axes.plot(np.sin, color=YELLOW)
+        cosine = axes.plot(np.cos, color=GREEN)
+        self.play(Create(axes))
+        self.play(Create(sine), Create(cosine))
+        self.wait(2)
+
+
+class Main(Scene):
+    def construct(self):
+        Intro.construct(self)
+        Waves.construct(self)
@@ -0,0 +1,29 @@
+from manim import *
+
+
+class Main(Scene):
+    def construct(self):
+        title = Text("Area of a circle").to_edge(UP)
+        self.play(Write(title))
+
+        circle = Circle(radius=1.5, color=BLUE, fill_opacity=0.5)
+        self.play(Create(circle))
+        self.wait(1)
+
+        sectors = VGroup(*[
+            AnnularSector(inner_radius=0, outer_radius=1.5, angle=TAU / 16, start_angle=i * TAU / 16, color=BLUE, fill_opacity=0.5)
+            for i in range(16)
+        ])
+        self.play(FadeOut(circle), FadeIn(sectors))
+        self.wait(1)
+
+        rearranged = VGroup(*[
+            sector.copy().rotate(PI / 2 - sector.start_angle - (PI if i % 2 else 0))
+            for i, sector in enumerate(sectors)
+        ]).arrange(RIGHT, buff=-0.3).scale(0.8)
+        self.play(Transform(sectors, rearranged))
+        self.wait(1)
+
+        formula = MathTex(r"A = \pi r \cdot r = \pi r^2").next_to(rearranged, DOWN, buff=1)
+        self.play(Write(formula))
+        self.wait(2)
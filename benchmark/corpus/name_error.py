@@ -0,0 +1,20 @@
+from manim import *
+
+
+class Main(Scene):
+    def construct(self):
+        title = Text("Pythagorean theorem").to_edge(UP)
+        self.play(Write(title))
+
+        triangle = Polygon(ORIGIN, RIGHT * 3, UP * 2, color=WHITE).move_to(ORIGIN)
+        self.play(Create(triangle))
+        self.wait(1)
+
+        a_square = Sqaure(side_length=2, color=RED, fill_opacity=0.4).next_to(triangle, LEFT, buff=0)
+        b_square = Square(side_length=3, color=GREEN, fill_opacity=0.4).next_to(triangle, DOWN, buff=0)
+        self.play(FadeIn(a_square), FadeIn(b_square))
+        self.wait(1)
+
+        label = Text("a² + b² = c²", font_size=40).to_edge(DOWN)
+        self.play(Write(label))
+        self.wait(2)
@@ -0,0 +1,16 @@
+from manim import *
+
+
+class Main(Scene):
+    def construct(self):
+        title = Text("Pythagorean theorem").to_edge(UP)
+        self.play(Write(title))
+
+        triangle = Polygon(ORIGIN, RIGHT * 3, UP * 2, color=WHITE).move_to(ORIGIN)
+        self.play(Create(triangle))
+        self.wait(1)
+
+        square = Square(side_length=2, color=RED, fill_opacity=0.4)
+        self.play(Transform(triangle))
+        self.play(FadeIn(square))
+        self.wait(2)
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel, ValidationError
+
+from metrics import current_span
+
+CORPUS_DIR = Path(__file__).parent/"corpus"
+
+# Nodes that ask with another node's prompts and so share its recordings
+NODE_ALIASES = {"speculative_fix": "fix_coding_agent"}
+
+CHARS_PER_TOKEN = 4
+
+
+def current_node() -> str:
+    span = current_span.get()
+    node = span.node if span else "none"
+    return NODE_ALIASES.get(node, node)
+
+
+def load_response(entry: dict) -> dict:
+    # `{"code_file": "name.py"}` stands for `{"code": <corpus/name.py>}`.
+    if "code_file" in entry:
+        entry = {**{k: v for k, v in entry.items() if k != "code_file"}, "code": (CORPUS_DIR/entry["code_file"]).read_text(encoding="utf-8")}
+    return entry
+
+
+# Stands in for a chat model in `agent.llms`, answering each node with the
+# next response recorded for it. Once a node's responses run out the last one
+# is repeated, so a case only records what changes between retries.
+class ReplayModel:
+    model_name = "replay"
+
+    def __init__(self, responses: dict[str, list[dict]], latency: float = 0.0):
+        self.responses = {node: [load_response(entry) for entry in entries] for node, entries in responses.items()}
+        self.latency = latency
+        self.calls: dict[str, int] = {}
+
+    def next_response(self, node: str) -> dict:
+        entries = self.responses.get(node)
+        if not entries:
+            raise KeyError(f"No recorded response for node {node!r}")
+        index = self.calls.get(node, 0)
+        self.calls[node] = index + 1
+        return entries[min(index, len(entries) - 1)]
+
+    def output(self, schema: type[BaseModel], value, include_raw: bool):
+        response = self.next_response(current_node())
+        text = json.dumps(response, ensure_ascii=False)
+        prompt = value.to_string() if hasattr(value, "to_string") else str(value)
+        raw = AIMessage(text, usage_metadata={
+            "input_tokens": len(prompt) // CHARS_PER_TOKEN,
+            "output_tokens": len(text) // CHARS_PER_TOKEN,
+            "total_tokens": (len(prompt) + len(text)) // CHARS_PER_TOKEN,
+        })
+        try:
+            parsed, error = schema.model_validate(response), None
+        except ValidationError as e:
+            parsed, error = None, e
+        if not include_raw:
+            if error is not None:
+                raise error
+            return parsed
+        return {"raw": raw, "parsed": parsed, "parsing_error": error}
+
+    def with_structured_output(self, schema: type[BaseModel], method: str | None = None, include_raw: bool = False, **kwargs):
+        def respond(value):
+            if self.latency:
+                time.sleep(self.latency)
+            return self.output(schema, value, include_raw)
+
+        async def arespond(value):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return self.output(schema, value, include_raw)
+
+        return RunnableLambda(respond, afunc=arespond)
+
+
+# Wraps a real chat model and keeps every structured response it returns,
+# per node, in the shape ReplayModel serves them back.
+class RecordingModel:
+    def __init__(self, model, recorded: dict[str, list[dict]]):
+        self.model = model
+        self.recorded = recorded
+        self.model_name = getattr(model, "model_name", "recording")
+
+    def record(self, output):
+        response = output["parsed"] if isinstance(output, dict) else output
+        if response is not None:
+            self.recorded.setdefault(current_node(), []).append(response.model_dump())
+        return output
+
+    def with_structured_output(self, schema: type[BaseModel], **kwargs):
+        llm = self.model.with_structured_output(schema=schema, **kwargs)
+
+        async def arecord(value):
+            return self.record(await llm.ainvoke(value))
+
+        return RunnableLambda(lambda value: self.record(llm.invoke(value)), afunc=arecord)
@@ -0,0 +1,100 @@
+import json
+import statistics
+from pathlib import Path
+
+# Nodes whose render runs at the fix loop's tier; final_render always runs FINAL
+LOOP_RENDER_NODES = {"code_runner", "speculative_fix"}
+
+
+def load_spans(path: Path) -> list[dict]:
+    if not path.exists():
+        return []
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def describe(values: list[float]) -> dict:
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        "p50": percentile(values, 0.5),
+        "p95": percentile(values, 0.95),
+    }
+
+
+def summarize(spans: list[dict], cases: list[dict], loop_tier: str) -> dict:
+    by_node: dict[str, list[float]] = {}
+    by_tier: dict[str, list[float]] = {}
+    peaks = []
+    for span in spans:
+        by_node.setdefault(span["node"], []).append(span["wall_seconds"])
+        render = span.get("render") or {}
+        if render.get("jobs"):
+            tier = "final" if span["node"] == "final_render" else loop_tier if span["node"] in LOOP_RENDER_NODES else None
+            if tier is not None:
+                by_tier.setdefault(tier, []).append(render["render_seconds"])
+        if render.get("peak_memory_mb") is not None:
+            peaks.append(render["peak_memory_mb"])
+
+    return {
+        "nodes": {node: describe(values) for node, values in sorted(by_node.items())},
+        "render_seconds": {tier: describe(values) for tier, values in sorted(by_tier.items())},
+        "render_peak_memory_mb": max(peaks, default=None),
+        "cases": {case["name"]: case for case in cases},
+    }
+
+
+# The numbers a baseline is compared on, all "lower is better"
+def flatten(summary: dict) -> dict[str, float]:
+    values = {}
+    for node, stats in summary["nodes"].items():
+        values[f"node.{node}.p50"] = stats["p50"]
+    for tier, stats in summary["render_seconds"].items():
+        values[f"render.{tier}.p50"] = stats["p50"]
+    if summary["render_peak_memory_mb"] is not None:
+        values["render.peak_memory_mb"] = summary["render_peak_memory_mb"]
+    for name, case in summary["cases"].items():
+        values[f"case.{name}.retries"] = case["retries"]
+        values[f"case.{name}.wall_seconds"] = case["wall_seconds"]
+    return values
+
+
+# Metrics that got worse than the baseline by more than `tolerance` (a
+# fraction); retry counts and failed cases count as regressions on any change.
+def compare(summary: dict, baseline: dict, tolerance: float) -> list[str]:
+    current, previous = flatten(summary), flatten(baseline)
+    regressions = []
+    for key, before in previous.items():
+        after = current.get(key)
+        if after is None:
+            continue
+        limit = before if key.endswith(".retries") else before * (1 + tolerance)
+        if after > limit:
+            regressions.append(f"{key}: {before:.3f} -> {after:.3f}")
+    for name, case in summary["cases"].items():
+        if not case["success"] and baseline["cases"].get(name, {}).get("success"):
+            regressions.append(f"case.{name}: succeeded in the baseline, failed now")
+    return regressions
+
+
+def format_report(summary: dict) -> str:
+    lines = ["node                  runs    mean     p50     p95"]
+    for node, stats in summary["nodes"].items():
+        lines.append(f"{node:<20} {stats['count']:>5} {stats['mean']:>7.3f} {stats['p50']:>7.3f} {stats['p95']:>7.3f}")
+
+    lines += ["", "render tier           jobs    mean     p50     p95"]
+    for tier, stats in summary["render_seconds"].items():
+        lines.append(f"{tier:<20} {stats['count']:>5} {stats['mean']:>7.3f} {stats['p50']:>7.3f} {stats['p95']:>7.3f}")
+    peak = summary["render_peak_memory_mb"]
+    lines.append(f"render peak memory: {f'{peak:.0f} MB' if peak is not None else 'n/a'}")
+
+    lines += ["", "case                  retries  success    wall"]
+    for name, case in summary["cases"].items():
+        lines.append(f"{name:<20} {case['retries']:>8} {str(case['success']):>8} {case['wall_seconds']:>7.2f}")
+        if case.get("error"):
+            lines.append(f"  error: {case['error'].strip().splitlines()[-1]}")
+    return "\n".join(lines)
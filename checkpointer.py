@@ -0,0 +1,105 @@
+import asyncio
+import sqlite3
+from collections.abc import AsyncIterator, Sequence
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+from code_store import CodeStore
+
+
+# SqliteSaver (WAL mode) that also serves the async API from a worker thread,
+# so the same compiled graph runs under stream/invoke and astream/ainvoke.
+# Only the latest `keep` checkpoints of each thread are kept; a session only
+# ever resumes from its latest one. Code versions only the trimmed checkpoints
+# referenced are dropped from the code store with them.
+class DurableSaver(SqliteSaver):
+    def __init__(self, conn: sqlite3.Connection, keep: int, code_store: CodeStore | None = None, serde: SerializerProtocol | None = None):
+        super().__init__(conn, serde=serde)
+        self.keep = keep
+        self.code_store = code_store
+
+    @classmethod
+    def open(cls, path: Path, keep: int, code_store: CodeStore | None = None, serde: SerializerProtocol | None = None) -> "DurableSaver":
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout=5000")
+        return cls(conn, keep, code_store, serde)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        configurable = next_config["configurable"]
+        self.trim(configurable["thread_id"], configurable.get("checkpoint_ns", ""), self.keep)
+        return next_config
+
+    def trim(self, thread_id: str, checkpoint_ns: str, keep: int):
+        with self.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                    ORDER BY checkpoint_id DESC LIMIT ?
+                )
+                """,
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns, keep),
+            )
+            trimmed = cur.rowcount > 0
+            if trimmed:
+                cur.execute(
+                    """
+                    DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN (
+                        SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?
+                    )
+                    """,
+                    (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+                )
+        if trimmed and checkpoint_ns == "" and self.code_store is not None:
+            self.release_code(thread_id)
+
+    def release_code(self, thread_id: str):
+        kept = list(self.list({"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}))
+        if not kept:
+            return
+        refs = set()
+        for item in kept:
+            refs.update(item.checkpoint["channel_values"].get("codes", []))
+            refs.update(ref for _, channel, value in item.pending_writes or [] if channel == "codes" for ref in value)
+        self.code_store.retain(thread_id, refs, datetime.fromisoformat(kept[0].checkpoint["ts"]).timestamp()) # type: ignore
+
+    def prune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        for thread_id in thread_ids:
+            if strategy == "delete":
+                self.delete_thread(thread_id)
+                continue
+            with self.cursor(transaction=False) as cur:
+                namespaces = [row[0] for row in cur.execute("SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (str(thread_id),))]
+            for checkpoint_ns in namespaces:
+                self.trim(str(thread_id), checkpoint_ns, 1)
+
+    def delete_thread(self, thread_id: str) -> None:
+        super().delete_thread(thread_id)
+        if self.code_store is not None:
+            self.code_store.delete_thread(str(thread_id))
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: RunnableConfig | None, *, filter: dict[str, Any] | None = None, before: RunnableConfig | None = None, limit: int | None = None) -> AsyncIterator[CheckpointTuple]:
+        for item in await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit))):
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata, new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str, task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        await asyncio.to_thread(self.prune, thread_ids, strategy=strategy)
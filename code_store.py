@@ -0,0 +1,84 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+
+# Content-addressed store for generated code. State keeps the sha256 of each
+# version so checkpoints don't carry a copy of every version so far; a blob is
+# dropped once no thread's kept checkpoints reference it.
+class CodeStore:
+    def __init__(self, path: Path):
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS code_blobs (
+                    hash TEXT PRIMARY KEY,
+                    code TEXT NOT NULL
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS code_refs (
+                    thread_id TEXT NOT NULL,
+                    hash TEXT NOT NULL,
+                    PRIMARY KEY (thread_id, hash)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS code_refs_hash ON code_refs (hash)")
+            try:
+                self._conn.execute("ALTER TABLE code_refs ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass
+        return self._conn
+
+    def put(self, thread_id: str, code: str) -> str:
+        ref = hashlib.sha256(code.encode("utf-8")).hexdigest()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            conn.execute("INSERT OR IGNORE INTO code_blobs (hash, code) VALUES (?, ?)", (ref, code))
+            conn.execute("INSERT OR REPLACE INTO code_refs (thread_id, hash, created_at) VALUES (?, ?, ?)", (thread_id, ref, time.time()))
+            conn.execute("COMMIT")
+        return ref
+
+    def get(self, ref: str) -> str:
+        with self._lock:
+            row = self._connect().execute("SELECT code FROM code_blobs WHERE hash = ?", (ref,)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown code version {ref}")
+        return row[0]
+
+    def delete_thread(self, thread_id: str):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            conn.execute("DELETE FROM code_refs WHERE thread_id = ?", (thread_id,))
+            conn.execute("DELETE FROM code_blobs WHERE hash NOT IN (SELECT hash FROM code_refs)")
+            conn.execute("COMMIT")
+
+    # Drops the thread's refs that aren't in `refs`, and the blobs nothing else
+    # points to. Refs made at or after `before` are kept: the node that made
+    # them may not have had its write saved yet.
+    def retain(self, thread_id: str, refs: set[str], before: float):
+        with self._lock:
+            conn = self._connect()
+            # Takes the write lock up front; a read first could not be upgraded
+            # once a checkpoint write landed in between.
+            conn.execute("BEGIN IMMEDIATE")
+            stale = [
+                row[0] for row in conn.execute("SELECT hash FROM code_refs WHERE thread_id = ? AND created_at < ?", (thread_id, before))
+                if row[0] not in refs
+            ]
+            for ref in stale:
+                conn.execute("DELETE FROM code_refs WHERE thread_id = ? AND hash = ?", (thread_id, ref))
+                conn.execute("DELETE FROM code_blobs WHERE hash = ? AND hash NOT IN (SELECT hash FROM code_refs)", (ref,))
+            conn.execute("COMMIT")
@@ -0,0 +1,458 @@
+import io
+import json
+import logging
+import os
+import selectors
+import subprocess
+import sys
+import tarfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+import docker
+import docker.errors
+import requests.exceptions
+
+from metrics import gauge, record_render
+from pool import SandboxPool, WORKER
+from render_watch import RenderWatch
+from settings import settings
+
+logger = logging.getLogger("Masim")
+
+ProgressCallback = Callable[[dict], None] | None
+
+WORKER_SCRIPT = Path(__file__).parent/"sandbox"/"worker.py"
+
+# What a Docker daemon going away looks like, as opposed to a render failing
+HOST_ERRORS = (docker.errors.DockerException, requests.exceptions.ConnectionError, OSError)
+
+
+# Raised when a render host (not the render) failed; the scheduler retries the
+# render on another host.
+class HostError(Exception):
+    pass
+
+
+def job_environment(job_id: str, stats_dir: str = "/sandbox/media/stats") -> dict:
+    return {
+        "PYTHONUNBUFFERED": "1",
+        "MASIM_JOB_ID": job_id,
+        "MASIM_STATS_DIR": stats_dir,
+        "MASIM_CPU_LIMIT": str(settings.render_cpu_limit),
+        # The worker's own alarm is a backstop behind the host-side watchdog.
+        "MASIM_WALL_LIMIT": str(int(settings.render_timeout) + 30),
+    }
+
+
+def watch(kill, on_progress, cancel: threading.Event | None = None) -> RenderWatch:
+    return RenderWatch(kill, timeout=settings.render_timeout, grace=settings.traceback_grace, on_progress=on_progress, cancel=cancel)
+
+
+# CPU time and peak memory the worker wrote for a finished job, if any.
+def read_stats(path: Path) -> dict:
+    try:
+        stats = json.loads(path.read_text(encoding="utf-8"))
+        path.unlink()
+        return stats
+    except (OSError, ValueError):
+        return {}
+
+
+# Somewhere manim can run a job. Job scripts live in `jobs/` and results in
+# `media_root`, both as seen from where the job runs; `fetch` makes a result
+# available under the local output directory.
+class Executor(ABC):
+    name: str
+    capacity: int
+    media_root: str
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.in_flight = 0
+
+    def prepare(self, script: Path):
+        pass
+
+    @abstractmethod
+    def run_manim(self, args: list[str], on_progress: ProgressCallback = None, cancel: threading.Event | None = None) -> tuple[int, str, str]:
+        ...
+
+    @abstractmethod
+    def run_command(self, command: list[str]) -> tuple[int, str, str]:
+        ...
+
+    def fetch(self, relative: str) -> Path | None:
+        path = (self.output_dir/relative).absolute()
+        return path if path.exists() else None
+
+    # Local hosts share the output directory, which MediaStore manages, so
+    # only remote ones have anything to remove.
+    def cleanup(self, script: Path, media: list[str]):
+        pass
+
+    # Overlap with planning: have a worker ready and the plan's formulas in
+    # the Tex cache before the first render arrives.
+    def warm(self):
+        pass
+
+    def precompile_tex(self, expressions: list[str], cancel: threading.Event | None = None) -> bool:
+        return False
+
+    # Local hosts share the Tex cache directory runner.tex_cache prunes.
+    def evict_tex(self, max_bytes: int):
+        pass
+
+    @abstractmethod
+    def image_digest(self) -> str:
+        ...
+
+    @abstractmethod
+    def symbols(self) -> list[str]:
+        ...
+
+
+class ChunkReader(io.RawIOBase):
+    def __init__(self, chunks: Iterator[bytes]):
+        self.chunks = chunks
+        self.buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self.buffer:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                return 0
+            self.buffer = chunk
+        size = min(len(b), len(self.buffer))
+        b[:size] = self.buffer[:size]
+        self.buffer = self.buffer[size:]
+        return size
+
+
+# The sandbox image on a Docker daemon, with a warm pool per daemon. The local
+# daemon bind-mounts the job and output directories; a remote one keeps them
+# in named volumes, so scripts are uploaded before a job and results streamed
+# back afterwards.
+class DockerExecutor(Executor):
+    media_root = "/sandbox/media"
+
+    def __init__(self, name: str, client: Callable[[], docker.DockerClient], capacity: int, output_dir: Path, volumes: dict | None = None):
+        super().__init__(output_dir)
+        self.name = name
+        self.client = client
+        self.capacity = capacity
+        self.remote = volumes is None
+        self.volumes = volumes or {
+            "masim-jobs": {"bind": "/sandbox/jobs", "mode": "ro"},
+            "masim-media": {"bind": "/sandbox/media", "mode": "rw"},
+            "masim-tex": {"bind": "/sandbox/media/Tex", "mode": "rw"},
+        }
+        self.pool = SandboxPool(
+            client,
+            image=settings.sandbox_image,
+            volumes=self.volumes,
+            size=settings.pool_size,
+            max_jobs=settings.pool_max_jobs,
+            max_memory_mb=settings.pool_max_memory_mb,
+            mem_limit=settings.sandbox_mem_limit,
+            start_timeout=settings.pool_start_timeout,
+        )
+
+    # A stopped container over the host's volumes, for copying files in and out.
+    @contextmanager
+    def transfer(self):
+        volumes = {name: {**volume, "mode": "rw"} for name, volume in self.volumes.items()}
+        container = self.client().containers.create(image=settings.sandbox_image, command=["true"], volumes=volumes, user="runner")
+        try:
+            yield container
+        finally:
+            container.remove(force=True)
+
+    def prepare(self, script: Path):
+        if not self.remote:
+            return
+        archive = io.BytesIO()
+        with tarfile.open(fileobj=archive, mode="w") as tar:
+            info = tar.gettarinfo(str(script), arcname=script.name)
+            info.mode = 0o644
+            with open(script, "rb") as f:
+                tar.addfile(info, f)
+        try:
+            with self.transfer() as container:
+                container.put_archive("/sandbox/jobs", archive.getvalue())
+        except HOST_ERRORS as e:
+            raise HostError(f"{self.name}: could not upload the job: {e}") from e
+
+    def stats(self, job_id: str) -> dict:
+        if self.remote:
+            try:
+                self.fetch(f"stats/{job_id}.json")
+            except HostError:
+                return {}
+        return read_stats(self.output_dir/"stats"/f"{job_id}.json")
+
+    # Helper commands (`record=False`) don't count as renders in the metrics.
+    def run_oneshot(self, command: list[str], on_progress: ProgressCallback = None, cancel: threading.Event | None = None, record: bool = True) -> tuple[int, str, str]:
+        job_id = uuid.uuid4().hex
+        started = time.perf_counter()
+        container = self.client().containers.run(
+            image=settings.sandbox_image,
+            command=command,
+            volumes=self.volumes,
+            working_dir="/sandbox",
+            network_disabled=False,
+            mem_limit=settings.sandbox_mem_limit,
+            detach=True,
+            user="runner",
+            environment=job_environment(job_id),
+        )
+        running = time.perf_counter()
+        try:
+            with watch(container.kill, on_progress, cancel) as w:
+                for stdout, stderr in container.attach(stdout=True, stderr=True, stream=True, logs=True, demux=True):
+                    w.feed(stdout, stderr)
+                exit_code = container.wait()["StatusCode"]
+            if record:
+                record_render(running - started, time.perf_counter() - running, **self.stats(job_id))
+            return w.result(exit_code)
+        finally:
+            container.remove(force=True)
+
+    def run_in_sandbox(self, pooled_command: list[str], oneshot_command: list[str], on_progress: ProgressCallback = None, cancel: threading.Event | None = None, record: bool = True) -> tuple[int, str, str]:
+        try:
+            started = time.perf_counter()
+            pooled = self.pool.acquire()
+            if pooled is None:
+                return self.run_oneshot(oneshot_command, on_progress, cancel, record)
+
+            job_id = uuid.uuid4().hex
+            running = time.perf_counter()
+            try:
+                with watch(lambda: pooled.cancel(job_id), on_progress, cancel) as w:
+                    exit_code = pooled.exec_stream(pooled_command, job_environment(job_id), w.feed)
+            except docker.errors.DockerException:
+                self.pool.release(pooled, failed=True)
+                logger.warning(f"Sandbox pool ({self.name}): worker failed, retrying with a one-shot container")
+                return self.run_oneshot(oneshot_command, on_progress, cancel, record)
+            except BaseException:
+                # Whatever else went wrong (e.g. the connection to the daemon
+                # dropped), the worker's slot must go back to the pool.
+                self.pool.release(pooled, failed=True)
+                raise
+
+            self.pool.release(pooled)
+            if record:
+                record_render(running - started, time.perf_counter() - running, **self.stats(job_id))
+            return w.result(exit_code)
+        except HOST_ERRORS as e:
+            raise HostError(f"{self.name}: {e}") from e
+
+    def run_manim(self, args: list[str], on_progress: ProgressCallback = None, cancel: threading.Event | None = None) -> tuple[int, str, str]:
+        return self.run_in_sandbox([*WORKER, "submit", *args], [*WORKER, "run", *args], on_progress, cancel)
+
+    def run_command(self, command: list[str]) -> tuple[int, str, str]:
+        return self.run_in_sandbox(command, command, record=False)
+
+    def warm(self):
+        try:
+            self.pool.warm()
+        except HOST_ERRORS as e:
+            logger.warning(f"Sandbox pool ({self.name}): could not warm: {e}")
+
+    # Only runs on a pooled worker; a one-shot container would cost more than
+    # the formulas save. True once every formula went through the compiler.
+    def precompile_tex(self, expressions: list[str], cancel: threading.Event | None = None) -> bool:
+        try:
+            pooled = self.pool.acquire()
+            if pooled is None:
+                return False
+            job_id = uuid.uuid4().hex
+            try:
+                with watch(lambda: pooled.cancel(job_id), None, cancel) as w:
+                    exit_code = pooled.exec_stream([*WORKER, "submit-tex", json.dumps(expressions)], job_environment(job_id, stats_dir=""), w.feed)
+            except docker.errors.DockerException:
+                self.pool.release(pooled, failed=True)
+                return False
+            except BaseException:
+                self.pool.release(pooled, failed=True)
+                raise
+            self.pool.release(pooled)
+            exit_code, _, _ = w.result(exit_code)
+            if exit_code != 0 and not (cancel is not None and cancel.is_set()):
+                logger.warning(f"Sandbox pool ({self.name}): formula precompile exited with {exit_code}")
+            return exit_code == 0
+        except HOST_ERRORS as e:
+            logger.warning(f"Sandbox pool ({self.name}): could not precompile formulas: {e}")
+            return False
+
+    def evict_tex(self, max_bytes: int):
+        if not self.remote:
+            return
+        try:
+            exit_code, stdout, stderr = self.run_command([*WORKER, "evict-tex", str(max_bytes)])
+        except HostError as e:
+            logger.warning(f"Could not prune the Tex cache on {self.name}: {e}")
+            return
+        if exit_code != 0:
+            logger.warning(f"Could not prune the Tex cache on {self.name}: {stderr.strip()}")
+        elif stdout.strip():
+            logger.info(f"Tex cache ({self.name}): {stdout.strip()}")
+
+    # Streams `media_root/relative` out of the host's volume into the same
+    # place under the local output directory.
+    def fetch(self, relative: str) -> Path | None:
+        if not self.remote:
+            return super().fetch(relative)
+        target = (self.output_dir/relative).absolute()
+        try:
+            with self.transfer() as container:
+                chunks, _ = container.get_archive(f"{self.media_root}/{relative}")
+                target.parent.mkdir(parents=True, exist_ok=True)
+                with tarfile.open(fileobj=io.BufferedReader(ChunkReader(iter(chunks))), mode="r|") as tar:
+                    tar.extractall(target.parent, filter="data")
+        except docker.errors.NotFound:
+            return None
+        except HOST_ERRORS as e:
+            raise HostError(f"{self.name}: could not fetch {relative}: {e}") from e
+        return target if target.exists() else None
+
+    def cleanup(self, script: Path, media: list[str]):
+        if not self.remote:
+            return
+        try:
+            self.run_command(["rm", "-rf", f"/sandbox/jobs/{script.name}", *(f"{self.media_root}/{relative}" for relative in media)])
+        except HostError as e:
+            logger.warning(f"Could not clean up after a render: {e}")
+
+    def image_digest(self) -> str:
+        return self.client().images.get(settings.sandbox_image).id
+
+    def symbols(self) -> list[str]:
+        output = self.client().containers.run(
+            image=settings.sandbox_image,
+            command=[*WORKER, "symbols"],
+            working_dir="/sandbox",
+            user="runner",
+            remove=True,
+        )
+        return json.loads(output.decode("utf-8"))
+
+
+# Runs the worker with manim installed next to the agent, in the agent's own
+# job and output directories. A stand-in for the sandbox in tests and
+# benchmarks; it has no isolation.
+class SubprocessExecutor(Executor):
+    name = "subprocess"
+
+    def __init__(self, capacity: int, output_dir: Path, workdir: Path, python: str = sys.executable):
+        super().__init__(output_dir)
+        self.capacity = capacity
+        self.workdir = workdir
+        self.python = python
+        self.media_root = str(output_dir.absolute())
+
+    def run_manim(self, args: list[str], on_progress: ProgressCallback = None, cancel: threading.Event | None = None) -> tuple[int, str, str]:
+        job_id = uuid.uuid4().hex
+        started = time.perf_counter()
+        process = subprocess.Popen(
+            [self.python, str(WORKER_SCRIPT), "run", "--media_dir", self.media_root, *args],
+            cwd=self.workdir,
+            env={**os.environ, **job_environment(job_id, f"{self.media_root}/stats")},
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        running = time.perf_counter()
+        with watch(process.kill, on_progress, cancel) as w:
+            streams = {process.stdout: "stdout", process.stderr: "stderr"}
+            sel = selectors.DefaultSelector()
+            for stream in streams:
+                sel.register(stream, selectors.EVENT_READ)
+            while streams:
+                for key, _ in sel.select():
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        w.feed(*((data, None) if streams[key.fileobj] == "stdout" else (None, data)))
+                    else:
+                        sel.unregister(key.fileobj)
+                        del streams[key.fileobj]
+            sel.close()
+            exit_code = process.wait()
+        record_render(running - started, time.perf_counter() - running, **read_stats(self.output_dir/"stats"/f"{job_id}.json"))
+        # Report signals the way Docker does, so signal_of reads them the same.
+        return w.result(128 - exit_code if exit_code < 0 else exit_code)
+
+    def run_command(self, command: list[str]) -> tuple[int, str, str]:
+        result = subprocess.run(command, cwd=self.workdir, capture_output=True, text=True)
+        return result.returncode, result.stdout, result.stderr
+
+    def image_digest(self) -> str:
+        return f"subprocess:{self.python}"
+
+    def symbols(self) -> list[str]:
+        result = subprocess.run([self.python, str(WORKER_SCRIPT), "symbols"], capture_output=True, text=True, check=True)
+        return json.loads(result.stdout)
+
+
+# Hands each render to the executor with the lowest in-flight/capacity ratio,
+# waiting while all of them are full. Hosts that failed are skipped for
+# `cooldown` seconds.
+class Scheduler:
+    def __init__(self, executors: list[Executor], cooldown: float):
+        self.executors = executors
+        self.cooldown = cooldown
+        self._failed_at: dict[str, float] = {}
+        self._available = threading.Condition()
+
+    def candidates(self, exclude: set[str]) -> list[Executor]:
+        now = time.monotonic()
+        return [
+            executor for executor in self.executors
+            if executor.name not in exclude and now - self._failed_at.get(executor.name, -self.cooldown) >= self.cooldown
+        ]
+
+    # Where the next render would most likely go, without taking a slot.
+    def least_loaded(self) -> Executor | None:
+        with self._available:
+            candidates = self.candidates(set())
+            return min(candidates, key=lambda executor: executor.in_flight / executor.capacity) if candidates else None
+
+    # None once every host has been tried or is cooling down. `prefer` wins
+    # whenever it has a free slot.
+    def acquire(self, exclude: set[str], prefer: str | None = None) -> Executor | None:
+        with self._available:
+            while True:
+                candidates = self.candidates(exclude)
+                if not candidates:
+                    return None
+                free = [executor for executor in candidates if executor.in_flight < executor.capacity]
+                if free:
+                    executor = next((executor for executor in free if executor.name == prefer), None) or min(free, key=lambda executor: executor.in_flight / executor.capacity)
+                    executor.in_flight += 1
+                    gauge("masim_render_in_flight", executor.in_flight, host=executor.name)
+                    return executor
+                self._available.wait(timeout=1.0)
+
+    # Takes up to `wanted` more of `executor`'s free slots for a render that
+    # fans out into several jobs, without waiting; returns how many it got.
+    def extend(self, executor: Executor, wanted: int) -> int:
+        with self._available:
+            slots = max(0, min(wanted, executor.capacity - executor.in_flight))
+            executor.in_flight += slots
+            gauge("masim_render_in_flight", executor.in_flight, host=executor.name)
+            return slots
+
+    def release(self, executor: Executor, failed: bool = False, slots: int = 1):
+        with self._available:
+            executor.in_flight -= slots
+            gauge("masim_render_in_flight", executor.in_flight, host=executor.name)
+            if failed:
+                self._failed_at[executor.name] = time.monotonic()
+            self._available.notify_all()
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from pydantic import BaseModel
+
+logger = logging.getLogger("Masim")
+
+# Messages rendered into a prompt carry the uuid add_messages gave them, which
+# differs on every resubmission of the same request.
+MESSAGE_ID = re.compile(r"\bid='[0-9a-f-]{36}'")
+
+
+# Structured LLM responses keyed on model, rendered prompt and response schema,
+# with a TTL and least-recently-used eviction past `max_entries`.
+class LLMCache:
+    def __init__(self, path: Path, ttl: float, max_entries: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    node TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        return self._conn
+
+    @staticmethod
+    def key(model_name: str, prompt: str, schema: type[BaseModel]) -> str:
+        h = hashlib.sha256()
+        for part in (model_name, MESSAGE_ID.sub("", prompt), json.dumps(schema.model_json_schema(), sort_keys=True)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, node: str, key: str, schema: type[BaseModel]) -> BaseModel | None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+
+        if row is None:
+            return None
+
+        logger.info(f"LLM cache hit: {node}")
+        return schema.model_validate_json(row[0])
+
+    def put(self, node: str, key: str, response: BaseModel):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, node, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, node, response.model_dump_json(), now, now),
+            )
+            conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
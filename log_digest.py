@@ -0,0 +1,134 @@
+import re
+from dataclasses import dataclass, field
+
+from preflight import SCRIPT_NAME
+from render_watch import PROGRESS_PATTERN, TRACEBACK_MARKER
+
+# Rough size of a token in the English/code text manim prints; kept on the low
+# side so the budget holds for the real tokenizer too.
+CHARS_PER_TOKEN = 3
+
+# `File "/sandbox/jobs/tmpab12.py", line 5, in construct`
+PLAIN_FRAME = re.compile(r'File "(?P<path>[^"]+)", line (?P<line>\d+), in (?P<func>\S+)')
+# `│ /sandbox/jobs/tmpab12.py:5 in construct  │` from rich's traceback panels
+RICH_FRAME = re.compile(r"^[│|]?\s*(?P<path>\S+\.py):(?P<line>\d+) in (?P<func>\S+)")
+EXCEPTION_LINE = re.compile(r"^(?P<type>[A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt|Warning)|KeyboardInterrupt|StopIteration)(?::\s*(?P<message>.*))?$")
+WARNING_LINE = re.compile(r"^(?:WARNING\b|\S*Warning:)")
+# Any tqdm bar, including ones that aren't manim's per-animation bars
+PROGRESS_MARKS = re.compile(r"%\||it/s\]")
+# Log prefixes manim puts in front of every line, e.g. `[10/18/26 12:00:00] `
+LOG_PREFIX = re.compile(r"^\[[\d/: ]+\]\s*")
+
+MAX_WARNINGS = 5
+MAX_USER_FRAMES = 5
+STDOUT_TAIL = 5
+
+
+@dataclass
+class Frame:
+    path: str
+    line: int
+    func: str
+    source: str | None = None
+
+    def describe(self) -> str:
+        where = f"line {self.line} in {self.func}" if self.source is not None else f"{self.path}:{self.line} in {self.func}"
+        return f"{where}: {self.source.strip()}" if self.source else where
+
+
+@dataclass
+class ErrorDigest:
+    exception: str | None = None
+    user_frames: list[Frame] = field(default_factory=list)
+    raised_in: Frame | None = None
+    warnings: dict[str, int] = field(default_factory=dict)
+    stdout_tail: list[str] = field(default_factory=list)
+
+    # Sections in the order they matter to the analyzer; whatever doesn't fit
+    # in `max_tokens` is cut from the end.
+    def render(self, max_tokens: int) -> str:
+        sections = [f"exception: {self.exception or 'none'}"]
+        if self.user_frames:
+            sections.append("user code frames (innermost last):\n" + "\n".join(f"  {frame.describe()}" for frame in self.user_frames))
+        if self.raised_in is not None:
+            sections.append(f"raised in: {self.raised_in.describe()}")
+        if self.warnings:
+            sections.append(f"warnings ({len(self.warnings)}):\n" + "\n".join(f"  [x{count}] {text}" for text, count in list(self.warnings.items())[:MAX_WARNINGS]))
+        if self.stdout_tail:
+            sections.append("stdout (last lines):\n" + "\n".join(f"  {line}" for line in self.stdout_tail))
+
+        budget = max_tokens * CHARS_PER_TOKEN
+        text = ""
+        for section in sections:
+            candidate = f"{text}\n{section}" if text else section
+            if len(candidate) > budget:
+                return (candidate[:budget - 3] + "...") if not text else text
+            text = candidate
+        return text
+
+
+def output_lines(text: str) -> list[str]:
+    # tqdm redraws its bars with \r, so every redraw is its own line here.
+    lines = []
+    for line in re.split(r"[\r\n]", text):
+        line = LOG_PREFIX.sub("", line.strip()).strip()
+        if line and not PROGRESS_PATTERN.search(line) and not PROGRESS_MARKS.search(line):
+            lines.append(line)
+    return lines
+
+
+def is_user_frame(path: str) -> bool:
+    return "/jobs/" in path or path == SCRIPT_NAME
+
+
+def parse_frames(lines: list[str], code: str) -> list[Frame]:
+    source = code.splitlines()
+    frames = []
+    for line in lines:
+        match = PLAIN_FRAME.search(line) or RICH_FRAME.search(line)
+        if match is None:
+            continue
+        frame = Frame(match["path"], int(match["line"]), match["func"])
+        if is_user_frame(frame.path) and 0 < frame.line <= len(source):
+            frame.source = source[frame.line - 1]
+        frames.append(frame)
+    return frames
+
+
+def last_exception(lines: list[str]) -> str | None:
+    for line in reversed(lines):
+        match = EXCEPTION_LINE.match(line.strip("│| "))
+        if match and not match["type"].endswith("Warning"):
+            return line.strip("│| ")
+    return None
+
+
+# Turns a render's stdout/stderr into the few facts the analyzer needs: the
+# exception, where in the user's script it happened, the library frame that
+# raised it, distinct warnings and how stdout ended.
+def extract(stdout: str, stderr: str, code: str) -> ErrorDigest:
+    digest = ErrorDigest()
+    err_lines = output_lines(stderr)
+    out_lines = output_lines(stdout)
+
+    start = max((i for i, line in enumerate(err_lines) if TRACEBACK_MARKER in line), default=None)
+    traceback_lines = err_lines[start:] if start is not None else err_lines
+
+    frames = parse_frames(traceback_lines, code)
+    digest.user_frames = [frame for frame in frames if frame.source is not None][-MAX_USER_FRAMES:]
+    library_frames = [frame for frame in frames if frame.source is None]
+    if library_frames and (not frames or frames[-1].source is None):
+        digest.raised_in = library_frames[-1]
+
+    digest.exception = last_exception(traceback_lines)
+
+    for line in err_lines + out_lines:
+        if WARNING_LINE.match(line):
+            digest.warnings[line] = digest.warnings.get(line, 0) + 1
+
+    digest.stdout_tail = [line for line in out_lines if not WARNING_LINE.match(line)][-STDOUT_TAIL:]
+    return digest
+
+
+def digest_output(stdout: str, stderr: str, code: str, max_tokens: int) -> str:
+    return extract(stdout, stderr, code).render(max_tokens)
@@ -0,0 +1,228 @@
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger("Masim")
+
+VARIANT_SUFFIXES = {"poster": "poster.jpg", "preview": "preview.mp4"}
+
+
+def tree_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.stat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+# Rendered videos on disk. Every render attempt leaves a directory under
+# output/videos; those are evicted least recently used first once output/videos
+# passes `quota_bytes`. Directories of renders still running (job names in
+# `rendering`) are left alone. The latest attempt of a session that isn't
+# finalized yet is what its user is reviewing, so it is kept; only what it
+# replaced goes. A session's approved final render moves to
+# output/sessions/<id>/final.mp4, is never evicted nor counted against the
+# quota, and replaces the session's attempts. Posters and low-bitrate previews are made next to a video the
+# first time they're asked for.
+class MediaStore:
+    def __init__(self, path: Path, roots: dict[str, Path], quota_bytes: int, ffmpeg: str, preview_height: int, preview_bitrate: str, rendering: set[str] | None = None):
+        self.path = path
+        # URL prefix -> directory videos are served from; "output" holds attempts and finals
+        self.roots = roots
+        self.videos_dir = roots["output"]/"videos"
+        self.sessions_dir = roots["output"]/"sessions"
+        self.quota_bytes = quota_bytes
+        self.ffmpeg = ffmpeg
+        self.preview_height = preview_height
+        self.preview_bitrate = preview_bitrate
+        self.rendering = rendering if rendering is not None else set()
+
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._variant_locks: dict[Path, threading.Lock] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS media_attempts (
+                    video_dir TEXT PRIMARY KEY,
+                    session_id TEXT NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS media_attempts_session ON media_attempts (session_id)")
+            try:
+                self._conn.execute("ALTER TABLE media_attempts ADD COLUMN video TEXT")
+            except sqlite3.OperationalError:
+                pass
+        return self._conn
+
+    # output/videos/<stem>/<quality>/output.mp4 -> output/videos/<stem>
+    def attempt_dir(self, video: Path) -> Path | None:
+        video = video.absolute()
+        if not video.is_relative_to(self.videos_dir.absolute()):
+            return None
+        return self.videos_dir.absolute()/video.relative_to(self.videos_dir.absolute()).parts[0]
+
+    def url(self, path: str) -> str | None:
+        video = Path(path).absolute()
+        for name, root in self.roots.items():
+            if video.is_relative_to(root.absolute()):
+                return f"/media/{name}/{video.relative_to(root.absolute()).as_posix()}"
+        return None
+
+    def resolve(self, root: str, relative: str) -> Path | None:
+        if root not in self.roots:
+            return None
+        base = self.roots[root].resolve()
+        video = (base/relative).resolve()
+        if not video.is_relative_to(base) or not video.is_file():
+            return None
+        return video
+
+    def record_attempt(self, session_id: str, output_path: str):
+        video_dir = self.attempt_dir(Path(output_path))
+        if video_dir is None:
+            return
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO media_attempts (video_dir, session_id, last_used, video) VALUES (?, ?, ?, ?)",
+                (str(video_dir), session_id, time.time(), str(Path(output_path).absolute())),
+            )
+        self.enforce_quota()
+
+    def touch(self, video: Path):
+        video_dir = self.attempt_dir(video)
+        if video_dir is None:
+            return
+        with self._lock:
+            self._connect().execute("UPDATE media_attempts SET last_used = ? WHERE video_dir = ?", (time.time(), str(video_dir)))
+
+    def finalize(self, session_id: str, output_path: str) -> str:
+        final = (self.sessions_dir/session_id/"final.mp4").absolute()
+        source = Path(output_path).absolute()
+        if source != final:
+            final.parent.mkdir(parents=True, exist_ok=True)
+            staging = final.with_name(f".{uuid.uuid4().hex}.mp4")
+            # Attempts are about to be deleted, so they move; cached renders are copied.
+            if self.attempt_dir(source) is not None:
+                shutil.move(source, staging)
+            else:
+                shutil.copyfile(source, staging)
+            os.replace(staging, final)
+            for name in VARIANT_SUFFIXES.values():
+                final.with_name(f"{final.stem}.{name}").unlink(missing_ok=True)
+        self.delete_attempts(session_id)
+        self.enforce_quota()
+        return str(final)
+
+    def delete_attempts(self, session_id: str):
+        with self._lock:
+            conn = self._connect()
+            video_dirs = [row[0] for row in conn.execute("SELECT video_dir FROM media_attempts WHERE session_id = ?", (session_id,))]
+            conn.execute("DELETE FROM media_attempts WHERE session_id = ?", (session_id,))
+        for video_dir in video_dirs:
+            shutil.rmtree(video_dir, ignore_errors=True)
+
+    def delete_session(self, session_id: str):
+        self.delete_attempts(session_id)
+        shutil.rmtree(self.sessions_dir/session_id, ignore_errors=True)
+
+    def enforce_quota(self):
+        if not self.videos_dir.exists():
+            return
+        total = tree_size(self.videos_dir)
+        if total <= self.quota_bytes:
+            return
+
+        with self._lock:
+            conn = self._connect()
+            last_used = dict(conn.execute("SELECT video_dir, last_used FROM media_attempts").fetchall())
+            # The most recently recorded attempt of each session
+            latest = dict(conn.execute(
+                "SELECT video_dir, video FROM media_attempts WHERE rowid IN (SELECT MAX(rowid) FROM media_attempts GROUP BY session_id)"
+            ).fetchall())
+        # Directories from before tracking started fall back to their mtime.
+        attempts = sorted(
+            (last_used.get(entry.path, entry.stat().st_mtime), entry.path)
+            for entry in os.scandir(self.videos_dir.absolute()) if entry.is_dir() and entry.name not in self.rendering
+        )
+        evicted = []
+        for _, video_dir in attempts:
+            if total <= self.quota_bytes:
+                break
+            if video_dir in latest:
+                # A session workspace also holds the attempts before the
+                # latest and manim's partial movies; those can go.
+                total -= self.prune(Path(video_dir), latest[video_dir])
+                continue
+            total -= tree_size(Path(video_dir))
+            shutil.rmtree(video_dir, ignore_errors=True)
+            evicted.append(video_dir)
+
+        if evicted:
+            logger.info(f"Media: evicted {len(evicted)} render attempts to stay under the disk quota")
+            with self._lock:
+                self._connect().executemany("DELETE FROM media_attempts WHERE video_dir = ?", [(video_dir,) for video_dir in evicted])
+
+    # Removes everything under `video_dir` but `keep` and its poster/preview;
+    # returns the bytes freed. Without a known `keep` nothing is removed.
+    def prune(self, video_dir: Path, keep: str | None) -> int:
+        if keep is None:
+            return 0
+        video = Path(keep)
+        kept = {video, *(video.with_name(f"{video.stem}.{name}") for name in VARIANT_SUFFIXES.values())}
+        freed = 0
+        for root, _, files in os.walk(video_dir):
+            for name in files:
+                path = Path(root)/name
+                if path in kept:
+                    continue
+                try:
+                    freed += path.stat().st_size
+                    path.unlink()
+                except OSError:
+                    pass
+        return freed
+
+    def ffmpeg_args(self, variant: str) -> list[str]:
+        if variant == "poster":
+            return ["-vf", "thumbnail,scale=640:-2", "-frames:v", "1"]
+        return [
+            "-vf", f"scale=-2:{self.preview_height}", "-c:v", "libx264", "-preset", "veryfast",
+            "-b:v", self.preview_bitrate, "-an", "-movflags", "+faststart",
+        ]
+
+    # Poster or preview of `video`, generated on first request. None when
+    # ffmpeg is missing or fails.
+    def variant(self, video: Path, variant: str) -> Path | None:
+        target = video.with_name(f"{video.stem}.{VARIANT_SUFFIXES[variant]}")
+        with self._lock:
+            lock = self._variant_locks.setdefault(target, threading.Lock())
+        with lock:
+            if target.exists():
+                return target
+            staging = target.with_name(f".{uuid.uuid4().hex}{target.suffix}")
+            try:
+                subprocess.run(
+                    [self.ffmpeg, "-y", "-loglevel", "error", "-i", str(video), *self.ffmpeg_args(variant), str(staging)],
+                    capture_output=True, check=True,
+                )
+                os.replace(staging, target)
+            except (OSError, subprocess.CalledProcessError) as e:
+                logger.warning(f"Media: could not make a {variant} of {video}: {e}")
+                staging.unlink(missing_ok=True)
+                return None
+        return target
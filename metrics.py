@@ -0,0 +1,237 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+from settings import settings
+
+logger = logging.getLogger("Masim")
+
+
+@dataclass
+class Span:
+    node: str
+    session_id: str | None
+    retry: int | None
+    started_at: float = field(default_factory=time.time)
+    wall_seconds: float = 0.0
+    llm_calls: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    cache_hits: int = 0
+    error: str | None = None
+    # Filled in by renders: jobs, container_start_seconds, render_seconds,
+    # cpu_seconds, peak_memory_mb, memory_limit_mb, cache_hit
+    render: dict = field(default_factory=dict)
+
+
+current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+
+_lock = threading.Lock()
+_counters: dict[tuple[str, tuple], float] = defaultdict(float)
+_gauges: dict[tuple[str, tuple], float] = {}
+
+HELP = {
+    "masim_node_runs_total": ("counter", "Node executions"),
+    "masim_node_errors_total": ("counter", "Node executions that raised"),
+    "masim_node_seconds_total": ("counter", "Wall time spent in each node"),
+    "masim_llm_calls_total": ("counter", "LLM calls"),
+    "masim_llm_tokens_total": ("counter", "LLM tokens by direction"),
+    "masim_llm_cache_hits_total": ("counter", "LLM responses served from the cache"),
+    "masim_llm_cache_misses_total": ("counter", "Cacheable LLM calls the cache had no response for"),
+    "masim_routing_decisions_total": ("counter", "Model picked for each LLM node, and why"),
+    "masim_routing_outcomes_total": ("counter", "Fixes that passed or failed code_analyzer, by model"),
+    "masim_render_jobs_total": ("counter", "Sandbox render jobs"),
+    "masim_prefetch_total": ("counter", "Sandbox warm-ups and formula precompiles started while planning"),
+    "masim_render_cache_hits_total": ("counter", "Renders served from the render cache"),
+    "masim_container_start_seconds_total": ("counter", "Time spent acquiring or starting a sandbox container"),
+    "masim_render_seconds_total": ("counter", "Time spent rendering in the sandbox"),
+    "masim_render_cpu_seconds_total": ("counter", "CPU time used by render jobs"),
+    "masim_render_in_flight": ("gauge", "Renders running on each render host"),
+    "masim_render_peak_memory_mb": ("gauge", "Peak memory of the last render job"),
+    "masim_render_memory_limit_ratio": ("gauge", "Peak memory of the last render job over the container memory limit"),
+}
+
+
+def memory_limit_mb(limit: str) -> float:
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)\s*([kmg]?)b?", limit.strip().lower())
+    if match is None:
+        return 0.0
+    return float(match[1]) * {"": 1 / (1024 * 1024), "k": 1 / 1024, "m": 1, "g": 1024}[match[2]]
+
+
+def count(name: str, value: float = 1, **labels):
+    with _lock:
+        _counters[(name, tuple(sorted(labels.items())))] += value
+
+
+def gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+def record_llm(usage: dict | None):
+    span = current_span.get()
+    node = span.node if span else "none"
+    tokens_in = (usage or {}).get("input_tokens", 0)
+    tokens_out = (usage or {}).get("output_tokens", 0)
+    count("masim_llm_calls_total", node=node)
+    count("masim_llm_tokens_total", tokens_in, node=node, direction="in")
+    count("masim_llm_tokens_total", tokens_out, node=node, direction="out")
+    if span is not None:
+        with _lock:
+            span.llm_calls += 1
+            span.tokens_in += tokens_in
+            span.tokens_out += tokens_out
+
+
+def record_cache_miss():
+    span = current_span.get()
+    count("masim_llm_cache_misses_total", node=span.node if span else "none")
+
+
+def record_cache_hit():
+    span = current_span.get()
+    count("masim_llm_cache_hits_total", node=span.node if span else "none")
+    if span is not None:
+        with _lock:
+            span.cache_hits += 1
+
+
+def record_render(container_start_seconds: float = 0.0, render_seconds: float = 0.0, cpu_seconds: float | None = None, peak_memory_mb: float | None = None, cache_hit: bool = False):
+    if cache_hit:
+        count("masim_render_cache_hits_total")
+    else:
+        count("masim_render_jobs_total")
+        count("masim_container_start_seconds_total", container_start_seconds)
+        count("masim_render_seconds_total", render_seconds)
+    limit = memory_limit_mb(settings.sandbox_mem_limit)
+    if cpu_seconds is not None:
+        count("masim_render_cpu_seconds_total", cpu_seconds)
+    if peak_memory_mb is not None:
+        gauge("masim_render_peak_memory_mb", peak_memory_mb)
+        if limit:
+            gauge("masim_render_memory_limit_ratio", peak_memory_mb / limit)
+
+    span = current_span.get()
+    if span is None:
+        return
+    with _lock:
+        render = span.render
+        render["cache_hit"] = render.get("cache_hit", False) or cache_hit
+        if cache_hit:
+            return
+        # Parallel scenes run several jobs for one render; sum the times and
+        # keep the largest peak.
+        render["jobs"] = render.get("jobs", 0) + 1
+        render["container_start_seconds"] = render.get("container_start_seconds", 0.0) + container_start_seconds
+        render["render_seconds"] = render.get("render_seconds", 0.0) + render_seconds
+        if cpu_seconds is not None:
+            render["cpu_seconds"] = render.get("cpu_seconds", 0.0) + cpu_seconds
+        if peak_memory_mb is not None:
+            render["peak_memory_mb"] = max(render.get("peak_memory_mb", 0.0), peak_memory_mb)
+            render["memory_limit_mb"] = limit
+
+
+def export(span: Span):
+    count("masim_node_runs_total", node=span.node)
+    count("masim_node_seconds_total", span.wall_seconds, node=span.node)
+    if span.error is not None:
+        count("masim_node_errors_total", node=span.node)
+
+    if settings.metrics_path:
+        line = json.dumps(asdict(span), ensure_ascii=False)
+        with _lock, open(Path(settings.metrics_path), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    if span.error is not None or random.random() < settings.log_sample_rate:
+        logger.info(summarize_span(span))
+
+
+def summarize_span(span: Span) -> str:
+    parts = [f"{span.node} {span.wall_seconds:.2f}s", f"retry={span.retry}"]
+    if span.llm_calls:
+        parts.append(f"llm={span.llm_calls} tokens={span.tokens_in}/{span.tokens_out}")
+    if span.cache_hits:
+        parts.append(f"cache_hits={span.cache_hits}")
+    if span.render:
+        parts.append(" ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}" for key, value in span.render.items()))
+    if span.error:
+        parts.append(f"error={span.error}")
+    return " ".join(parts)
+
+
+@contextmanager
+def span(node: str, state: dict):
+    current = Span(node, state.get("session_id"), state.get("retry"))
+    token = current_span.set(current)
+    started = time.perf_counter()
+    try:
+        yield current
+    except Exception as e:
+        current.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        current.wall_seconds = time.perf_counter() - started
+        current_span.reset(token)
+        export(current)
+
+
+# Wraps a graph node (sync or async) so each run is recorded as a span.
+def instrument(node: str, func):
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(state, *args, **kwargs):
+            with span(node, state):
+                return await func(state, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(state, *args, **kwargs):
+        with span(node, state):
+            return func(state, *args, **kwargs)
+    return wrapper
+
+
+def summarize_event(event: dict) -> str:
+    # Node names and the size of what each one wrote, without the payload.
+    parts = []
+    for node, update in event.items():
+        if isinstance(update, dict):
+            sizes = ", ".join(f"{key}={len(value) if isinstance(value, (str, list, dict)) else value}" for key, value in update.items())
+            parts.append(f"{node}({sizes})")
+        else:
+            parts.append(node)
+    return "; ".join(parts)
+
+
+def log_event(event: dict):
+    if "__interrupt__" in event or random.random() < settings.log_sample_rate:
+        logger.info(summarize_event(event))
+
+
+def prometheus_text() -> str:
+    with _lock:
+        samples = [(name, labels, value) for (name, labels), value in _counters.items()]
+        samples += [(name, labels, value) for (name, labels), value in _gauges.items()]
+
+    lines = []
+    for name in sorted({name for name, _, _ in samples}):
+        kind, description = HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_name, labels, value in sorted(samples, key=lambda sample: (sample[0], sample[1])):
+            if sample_name != name:
+                continue
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels)
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
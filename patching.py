@@ -0,0 +1,105 @@
+import ast
+import difflib
+from typing import TypedDict
+
+# Lowest similarity a block may have to a search text and still be patched
+FUZZY_THRESHOLD = 0.85
+
+
+class CodeEdit(TypedDict):
+    search: str
+    replace: str
+
+
+def indent_of(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def strip_blank_edges(lines: list[str]) -> list[str]:
+    while lines and not lines[0].strip():
+        lines = lines[1:]
+    while lines and not lines[-1].strip():
+        lines = lines[:-1]
+    return lines
+
+
+def reindent(lines: list[str], old: str, new: str) -> list[str]:
+    # Moves `lines` from the indentation the model wrote (`old`) to the one
+    # found in the script (`new`).
+    if old == new:
+        return lines
+    result = []
+    for line in lines:
+        if line.startswith(old):
+            line = new + line[len(old):]
+        elif line.strip():
+            line = new + line.lstrip()
+        result.append(line)
+    return result
+
+
+def find_block(lines: list[str], search: list[str]) -> int | None:
+    # Start line of the one block matching `search` when leading and trailing
+    # whitespace is ignored, falling back to the most similar block.
+    size = len(search)
+    stripped = [line.strip() for line in search]
+    windows = range(len(lines) - size + 1)
+
+    exact = [i for i in windows if [line.strip() for line in lines[i:i + size]] == stripped]
+    if len(exact) == 1:
+        return exact[0]
+    if exact:
+        return None
+
+    target = "\n".join(stripped)
+    scores = sorted(
+        ((difflib.SequenceMatcher(None, "\n".join(line.strip() for line in lines[i:i + size]), target).ratio(), i) for i in windows),
+        reverse=True,
+    )
+    if not scores or scores[0][0] < FUZZY_THRESHOLD:
+        return None
+    if len(scores) > 1 and scores[1][0] == scores[0][0]:
+        return None
+    return scores[0][1]
+
+
+def apply_edit(code: str, edit: CodeEdit) -> str | None:
+    search, replace = edit["search"], edit["replace"]
+    if search and code.count(search) == 1:
+        return code.replace(search, replace)
+
+    search_lines = strip_blank_edges(search.splitlines())
+    if not search_lines:
+        return None
+
+    lines = code.splitlines()
+    start = find_block(lines, search_lines)
+    if start is None:
+        return None
+
+    replace_lines = reindent(strip_blank_edges(replace.splitlines()), indent_of(search_lines[0]), indent_of(lines[start]))
+    lines[start:start + len(search_lines)] = replace_lines
+    return "\n".join(lines) + ("\n" if code.endswith("\n") else "")
+
+
+# Applies search/replace edits in order. Returns None when an edit can't be
+# placed or the result isn't valid Python, so the caller can ask for a full
+# rewrite instead.
+def apply_edits(code: str, edits: list[CodeEdit]) -> str | None:
+    if not edits:
+        return None
+
+    patched = code
+    for edit in edits:
+        result = apply_edit(patched, edit)
+        if result is None:
+            return None
+        patched = result
+
+    if patched == code:
+        return None
+    try:
+        ast.parse(patched)
+    except SyntaxError:
+        return None
+    return patched
@@ -0,0 +1,173 @@
+import atexit
+import logging
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable
+
+import docker
+import docker.errors
+from docker.models.containers import Container
+
+logger = logging.getLogger("Masim")
+
+WORKER = ["/sandbox/.venv/bin/python", "/sandbox/worker.py"]
+
+
+@dataclass
+class PooledContainer:
+    container: Container
+    jobs: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def exec(self, command: list[str]) -> tuple[int, str, str]:
+        result = self.container.exec_run(command, demux=True, user="runner", workdir="/sandbox")
+        stdout, stderr = result.output or (None, None)
+        return result.exit_code, (stdout or b"").decode("utf-8"), (stderr or b"").decode("utf-8")
+
+    # Runs `command`, handing (stdout, stderr) chunks to `on_output` as they
+    # arrive, and returns the exit code.
+    def exec_stream(self, command: list[str], environment: dict, on_output: Callable[[bytes | None, bytes | None], None]) -> int:
+        api = self.container.client.api
+        exec_id = api.exec_create(self.container.id, command, stdout=True, stderr=True, user="runner", workdir="/sandbox", environment=environment)["Id"]
+        for stdout, stderr in api.exec_start(exec_id, stream=True, demux=True):
+            on_output(stdout, stderr)
+        return api.exec_inspect(exec_id)["ExitCode"]
+
+    def cancel(self, job_id: str):
+        self.exec([*WORKER, "cancel", job_id])
+
+    def healthy(self) -> bool:
+        try:
+            self.container.reload()
+            if self.container.status != "running":
+                return False
+            exit_code, _, _ = self.exec([*WORKER, "ping"])
+            return exit_code == 0
+        except docker.errors.DockerException:
+            return False
+
+    def memory_mb(self) -> float:
+        stats = self.container.stats(stream=False, one_shot=True)
+        return stats.get("memory_stats", {}).get("usage", 0) / (1024 * 1024)
+
+
+class SandboxPool:
+    def __init__(self, client: Callable[[], docker.DockerClient], image: str, volumes: dict, size: int, max_jobs: int, max_memory_mb: int, mem_limit: str, start_timeout: float):
+        self.client = client
+        self.image = image
+        self.volumes = volumes
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_memory_mb = max_memory_mb
+        self.mem_limit = mem_limit
+        self.start_timeout = start_timeout
+
+        self._lock = threading.Lock()
+        self._idle: list[PooledContainer] = []
+        self._total = 0
+
+        atexit.register(self.shutdown)
+
+    def _start(self) -> PooledContainer:
+        container = self.client().containers.run(
+            image=self.image,
+            command=[*WORKER, "serve"],
+            name=f"masim-pool-{uuid.uuid4().hex[:12]}",
+            labels={"masim.pool": "1"},
+            volumes=self.volumes,
+            working_dir="/sandbox",
+            mem_limit=self.mem_limit,
+            user="runner",
+            environment={"PYTHONUNBUFFERED": "1"},
+            detach=True,
+            remove=True,
+        )
+        pooled = PooledContainer(container)
+
+        deadline = time.monotonic() + self.start_timeout
+        while time.monotonic() < deadline:
+            if pooled.healthy():
+                logger.info(f"Sandbox pool: started {container.name}")
+                return pooled
+            time.sleep(0.5)
+
+        self._stop(pooled)
+        raise TimeoutError(f"sandbox worker {container.name} did not become ready in {self.start_timeout}s")
+
+    def _stop(self, pooled: PooledContainer):
+        try:
+            pooled.container.remove(force=True)
+        except (docker.errors.DockerException, OSError):
+            pass
+
+    # Returns a warm container, or None when every slot is busy.
+    def acquire(self) -> PooledContainer | None:
+        while True:
+            with self._lock:
+                pooled = self._idle.pop() if self._idle else None
+                if pooled is None:
+                    if self._total >= self.size:
+                        return None
+                    self._total += 1
+
+            if pooled is None:
+                try:
+                    return self._start()
+                except Exception as e:
+                    logger.warning(f"Sandbox pool: failed to start worker: {e}")
+                    with self._lock:
+                        self._total -= 1
+                    return None
+
+            if pooled.healthy():
+                return pooled
+
+            logger.info(f"Sandbox pool: dropping unhealthy {pooled.container.name}")
+            self._discard(pooled)
+
+    # Starts a container ahead of need when none is idle and a slot is free.
+    def warm(self):
+        with self._lock:
+            if self._idle or self._total >= self.size:
+                return
+            self._total += 1
+        try:
+            pooled = self._start()
+        except Exception as e:
+            logger.warning(f"Sandbox pool: failed to start worker: {e}")
+            with self._lock:
+                self._total -= 1
+            return
+        with self._lock:
+            self._idle.append(pooled)
+
+    def release(self, pooled: PooledContainer, failed: bool = False):
+        pooled.jobs += 1
+
+        recycle = failed or pooled.jobs >= self.max_jobs
+        if not recycle:
+            try:
+                recycle = pooled.memory_mb() > self.max_memory_mb
+            except (docker.errors.DockerException, OSError):
+                recycle = True
+
+        if recycle:
+            logger.info(f"Sandbox pool: recycling {pooled.container.name} after {pooled.jobs} jobs")
+            self._discard(pooled)
+        else:
+            with self._lock:
+                self._idle.append(pooled)
+
+    def _discard(self, pooled: PooledContainer):
+        self._stop(pooled)
+        with self._lock:
+            self._total -= 1
+
+    def shutdown(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for pooled in idle:
+            self._stop(pooled)
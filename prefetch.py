@@ -0,0 +1,132 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from executors import Executor, Scheduler
+from metrics import count
+
+logger = logging.getLogger("Masim")
+
+# Formulas known to be compiled are remembered per host for a while only:
+# each host has its own Tex cache, which evicts without telling us.
+COMPILED_TTL = 3600.0
+MAX_COMPILED = 2000
+
+MATH = re.compile(r"\$\$(.+?)\$\$|\$(.+?)\$|\\\((.+?)\\\)|\\\[(.+?)\\\]", re.DOTALL)
+
+
+def tex_expressions(texts: list[str], limit: int) -> list[str]:
+    expressions = []
+    for text in texts:
+        for match in MATH.finditer(text or ""):
+            expression = next(group for group in match.groups() if group is not None).strip()
+            if expression and expression not in expressions:
+                expressions.append(expression)
+    return expressions[:limit]
+
+
+# Work started while the LLM is still planning, so the first render finds a
+# warm sandbox and the plan's formulas already in the Tex cache. Everything
+# here is best effort: failures are logged and the render does the work as
+# before. A session's pending work is cancelled once it no longer helps, at
+# the latest when the session's own render starts.
+class Prefetcher:
+    def __init__(self, scheduler: Scheduler, enabled: bool, max_expressions: int):
+        self.scheduler = scheduler
+        self.enabled = enabled
+        self.max_expressions = max_expressions
+
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="masim-prefetch")
+        self._lock = threading.Lock()
+        self._cancel: dict[str, threading.Event] = {}
+        self._futures: dict[str, list[tuple[str, Future]]] = {}
+        # (host, formula) pairs a sandbox compiled cleanly, oldest first with
+        # when they were, and those on their way there
+        self._compiled: OrderedDict[tuple[str, str], float] = OrderedDict()
+        self._pending: set[tuple[str, str]] = set()
+
+    def _submit(self, session_id: str, kind: str, fn, *args) -> Future:
+        with self._lock:
+            cancel = self._cancel.setdefault(session_id, threading.Event())
+            futures = self._futures.setdefault(session_id, [])
+            futures[:] = [(kind, future) for kind, future in futures if not future.done()]
+            future = self._pool.submit(self._run, kind, cancel, fn, *args)
+            futures.append((kind, future))
+        return future
+
+    def _run(self, kind: str, cancel: threading.Event, fn, *args):
+        if cancel.is_set():
+            return None
+        count("masim_prefetch_total", kind=kind)
+        try:
+            return fn(*args, cancel)
+        except Exception as e:
+            logger.warning(f"Prefetch ({kind}): {e}")
+            return None
+
+    def warm(self, session_id: str):
+        if not self.enabled:
+            return
+        executor = self.scheduler.least_loaded()
+        if executor is not None:
+            self._submit(session_id, "warm", lambda cancel: executor.warm())
+
+    def precompile(self, session_id: str, texts: list[str]):
+        if not self.enabled:
+            return
+        executor = self.scheduler.least_loaded()
+        if executor is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            keys = [
+                (executor.name, expression) for expression in tex_expressions(texts, self.max_expressions)
+                if now - self._compiled.get((executor.name, expression), -COMPILED_TTL) >= COMPILED_TTL
+                and (executor.name, expression) not in self._pending
+            ]
+            self._pending.update(keys)
+        if not keys:
+            return
+        # Formulas only count as compiled once the sandbox said so; skipped,
+        # failed and cancelled ones can be tried again by the next plan.
+        future = self._submit(session_id, "tex", self._compile, executor, [expression for _, expression in keys])
+        future.add_done_callback(lambda future: self._settle(keys, not future.cancelled() and future.result() is True))
+
+    # Holds one of the host's render slots while it compiles, so the
+    # scheduler sees the worker it takes.
+    def _compile(self, executor: Executor, expressions: list[str], cancel: threading.Event) -> bool:
+        if not self.scheduler.extend(executor, 1):
+            return False
+        try:
+            return executor.precompile_tex(expressions, cancel)
+        finally:
+            self.scheduler.release(executor)
+
+    def _settle(self, keys: list[tuple[str, str]], compiled: bool):
+        now = time.monotonic()
+        with self._lock:
+            self._pending.difference_update(keys)
+            if not compiled:
+                return
+            for key in keys:
+                self._compiled[key] = now
+                self._compiled.move_to_end(key)
+            while len(self._compiled) > MAX_COMPILED:
+                self._compiled.popitem(last=False)
+
+    # With `wait_for`, returns only once the session's precompiles have
+    # stopped and handed back the sandbox workers they held. A warm-up holds
+    # none, and may be waiting on a container start, so it isn't waited for.
+    def cancel(self, session_id: str, wait_for: bool = False):
+        with self._lock:
+            cancel = self._cancel.pop(session_id, None)
+            futures = self._futures.pop(session_id, [])
+        if cancel is not None:
+            cancel.set()
+        for _, future in futures:
+            future.cancel()
+        if wait_for:
+            wait([future for kind, future in futures if kind == "tex"])
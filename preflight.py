@@ -0,0 +1,156 @@
+import ast
+import builtins
+import traceback
+
+SCRIPT_NAME = "scene.py"
+
+MODULE_NAMES = {"__name__", "__file__", "__doc__", "__builtins__", "__spec__", "__loader__", "__package__", "__annotations__", "__class__", "__qualname__", "__module__"}
+
+# Scene bases whose camera has a movable `frame`. Anything else that bottoms out
+# at a plain `Scene` raises AttributeError on `self.camera.frame`.
+MOVING_CAMERA_SCENES = {"MovingCameraScene", "ZoomedScene"}
+
+
+def format_error(code: str, lineno: int | None, error: str) -> str:
+    lines = ["Traceback (most recent call last):"]
+    if lineno is not None:
+        lines.append(f'  File "{SCRIPT_NAME}", line {lineno}, in <module>')
+        source = code.splitlines()[lineno - 1] if 0 < lineno <= len(code.splitlines()) else ""
+        lines.append(f"    {source.strip()}")
+    lines.append(error)
+    return "\n".join(lines)
+
+
+def bound_names(tree: ast.Module) -> set[str]:
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            names.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names.add(node.name)
+        elif isinstance(node, ast.arg):
+            names.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            names.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            names.update(node.names)
+        elif isinstance(node, (ast.MatchAs, ast.MatchStar)) and node.name:
+            names.add(node.name)
+        elif isinstance(node, ast.MatchMapping) and node.rest:
+            names.add(node.rest)
+        elif isinstance(node, (ast.TypeVar, ast.ParamSpec, ast.TypeVarTuple)):
+            names.add(node.name)
+    return names
+
+
+def check_names(code: str, tree: ast.Module, symbols: set[str]) -> list[str]:
+    errors = []
+    star_imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ImportFrom) and node.module == "manim" and node.level == 0:
+            for alias in node.names:
+                if alias.name == "*":
+                    star_imports.add("manim")
+                elif alias.name not in symbols:
+                    errors.append(format_error(code, node.lineno, f"ImportError: cannot import name '{alias.name}' from 'manim'"))
+        elif isinstance(node, ast.ImportFrom) and any(alias.name == "*" for alias in node.names):
+            # Another star import binds names we can't see; don't guess.
+            return errors
+
+    known = bound_names(tree) | set(dir(builtins)) | MODULE_NAMES
+    if "manim" in star_imports:
+        known |= symbols
+
+    reported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load) and node.id not in known and node.id not in reported:
+            reported.add(node.id)
+            errors.append(format_error(code, node.lineno, f"NameError: name '{node.id}' is not defined"))
+    return errors
+
+
+def base_names(node: ast.ClassDef) -> list[str]:
+    names = []
+    for base in node.bases:
+        if isinstance(base, ast.Name):
+            names.append(base.id)
+        elif isinstance(base, ast.Attribute):
+            names.append(base.attr)
+    return names
+
+
+def has_moving_camera(name: str, classes: dict[str, ast.ClassDef], seen: set[str]) -> bool | None:
+    # True/False when the ancestry is known, None when it leaves the script
+    # through something other than a plain Scene.
+    if name in MOVING_CAMERA_SCENES:
+        return True
+    if name == "Scene":
+        return False
+    if name not in classes or name in seen:
+        return None
+    seen.add(name)
+
+    results = [has_moving_camera(base, classes, seen) for base in base_names(classes[name])]
+    if any(results):
+        return True
+    if results and all(result is False for result in results):
+        return False
+    return None
+
+
+def camera_frame_uses(node: ast.ClassDef) -> list[ast.Attribute]:
+    uses = []
+    for child in ast.walk(node):
+        if (
+            isinstance(child, ast.Attribute) and child.attr == "frame"
+            and isinstance(child.value, ast.Attribute) and child.value.attr == "camera"
+            and isinstance(child.value.value, ast.Name) and child.value.value.id == "self"
+        ):
+            uses.append(child)
+    return uses
+
+
+def borrowed_classes(node: ast.ClassDef, classes: dict[str, ast.ClassDef]) -> list[ast.ClassDef]:
+    # Classes whose methods Main runs on itself, e.g. `Intro.construct(self)`.
+    borrowed = []
+    for child in ast.walk(node):
+        if (
+            isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute)
+            and isinstance(child.func.value, ast.Name) and child.func.value.id in classes
+            and child.args and isinstance(child.args[0], ast.Name) and child.args[0].id == "self"
+        ):
+            borrowed.append(classes[child.func.value.id])
+    return borrowed
+
+
+def check_camera(code: str, tree: ast.Module) -> list[str]:
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    if has_moving_camera("Main", classes, set()) is not False:
+        return []
+
+    for cls in [classes["Main"], *borrowed_classes(classes["Main"], classes)]:
+        uses = camera_frame_uses(cls)
+        if uses:
+            return [format_error(code, uses[0].lineno, "AttributeError: 'Camera' object has no attribute 'frame'")]
+    return []
+
+
+def preflight(code: str, symbols: set[str] | None = None) -> str | None:
+    try:
+        tree = ast.parse(code, filename=SCRIPT_NAME)
+    except SyntaxError as e:
+        return "Traceback (most recent call last):\n" + "".join(traceback.format_exception_only(e)).rstrip()
+
+    if not any(isinstance(node, ast.ClassDef) and node.name == "Main" for node in tree.body):
+        return format_error(code, None, f"NameError: {SCRIPT_NAME} does not define a top-level `class Main`, which is the scene that gets rendered")
+
+    errors = check_camera(code, tree)
+    if symbols is not None:
+        errors += check_names(code, tree, symbols)
+
+    if not errors:
+        return None
+    return "\n\n".join(errors)
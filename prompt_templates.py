@@ -0,0 +1,26 @@
+import threading
+from pathlib import Path
+
+from langchain_core.prompts import PromptTemplate
+
+from settings import settings
+
+_templates: dict[str, tuple[float, PromptTemplate]] = {}
+_lock = threading.Lock()
+
+
+# Parses prompts/<name>.md once and again only when the file's mtime changes,
+# so prompt edits still show up without restarting the process.
+def load_prompt(name: str) -> PromptTemplate:
+    path = Path(settings.prompts_dir) / f"{name}.md"
+    mtime = path.stat().st_mtime
+    cached = _templates.get(name)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with _lock:
+        cached = _templates.get(name)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, PromptTemplate.from_file(path, encoding="utf8"))
+            _templates[name] = cached
+    return cached[1]
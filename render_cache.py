@@ -0,0 +1,93 @@
+import ast
+import hashlib
+import json
+import logging
+import os
+import shutil
+import uuid
+from pathlib import Path
+
+logger = logging.getLogger("Masim")
+
+
+def normalize_code(code: str) -> str:
+    # The AST drops comments, blank lines and formatting, so scripts that only
+    # differ cosmetically share an entry. Unparsable code falls back to text.
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return "\n".join(line.rstrip() for line in code.strip().splitlines())
+
+
+# Content-addressed cache of finished renders. Each entry is a directory named
+# by the key holding result.json (stdout/stderr/output_path) and, when the
+# render produced one, a copy of the video so later cleanup of output/ cannot
+# invalidate it.
+class RenderCache:
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def key(self, code: str, image_digest: str, tier: str) -> str:
+        h = hashlib.sha256()
+        for part in (normalize_code(code), image_digest, tier):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        entry = self.path / key
+        try:
+            result = json.loads((entry / "result.json").read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if result["output_path"] is not None:
+            video = entry / "output.mp4"
+            if not video.exists():
+                return None
+            result["output_path"] = str(video.absolute())
+
+        os.utime(entry)
+        return result
+
+    def put(self, key: str, result: dict):
+        self.path.mkdir(parents=True, exist_ok=True)
+        staging = self.path / f".{key}.{uuid.uuid4().hex}"
+        staging.mkdir()
+
+        try:
+            stored = dict(result)
+            if result["output_path"] is not None:
+                shutil.copyfile(result["output_path"], staging / "output.mp4")
+                stored["output_path"] = "output.mp4"
+            (staging / "result.json").write_text(json.dumps(stored), encoding="utf-8")
+            os.rename(staging, self.path / key)
+        except OSError:
+            # Either the copy failed or another render stored the same key first.
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.path):
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+            entries.append((entry.stat().st_mtime, size, entry.path))
+            total += size
+
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            evicted += 1
+
+        logger.info(f"Render cache: evicted {evicted} entries, {total / (1024 * 1024):.1f}MB left")
@@ -0,0 +1,116 @@
+import codecs
+import re
+import signal
+import threading
+import time
+from typing import Callable
+
+TRACEBACK_MARKER = "Traceback (most recent call last)"
+
+# tqdm bars manim prints per animation, e.g.
+# "Animation 3: Write(Text('Hi')):  45%|####5     | 27/60 [00:01<00:01, 20.00it/s]"
+PROGRESS_PATTERN = re.compile(r"Animation (\d+)\b.*?(\d+)%\|")
+
+
+def signal_of(exit_code: int) -> int | None:
+    # Docker reports 128+N for a signalled process; the worker client reports
+    # the negative waitstatus as 256-N.
+    for n in (exit_code - 128, 256 - exit_code):
+        if n in (signal.SIGKILL, signal.SIGXCPU, signal.SIGALRM):
+            return n
+    return None
+
+
+# Set on its own or along with `parent`, so a group of jobs can be cancelled
+# together without touching the caller's event.
+class LinkedEvent(threading.Event):
+    def __init__(self, parent: threading.Event | None):
+        super().__init__()
+        self.parent = parent
+
+    def is_set(self) -> bool:
+        return super().is_set() or (self.parent is not None and self.parent.is_set())
+
+
+# Collects a render's output as it streams in, reports animation progress and
+# kills the job once it hits a traceback (after a short grace period for the
+# exception line to arrive), runs past its wall-clock limit or `cancel` is set.
+class RenderWatch:
+    def __init__(self, kill: Callable[[], None], timeout: float, grace: float, on_progress: Callable[[dict], None] | None = None, cancel: threading.Event | None = None):
+        self.kill = kill
+        self.timeout = timeout
+        self.grace = grace
+        self.on_progress = on_progress
+        self.cancel = cancel
+
+        self.reason: str | None = None
+        self._output: list[str] = []
+        self._stderr: list[str] = []
+        self._decoders = {name: codecs.getincrementaldecoder("utf-8")(errors="replace") for name in ("stdout", "stderr")}
+        self._pending = {"stdout": "", "stderr": ""}
+        self._progress: tuple[int, int] | None = None
+        self._traceback_at: float | None = None
+        self._started = time.monotonic()
+        self._done = threading.Event()
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+
+    def __enter__(self):
+        self._watchdog.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._watchdog.join()
+
+    def feed(self, stdout: bytes | None, stderr: bytes | None):
+        for name, chunk in (("stdout", stdout), ("stderr", stderr)):
+            if not chunk:
+                continue
+            text = self._decoders[name].decode(chunk)
+            self._output.append(text)
+            if name == "stderr":
+                self._stderr.append(text)
+            self._scan(name, text)
+
+    def _scan(self, name: str, text: str):
+        lines = re.split(r"[\r\n]", self._pending[name] + text)
+        self._pending[name] = lines.pop()
+        for line in lines:
+            if self._traceback_at is None and TRACEBACK_MARKER in line:
+                self._traceback_at = time.monotonic()
+
+            match = PROGRESS_PATTERN.search(line)
+            if match and self.on_progress is not None:
+                progress = (int(match.group(1)), int(match.group(2)))
+                if progress != self._progress:
+                    self._progress = progress
+                    self.on_progress({"animation": progress[0], "percent": progress[1]})
+
+    def _watch(self):
+        while not self._done.wait(0.5):
+            now = time.monotonic()
+            if self.cancel is not None and self.cancel.is_set():
+                self._abort("Render cancelled")
+            elif now - self._started > self.timeout:
+                self._abort(f"TimeoutError: render exceeded the {self.timeout:.0f}s wall-clock limit and was killed (possible infinite loop or self.wait without end)")
+            elif self._traceback_at is not None and now - self._traceback_at > self.grace:
+                self._abort("Render aborted after the traceback above")
+
+    def _abort(self, reason: str):
+        if self.reason is None:
+            self.reason = reason
+            self.kill()
+
+    def result(self, exit_code: int) -> tuple[int, str, str]:
+        stderr = "".join(self._stderr)
+        reason = self.reason
+        if reason is None and exit_code != 0:
+            sig = signal_of(exit_code)
+            if sig == signal.SIGXCPU:
+                reason = "TimeoutError: render exceeded its CPU time limit and was killed"
+            elif sig == signal.SIGALRM:
+                reason = "TimeoutError: render exceeded its wall-clock limit and was killed"
+        if reason is not None:
+            stderr = f"{stderr.rstrip()}\n{reason}".lstrip()
+            exit_code = exit_code or 1
+        return exit_code, "".join(self._output), stderr
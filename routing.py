@@ -0,0 +1,136 @@
+import threading
+from dataclasses import asdict, dataclass
+
+from log_digest import last_exception, output_lines
+from metrics import count, current_span
+
+# Model each node asks when nothing overrides it
+DEFAULT_MODELS = {
+    "goal_extractor": "nano",
+    "planning_agent": "nano",
+    "plan_reviser": "nano",
+    "coding_agent": "mini",
+    "code_analyzer": "nano",
+    "fix_planner": "nano",
+    "fix_coding_agent": "mini",
+}
+
+# Errors a one- or two-line edit usually fixes
+SIMPLE_ERRORS = {"NameError", "AttributeError", "ImportError", "ModuleNotFoundError", "SyntaxError", "IndentationError", "TypeError", "KeyError", "ValueError"}
+
+
+@dataclass
+class ModelStats:
+    calls: int = 0
+    seconds: float = 0.0
+    successes: int = 0
+    failures: int = 0
+
+    @property
+    def success_rate(self) -> float | None:
+        outcomes = self.successes + self.failures
+        return self.successes / outcomes if outcomes else None
+
+    # Expected seconds of calls until a fix passes
+    @property
+    def seconds_per_success(self) -> float | None:
+        if not self.calls or not self.successes:
+            return None
+        return self.seconds / self.calls / self.success_rate # type: ignore
+
+
+# Picks the model for each LLM call. Fixes start on the cheap model when the
+# analyzer reports few issues with a simple error class, and escalate to the
+# large one once a session has failed `escalate_after` fixes, or for every
+# session while the cheap model's measured fix success rate is too low, or
+# while retrying on it is measured to take longer than the large model would.
+class Router:
+    def __init__(self, overrides: dict[str, str], cheap: str, large: str, escalate_after: int, simple_max_issues: int, min_success_rate: float, min_samples: int):
+        self.overrides = overrides
+        self.cheap = cheap
+        self.large = large
+        self.escalate_after = escalate_after
+        self.simple_max_issues = simple_max_issues
+        self.min_success_rate = min_success_rate
+        self.min_samples = min_samples
+
+        self._lock = threading.Lock()
+        self._stats: dict[tuple[str, str], ModelStats] = {}
+
+    def _entry(self, node: str, model: str) -> ModelStats:
+        return self._stats.setdefault((node, model), ModelStats())
+
+    def model(self, node: str) -> str:
+        if node in self.overrides:
+            model, reason = self.overrides[node], "override"
+        else:
+            model, reason = DEFAULT_MODELS[node], "default"
+        count("masim_routing_decisions_total", node=node, model=model, reason=reason)
+        return model
+
+    def error_class(self, stderr: str) -> str | None:
+        exception = last_exception(output_lines(stderr or ""))
+        return exception.split(":")[0].split(".")[-1] if exception else None
+
+    def simple_fix(self, state: dict) -> bool:
+        if len(state.get("analysis") or []) > self.simple_max_issues:
+            return False
+        error = self.error_class(state.get("stderr", ""))
+        return error is None or error in SIMPLE_ERRORS
+
+    def cheap_is_reliable(self) -> bool:
+        with self._lock:
+            stats = self._stats.get(("fix_coding_agent", self.cheap), ModelStats())
+        rate = stats.success_rate
+        return rate is None or stats.successes + stats.failures < self.min_samples or rate >= self.min_success_rate
+
+    # Once both models have `min_samples` judged fixes, the cheap one stays
+    # only while its mean latency over its success rate beats the large one's.
+    def cheap_is_faster(self) -> bool:
+        with self._lock:
+            cheap = self._stats.get(("fix_coding_agent", self.cheap), ModelStats())
+            large = self._stats.get(("fix_coding_agent", self.large), ModelStats())
+        if min(cheap.successes + cheap.failures, large.successes + large.failures) < self.min_samples:
+            return True
+        cheap_seconds, large_seconds = cheap.seconds_per_success, large.seconds_per_success
+        return cheap_seconds is not None and (large_seconds is None or cheap_seconds <= large_seconds)
+
+    def fix_model(self, state: dict) -> str:
+        node = "fix_coding_agent"
+        if node in self.overrides:
+            model, reason = self.overrides[node], "override"
+        elif state.get("retry", 0) > self.escalate_after:
+            model, reason = self.large, "escalated"
+        elif not self.simple_fix(state):
+            model, reason = self.large, "complex"
+        elif not self.cheap_is_reliable():
+            model, reason = self.large, "cheap_unreliable"
+        elif not self.cheap_is_faster():
+            model, reason = self.large, "cheap_slower"
+        else:
+            model, reason = self.cheap, "simple"
+        count("masim_routing_decisions_total", node=node, model=model, reason=reason)
+        return model
+
+    def record_call(self, model: str, seconds: float):
+        span = current_span.get()
+        with self._lock:
+            entry = self._entry(span.node if span else "none", model)
+            entry.calls += 1
+            entry.seconds += seconds
+
+    def record_outcome(self, node: str, model: str, success: bool):
+        count("masim_routing_outcomes_total", node=node, model=model, outcome="success" if success else "failure")
+        with self._lock:
+            entry = self._entry(node, model)
+            if success:
+                entry.successes += 1
+            else:
+                entry.failures += 1
+
+    def stats(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"node": node, "model": model, **asdict(stats), "mean_seconds": stats.seconds / stats.calls if stats.calls else None, "success_rate": stats.success_rate, "seconds_per_success": stats.seconds_per_success}
+                for (node, model), stats in sorted(self._stats.items())
+            ]
@@ -0,0 +1,356 @@
+import contextvars
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from enum import Enum
+from pathlib import Path
+from typing import Callable
+
+import docker
+
+from executors import DockerExecutor, Executor, HostError, ProgressCallback, Scheduler, SubprocessExecutor
+from log_digest import PROGRESS_MARKS
+from metrics import record_render
+from render_cache import RenderCache
+from render_watch import LinkedEvent, signal_of
+from scene_split import scene_fingerprints, split_scenes
+from settings import settings
+from sandbox.tex_cache import TexCache
+
+logger = logging.getLogger("Masim")
+
+class RenderTier(Enum):
+    VALIDATE = "validate"
+    PREVIEW = "preview"
+    FINAL = "final"
+
+# manim quality flags and the video sub-directory each tier writes to
+TIER_ARGS = {
+    RenderTier.VALIDATE: ["-ql", "--dry_run"],
+    RenderTier.PREVIEW: ["-ql"],
+    RenderTier.FINAL: ["-qh"],
+}
+TIER_QUALITY_DIR = {
+    RenderTier.VALIDATE: None,
+    RenderTier.PREVIEW: "480p15",
+    RenderTier.FINAL: "1080p60",
+}
+
+output_dir = Path.cwd() / "output"
+jobs_dir = Path.cwd() / "jobs"
+tex_cache_dir = Path(settings.tex_cache_dir).absolute()
+
+# Connected on first use so importing the agent doesn't wait on the daemon.
+@functools.cache
+def docker_client() -> docker.DockerClient:
+    return docker.from_env()
+
+sandbox_volumes = {
+    str(jobs_dir.absolute()): {"bind": "/sandbox/jobs", "mode": "ro"},
+    str(output_dir.absolute()): {"bind": "/sandbox/media", "mode": "rw"},
+    str(tex_cache_dir): {"bind": "/sandbox/media/Tex", "mode": "rw"},
+}
+
+tex_cache = TexCache(tex_cache_dir, max_bytes=settings.tex_cache_max_mb * 1024 * 1024)
+render_cache = RenderCache(Path(settings.render_cache_dir).absolute(), max_bytes=settings.render_cache_max_mb * 1024 * 1024)
+
+def remote_client(url: str):
+    return functools.cache(lambda: docker.DockerClient(base_url=url))
+
+def render_executors() -> list[Executor]:
+    if settings.render_backend == "subprocess":
+        return [SubprocessExecutor(settings.render_local_capacity, output_dir, Path.cwd(), settings.render_python or sys.executable)]
+
+    executors: list[Executor] = []
+    if settings.render_local_capacity > 0:
+        executors.append(DockerExecutor("local", docker_client, settings.render_local_capacity, output_dir, sandbox_volumes))
+    for host in settings.render_hosts:
+        executors.append(DockerExecutor(host.url, remote_client(host.url), host.capacity, output_dir))
+    return executors
+
+scheduler = Scheduler(render_executors(), cooldown=settings.render_host_cooldown)
+
+# Renders of one session reuse a job name, so its video directory (and manim's
+# partial movie cache in it, keyed on each animation's hash) carries over from
+# attempt to attempt and only the animations a fix changed are rendered again.
+def workspace_stem(session_id: str) -> str:
+    return f"session_{hashlib.sha256(session_id.encode()).hexdigest()[:16]}"
+
+# Host each session's workspace lives on; its renders go back there when it has room
+workspace_hosts: dict[str, str] = {}
+
+# Job names with a render running; the media quota doesn't evict their directories
+rendering: set[str] = set()
+
+# Called once the session's final video has been moved out of the workspace.
+def release_workspace(session_id: str):
+    host = workspace_hosts.pop(session_id, None)
+    stem = workspace_stem(session_id)
+    shutil.rmtree(output_dir/"videos"/stem, ignore_errors=True)
+    for executor in scheduler.executors:
+        if executor.name == host:
+            executor.cleanup(jobs_dir/f"{stem}.py", [f"videos/{stem}"])
+
+def clean_docker_log(log: str) -> str:
+    return "\n".join(line.strip() for line in log.split("\n") if not ("\r" in line and PROGRESS_MARKS.search(line)))
+
+def scene_progress(scene: str, on_progress: ProgressCallback) -> ProgressCallback:
+    if on_progress is None:
+        return None
+    return lambda progress: on_progress({"scene": scene, **progress})
+
+# The names in `names` that already exist in `video_dir` on the executor.
+def existing_outputs(executor: Executor, video_dir: str, names: list[str]) -> set[str]:
+    exit_code, stdout, _ = executor.run_command([
+        "sh", "-c", 'cd "$1" 2>/dev/null || exit 0; shift; for f; do [ -s "$f" ] && echo "$f"; done; exit 0',
+        "existing", video_dir, *names,
+    ])
+    return set(stdout.split()) & set(names) if exit_code == 0 else set()
+
+def render_scenes(executor: Executor, filename: str, tier: RenderTier, scenes: list[str], output: str, code: str, incremental: bool, on_progress: ProgressCallback = None, cancel: threading.Event | None = None) -> tuple[int, str, str]:
+    # Renders each chained scene as its own job, then stitches the partial
+    # movies with a stream-copy concat into the same video Main would give.
+    # All of a render's jobs stay on one executor so the concat finds them.
+    # In a workspace each scene's video is named after its fingerprint, and
+    # scenes whose video is already there aren't rendered again. Those videos
+    # are written under a staging name and renamed once manim exits cleanly,
+    # so a killed render never leaves a truncated one behind to be reused.
+    quality_dir = TIER_QUALITY_DIR[tier]
+    video_dir = f"{executor.media_root}/videos/{filename.split('.')[0]}/{quality_dir}"
+    if incremental:
+        fingerprints = scene_fingerprints(code, scenes)
+        scene_outputs = {scene: f"{scene}-{fingerprints[scene]}.mp4" for scene in scenes}
+    else:
+        scene_outputs = {scene: f"{scene}.mp4" for scene in scenes}
+
+    reused = existing_outputs(executor, video_dir, list(scene_outputs.values())) if incremental and quality_dir is not None else set()
+    changed = [scene for scene in scenes if scene_outputs[scene] not in reused]
+    if reused:
+        logger.info(f"Reusing {len(scenes) - len(changed)} unchanged scenes, rendering {len(changed)}")
+
+    # Each scene job beyond the first needs a slot of its own on the host;
+    # the fan-out shrinks to what's free rather than overloading it.
+    extra = scheduler.extend(executor, min(settings.render_workers, len(changed)) - 1)
+    def scene_job(scene: str):
+        staged = f"{scene_outputs[scene].removesuffix('.mp4')}.partial.mp4" if incremental else scene_outputs[scene]
+
+        def run(cancel: threading.Event) -> tuple[int, str, str]:
+            exit_code, stdout, stderr = executor.run_manim(["-o", staged, *TIER_ARGS[tier], f"jobs/{filename}", scene], scene_progress(scene, on_progress), cancel)
+            if exit_code == 0 and staged != scene_outputs[scene] and quality_dir is not None:
+                exit_code, _, stderr = executor.run_command(["mv", f"{video_dir}/{staged}", f"{video_dir}/{scene_outputs[scene]}"])
+            return exit_code, stdout, stderr
+        return run
+
+    try:
+        exit_code, stdout, stderr = run_scene_jobs([scene_job(scene) for scene in changed], 1 + extra, cancel)
+    finally:
+        scheduler.release(executor, slots=extra)
+    if exit_code != 0 or quality_dir is None:
+        return exit_code, stdout, stderr
+
+    listing = "".join(f"file '{scene_outputs[scene]}'\n" for scene in scenes)
+    exit_code, _, stderr = executor.run_command([
+        "sh", "-c",
+        'printf "%s" "$1" > "$2/segments.txt" && ffmpeg -y -loglevel error -f concat -safe 0 -i "$2/segments.txt" -c copy "$2/$3"',
+        "concat", listing, video_dir, output,
+    ])
+    return exit_code, stdout, stderr
+
+# Runs render jobs side by side; the first to fail kills the rest instead of
+# waiting them out. Returns the failure, or every job's stdout in order.
+def run_scene_jobs(jobs: list[Callable[[threading.Event], tuple[int, str, str]]], workers: int, cancel: threading.Event | None) -> tuple[int, str, str]:
+    failed = LinkedEvent(cancel)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Each job runs in a copy of this context, so its render time and peak
+        # memory land on the calling node's span.
+        futures = {
+            pool.submit(contextvars.copy_context().run, job, failed): index
+            for index, job in enumerate(jobs)
+        }
+        results: dict[int, str] = {}
+        failure = None
+        for future in as_completed(futures):
+            try:
+                exit_code, stdout, stderr = future.result()
+            except Exception:
+                failed.set()
+                raise
+            if exit_code != 0 and failure is None:
+                failure = exit_code, stdout, stderr
+                failed.set()
+            results[futures[future]] = stdout
+    if failure is not None:
+        return failure
+    return 0, "\n".join(results[index] for index in range(len(jobs))), ""
+
+def output_relative(filename: str, tier: RenderTier, output: str) -> str | None:
+    quality_dir = TIER_QUALITY_DIR[tier]
+    if quality_dir is None:
+        return None
+
+    filename_without_extension = filename.split(".")[0]
+    return f"videos/{filename_without_extension}/{quality_dir}/{output}"
+
+def find_output(executor: Executor, filename: str, tier: RenderTier, output: str = "output.mp4") -> Path | None:
+    relative = output_relative(filename, tier, output)
+    return executor.fetch(relative) if relative else None
+
+# Each host's digest is looked up at most once a minute; a failed lookup is
+# remembered for as long, so checks don't keep asking a daemon that isn't there.
+DIGEST_TTL = 60.0
+_digests: dict[str, tuple[float, str | Exception]] = {}
+
+def image_digest(executor: Executor) -> str:
+    now = time.monotonic()
+    cached = _digests.get(executor.name)
+    if cached is None or now - cached[0] > DIGEST_TTL:
+        try:
+            cached = now, executor.image_digest()
+        except Exception as e:
+            logger.warning(f"Could not read the sandbox image digest on {executor.name}: {e}")
+            cached = now, e
+        _digests[executor.name] = cached
+    if isinstance(cached[1], Exception):
+        raise cached[1]
+    return cached[1]
+
+symbols_index = Path(settings.symbols_index)
+# Symbols per image digest, None where indexing failed
+_symbols: dict[str, set[str] | None] = {}
+
+# Public names of the sandbox's manim, indexed once per image digest so the
+# pre-flight check can resolve `from manim import *` without a container.
+# Asks the first host that isn't cooling down and can tell its digest.
+def manim_symbols() -> set[str] | None:
+    for executor in scheduler.candidates(set()):
+        try:
+            digest = image_digest(executor)
+        except Exception:
+            continue
+        break
+    else:
+        return None
+    if digest in _symbols:
+        return _symbols[digest]
+
+    symbols = None
+    try:
+        if symbols_index.exists():
+            index = json.loads(symbols_index.read_text(encoding="utf-8"))
+            if index["image"] == digest:
+                symbols = set(index["symbols"])
+        if symbols is None:
+            names = executor.symbols()
+            symbols_index.write_text(json.dumps({"image": digest, "symbols": names}), encoding="utf-8")
+            symbols = set(names)
+    except Exception as e:
+        logger.warning(f"Could not index manim symbols, skipping name checks: {e}")
+    _symbols[digest] = symbols
+    return symbols
+
+# The cache key includes the image the render would run in, so it is built
+# for the host a render was scheduled on. Without a digest the render runs
+# uncached.
+def cache_key(executor: Executor, code: str, tier: RenderTier) -> str | None:
+    if not settings.render_cache_enabled:
+        return None
+    try:
+        return render_cache.key(code, image_digest(executor), tier.value)
+    except Exception:
+        return None
+
+# In a workspace (`incremental`) each attempt writes its own video next to the
+# earlier ones, and the directory stays on the host for the next attempt.
+def render_on(executor: Executor, script: Path, code: str, tier: RenderTier, on_progress: ProgressCallback, cancel: threading.Event | None, incremental: bool = False) -> tuple[int, dict]:
+    filename = script.name
+    output = f"{uuid.uuid4().hex[:12]}.mp4" if incremental else "output.mp4"
+    stem = filename.split('.')[0]
+    rendering.add(stem)
+    executor.prepare(script)
+    try:
+        scenes = split_scenes(code) if settings.parallel_scenes else None
+        if scenes:
+            logger.info(f"Rendering {len(scenes)} scenes in parallel on {executor.name}: {', '.join(scenes)}")
+            exit_code, stdout_full, stderr = render_scenes(executor, filename, tier, scenes, output, code, incremental, on_progress, cancel)
+        else:
+            exit_code, stdout_full, stderr = executor.run_manim(["-o", output, *TIER_ARGS[tier], f"jobs/{filename}", "Main"], on_progress, cancel)
+
+        if exit_code != 0:
+            return exit_code, {"stdout": "", "stderr": stderr, "output_path": None}
+        output_file = find_output(executor, filename, tier, output)
+        return exit_code, {"stdout": clean_docker_log(stdout_full), "stderr": "", "output_path": str(output_file) if output_file else None}
+    finally:
+        rendering.discard(stem)
+        relative = output_relative(filename, tier, output)
+        if not incremental:
+            executor.cleanup(script, [f"videos/{stem}"])
+        else:
+            executor.cleanup(script, [relative] if relative else [])
+
+# A host that fails (rather than the render) hands the job to the next
+# least-loaded one. The render cache is checked once a host is picked, since
+# the key depends on that host's image.
+def schedule(script: Path, code: str, tier: RenderTier, on_progress: ProgressCallback, cancel: threading.Event | None, workspace: str | None) -> dict:
+    tried: set[str] = set()
+    result = {"stdout": "", "stderr": "No render host available", "output_path": None}
+    while (executor := scheduler.acquire(tried, prefer=workspace_hosts.get(workspace) if workspace else None)) is not None:
+        key = cache_key(executor, code, tier)
+        if key is not None and (cached := render_cache.get(key)) is not None:
+            scheduler.release(executor)
+            logger.info(f"Render cache hit: {key[:12]}")
+            record_render(cache_hit=True)
+            return cached
+        try:
+            exit_code, result = render_on(executor, script, code, tier, on_progress, cancel, incremental=workspace is not None)
+        except HostError as e:
+            logger.warning(f"Render host failed, trying another: {e}")
+            scheduler.release(executor, failed=True)
+            tried.add(executor.name)
+            result = {"stdout": "", "stderr": str(e), "output_path": None}
+            continue
+        except Exception as e:
+            scheduler.release(executor)
+            return {"stdout": "", "stderr": str(e), "output_path": None}
+        executor.evict_tex(tex_cache.max_bytes)
+        scheduler.release(executor)
+        if workspace is not None:
+            workspace_hosts[workspace] = executor.name
+        # Renders we killed (timeouts, aborts, cancels) depend on load, so they aren't cached.
+        if key is not None and signal_of(exit_code) is None and not (cancel is not None and cancel.is_set()):
+            render_cache.put(key, result)
+        break
+    return result
+
+# Setting `cancel` kills the render in flight, e.g. once another speculative
+# candidate has already come back clean. Renders with a `workspace` (a session
+# id) render incrementally on top of that session's earlier attempts.
+def render(code: str, tier: RenderTier = RenderTier.FINAL, on_progress: ProgressCallback = None, cancel: threading.Event | None = None, workspace: str | None = None) -> dict:
+    output_dir.mkdir(exist_ok=True)
+    jobs_dir.mkdir(exist_ok=True)
+    tex_cache_dir.mkdir(exist_ok=True)
+
+    if workspace is None:
+        with tempfile.NamedTemporaryFile(suffix=".py", mode="w", dir=jobs_dir, delete=True, encoding="utf8") as f:
+            f.write(code)
+            f.flush()
+            os.chmod(f.name, 0o644)
+            result = schedule(Path(f.name), code, tier, on_progress, cancel, None)
+    else:
+        script = jobs_dir/f"{workspace_stem(workspace)}.py"
+        script.write_text(code, encoding="utf8")
+        os.chmod(script, 0o644)
+        try:
+            result = schedule(script, code, tier, on_progress, cancel, workspace)
+        finally:
+            script.unlink(missing_ok=True)
+    tex_cache.evict()
+    return result
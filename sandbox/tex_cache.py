@@ -0,0 +1,59 @@
+import fcntl
+import logging
+import os
+from collections import defaultdict
+from pathlib import Path
+
+logger = logging.getLogger("Masim")
+
+
+# The LaTeX/SVG cache mounted at /sandbox/media/Tex. Entries are the files
+# manim writes per formula, all sharing the formula's content hash as their
+# stem. The sandbox worker holds `<stem>.lock` while it compiles, so eviction
+# skips any entry whose lock is taken. Standard library only: the host prunes
+# its local cache directory with it, and the worker (`evict-tex`) the cache
+# volume of a remote host.
+class TexCache:
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    # Returns how many formulas went and the bytes left, or None when the
+    # cache was within budget.
+    def evict(self) -> tuple[int, int] | None:
+        if not self.path.exists():
+            return None
+
+        entries: dict[str, list[os.DirEntry]] = defaultdict(list)
+        for entry in os.scandir(self.path):
+            if entry.is_file() and not entry.name.endswith(".lock"):
+                entries[Path(entry.name).stem].append(entry)
+
+        sizes = {stem: sum(e.stat().st_size for e in files) for stem, files in entries.items()}
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return None
+
+        last_used = {stem: max(e.stat().st_mtime for e in files) for stem, files in entries.items()}
+        evicted = 0
+        for stem in sorted(entries, key=last_used.__getitem__):
+            if total <= self.max_bytes:
+                break
+            if self._remove(stem, entries[stem]):
+                total -= sizes[stem]
+                evicted += 1
+
+        logger.info(f"Tex cache: evicted {evicted} formulas, {total / (1024 * 1024):.1f}MB left")
+        return evicted, total
+
+    def _remove(self, stem: str, files: list[os.DirEntry]) -> bool:
+        with open(self.path / f"{stem}.lock", "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+
+            # Drop the marker first so a half-removed entry is never trusted.
+            for entry in sorted(files, key=lambda e: not e.name.endswith(".ok")):
+                Path(entry.path).unlink(missing_ok=True)
+        return True
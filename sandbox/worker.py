@@ -0,0 +1,302 @@
+"""Long-lived manim worker for pooled sandbox containers.
+
+`serve` imports manim once and forks a child per job, so every render starts
+from a warm interpreter. `submit` and `ping` are tiny clients that the host
+runs through `docker exec`; they talk to the server over a unix socket and
+relay the job output to their own stdout/stderr. `run` renders in-process
+without the server and is used by one-shot containers. `cancel` kills a
+running job by the id it was submitted with. `submit-tex` and `run-tex` do the
+same for a JSON list of formulas, compiling each as a MathTex into the shared
+Tex cache ahead of the render that will use it. `evict-tex` prunes that cache
+to a byte budget, least recently used formulas first, on hosts whose cache
+lives in a Docker volume the agent can't reach.
+
+Jobs take their id and limits from MASIM_JOB_ID, MASIM_CPU_LIMIT (seconds of
+CPU time) and MASIM_WALL_LIMIT (seconds of wall-clock time). When
+MASIM_STATS_DIR is set, the CPU time and peak memory of each finished job are
+written there as <job id>.json.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import resource
+import selectors
+import signal
+import socket
+import struct
+import sys
+from pathlib import Path
+
+from tex_cache import TexCache
+
+SOCKET_PATH = "/tmp/masim-worker.sock"
+JOBS_PATH = "/tmp/masim-jobs"
+WORKDIR = "/sandbox"
+
+STDOUT = b"1"
+STDERR = b"2"
+EXIT = b"x"
+
+
+def send_frame(conn: socket.socket, channel: bytes, payload: bytes):
+    conn.sendall(channel + struct.pack(">I", len(payload)) + payload)
+
+
+def recv_exact(conn: socket.socket, size: int) -> bytes:
+    buf = b""
+    while len(buf) < size:
+        chunk = conn.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("worker closed the connection")
+        buf += chunk
+    return buf
+
+
+def recv_frame(conn: socket.socket) -> tuple[bytes, bytes]:
+    header = recv_exact(conn, 5)
+    (size,) = struct.unpack(">I", header[1:])
+    return header[:1], recv_exact(conn, size)
+
+
+def install_tex_cache_lock():
+    # media/Tex is a cache volume shared by every container, so two renders may
+    # compile the same formula at once. Serialize per formula with a flock next
+    # to the cached files, and only trust an svg that has a completion marker.
+    from manim import config
+    from manim.mobject.text import tex_mobject
+    from manim.utils import tex_file_writing
+
+    original = tex_file_writing.tex_to_svg_file
+
+    def tex_stem(expression, environment, tex_template) -> str:
+        try:
+            template = tex_template or config.tex_template
+            if environment is not None:
+                texcode = template.get_texcode_for_expression_in_env(expression, environment)
+            else:
+                texcode = template.get_texcode_for_expression(expression)
+            return tex_file_writing.tex_hash(texcode)
+        except Exception:
+            return hashlib.sha256(repr((expression, environment)).encode()).hexdigest()[:16]
+
+    def locked_tex_to_svg_file(expression, environment=None, tex_template=None):
+        tex_dir = config.get_dir("tex_dir")
+        tex_dir.mkdir(parents=True, exist_ok=True)
+        stem = tex_stem(expression, environment, tex_template)
+        svg, marker = tex_dir / f"{stem}.svg", tex_dir / f"{stem}.ok"
+
+        with open(tex_dir / f"{stem}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if svg.exists() and not marker.exists():
+                svg.unlink()
+            result = original(expression, environment=environment, tex_template=tex_template)
+            marker.touch()
+
+        os.utime(result)
+        return result
+
+    tex_file_writing.tex_to_svg_file = locked_tex_to_svg_file
+    if getattr(tex_mobject, "tex_to_svg_file", None) is original:
+        tex_mobject.tex_to_svg_file = locked_tex_to_svg_file
+
+
+def apply_limits(cpu_limit: int | None, wall_limit: int | None):
+    if cpu_limit:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 5))
+    if wall_limit:
+        signal.alarm(wall_limit)
+
+
+def job_environment() -> dict:
+    return {
+        "job_id": os.environ.get("MASIM_JOB_ID"),
+        "cpu_limit": int(os.environ.get("MASIM_CPU_LIMIT") or 0) or None,
+        "wall_limit": int(os.environ.get("MASIM_WALL_LIMIT") or 0) or None,
+        "stats_dir": os.environ.get("MASIM_STATS_DIR"),
+    }
+
+
+def write_stats(stats_dir: str | None, job_id: str | None, usages: list[resource.struct_rusage]):
+    if not stats_dir or not job_id:
+        return
+    os.makedirs(stats_dir, exist_ok=True)
+    with open(os.path.join(stats_dir, f"{os.path.basename(job_id)}.json"), "w") as f:
+        json.dump({
+            "cpu_seconds": sum(usage.ru_utime + usage.ru_stime for usage in usages),
+            # ru_maxrss is in KiB on Linux
+            "peak_memory_mb": max(usage.ru_maxrss for usage in usages) / 1024,
+        }, f)
+
+
+def run_manim(args: list[str]) -> int:
+    from manim.__main__ import main
+
+    install_tex_cache_lock()
+
+    try:
+        main(args=args, prog_name="manim")
+    except SystemExit as e:
+        if e.code is None:
+            return 0
+        return e.code if isinstance(e.code, int) else 1
+    return 0
+
+
+def compile_tex(expressions: list[str]) -> int:
+    from manim import MathTex
+
+    install_tex_cache_lock()
+
+    code = 0
+    for expression in expressions:
+        try:
+            MathTex(expression)
+        except Exception as e:
+            print(f"could not compile {expression!r}: {e}", file=sys.stderr)
+            code = 1
+    return code
+
+
+def evict_tex_cache(max_bytes: int) -> int:
+    result = TexCache(Path(WORKDIR, "media", "Tex"), max_bytes).evict()
+    if result is not None:
+        evicted, total = result
+        print(f"evicted {evicted} formulas, {total / (1024 * 1024):.1f}MB left")
+    return 0
+
+
+def handle(conn: socket.socket, request: dict):
+    if request.get("ping"):
+        send_frame(conn, EXIT, json.dumps({"exit_code": 0}).encode())
+        return
+
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Own process group so `cancel` also takes down ffmpeg/latex children.
+        os.setpgid(0, 0)
+        conn.close()
+        os.close(out_r)
+        os.close(err_r)
+        os.dup2(out_w, 1)
+        os.dup2(err_w, 2)
+        os.chdir(WORKDIR)
+        code = 1
+        try:
+            apply_limits(request.get("cpu_limit"), request.get("wall_limit"))
+            code = compile_tex(request["tex"]) if "tex" in request else run_manim(request["args"])
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    pid_file = None
+    if request.get("job_id"):
+        os.makedirs(JOBS_PATH, exist_ok=True)
+        pid_file = os.path.join(JOBS_PATH, request["job_id"])
+        with open(pid_file, "w") as f:
+            f.write(str(pid))
+
+    os.close(out_w)
+    os.close(err_w)
+    channels = {out_r: STDOUT, err_r: STDERR}
+    sel = selectors.DefaultSelector()
+    for fd in channels:
+        sel.register(fd, selectors.EVENT_READ)
+    while channels:
+        for key, _ in sel.select():
+            data = os.read(key.fd, 65536)
+            if data:
+                send_frame(conn, channels[key.fd], data)
+            else:
+                sel.unregister(key.fd)
+                os.close(key.fd)
+                del channels[key.fd]
+    sel.close()
+
+    _, status, usage = os.wait4(pid, 0)
+    if pid_file:
+        os.unlink(pid_file)
+    write_stats(request.get("stats_dir"), request.get("job_id"), [usage])
+    send_frame(conn, EXIT, json.dumps({"exit_code": os.waitstatus_to_exitcode(status)}).encode())
+
+
+def serve():
+    # Warm the expensive imports once; every forked job inherits them.
+    import manim  # noqa: F401
+    import manim.__main__  # noqa: F401
+
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(SOCKET_PATH)
+    server.listen()
+
+    while True:
+        conn, _ = server.accept()
+        with conn:
+            try:
+                request = json.loads(conn.makefile("rb").readline())
+                handle(conn, request)
+            except Exception as e:
+                try:
+                    send_frame(conn, STDERR, f"worker error: {e!r}\n".encode())
+                    send_frame(conn, EXIT, json.dumps({"exit_code": 1}).encode())
+                except OSError:
+                    pass
+
+
+def cancel(job_id: str) -> int:
+    try:
+        with open(os.path.join(JOBS_PATH, os.path.basename(job_id))) as f:
+            os.killpg(int(f.read()), signal.SIGKILL)
+    except (FileNotFoundError, ProcessLookupError):
+        return 1
+    return 0
+
+
+def request(payload: dict) -> int:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        conn.connect(SOCKET_PATH)
+        conn.sendall(json.dumps(payload).encode() + b"\n")
+        while True:
+            channel, data = recv_frame(conn)
+            if channel == STDOUT:
+                sys.stdout.buffer.write(data)
+                sys.stdout.buffer.flush()
+            elif channel == STDERR:
+                sys.stderr.buffer.write(data)
+                sys.stderr.buffer.flush()
+            else:
+                return json.loads(data)["exit_code"]
+
+
+if __name__ == "__main__":
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == "serve":
+        serve()
+    elif command == "symbols":
+        import manim
+        print(json.dumps(sorted(name for name in dir(manim) if not name.startswith("_"))))
+    elif command == "run":
+        job = job_environment()
+        apply_limits(job["cpu_limit"], job["wall_limit"])
+        code = run_manim(args)
+        write_stats(job["stats_dir"], job["job_id"], [resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)])
+        sys.exit(code)
+    elif command == "submit":
+        sys.exit(request({"args": args, **job_environment()}))
+    elif command == "run-tex":
+        sys.exit(compile_tex(json.loads(args[0])))
+    elif command == "submit-tex":
+        sys.exit(request({"tex": json.loads(args[0]), **job_environment()}))
+    elif command == "evict-tex":
+        sys.exit(evict_tex_cache(int(args[0])))
+    elif command == "cancel":
+        sys.exit(cancel(args[0]))
+    elif command == "ping":
+        sys.exit(request({"ping": True}))
+    else:
+        sys.exit(f"unknown command: {command}")
@@ -0,0 +1,139 @@
+import ast
+import hashlib
+
+# Statements that leave the screen empty at the end of a segment, so the next
+# segment starting from a blank frame matches the chained render.
+CLEANUP_CALLS = {"clear"}
+
+
+def construct_of(node: ast.ClassDef) -> ast.FunctionDef | None:
+    for child in node.body:
+        if isinstance(child, ast.FunctionDef) and child.name == "construct":
+            return child
+    return None
+
+
+def chained_scene(stmt: ast.stmt, classes: dict[str, ast.ClassDef]) -> str | None:
+    # Matches `Intro.construct(self)`.
+    if not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call)):
+        return None
+    call = stmt.value
+    if (
+        isinstance(call.func, ast.Attribute) and call.func.attr == "construct"
+        and isinstance(call.func.value, ast.Name) and call.func.value.id in classes
+        and len(call.args) == 1 and not call.keywords
+        and isinstance(call.args[0], ast.Name) and call.args[0].id == "self"
+    ):
+        return call.func.value.id
+    return None
+
+
+def is_self_mobjects(node: ast.expr) -> bool:
+    return (
+        isinstance(node, ast.Attribute) and node.attr == "mobjects"
+        and isinstance(node.value, ast.Name) and node.value.id == "self"
+    )
+
+
+def is_cleanup(stmt: ast.stmt) -> bool:
+    if not (isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call)):
+        return False
+    call = stmt.value
+    if not (isinstance(call.func, ast.Attribute) and isinstance(call.func.value, ast.Name) and call.func.value.id == "self"):
+        return False
+
+    if call.func.attr in CLEANUP_CALLS:
+        return True
+    # self.remove(*self.mobjects)
+    if call.func.attr == "remove":
+        return any(isinstance(arg, ast.Starred) and is_self_mobjects(arg.value) for arg in call.args)
+    # self.play(FadeOut(*self.mobjects)) / self.play(FadeOut(Group(*self.mobjects)))
+    # / self.play(*[FadeOut(m) for m in self.mobjects])
+    if call.func.attr == "play":
+        for arg in call.args:
+            for node in ast.walk(arg):
+                if isinstance(node, ast.Starred) and is_self_mobjects(node.value):
+                    return True
+                if isinstance(node, ast.comprehension) and is_self_mobjects(node.iter):
+                    return True
+    return False
+
+
+def uses_camera_frame(node: ast.AST) -> bool:
+    return any(
+        isinstance(child, ast.Attribute) and child.attr == "frame"
+        and isinstance(child.value, ast.Attribute) and child.value.attr == "camera"
+        for child in ast.walk(node)
+    )
+
+
+def self_attributes(node: ast.AST, ctx: type) -> set[str]:
+    return {
+        child.attr for child in ast.walk(node)
+        if isinstance(child, ast.Attribute) and isinstance(child.ctx, ctx)
+        and isinstance(child.value, ast.Name) and child.value.id == "self"
+    }
+
+
+def base_names(node: ast.ClassDef) -> list[str]:
+    return [ast.unparse(base) for base in node.bases]
+
+
+# Returns the scene classes `Main` chains together, in order, when each one can
+# be rendered on its own and concatenated into the same video. Returns None
+# whenever that can't be shown from the source, and the caller renders Main
+# in a single process instead.
+def split_scenes(code: str) -> list[str] | None:
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return None
+
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    main = classes.get("Main")
+    if main is None or [child for child in main.body if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef))] != [construct_of(main)]:
+        return None
+
+    body = construct_of(main).body # type: ignore
+    if body and isinstance(body[0], ast.Expr) and isinstance(body[0].value, ast.Constant):
+        body = body[1:]
+
+    scenes = [chained_scene(stmt, classes) for stmt in body]
+    if len(scenes) < 2 or None in scenes or len(set(scenes)) != len(scenes):
+        return None
+
+    assigned: dict[str, str] = {}
+    for name in scenes:
+        node = classes[name] # type: ignore
+        construct = construct_of(node)
+        # Each segment renders with its own class, which must produce the same
+        # camera as Main does when it borrows construct().
+        if construct is None or name == "Main" or base_names(node) != base_names(main):
+            return None
+        for attr in self_attributes(node, ast.Store):
+            assigned.setdefault(attr, name) # type: ignore
+
+    for i, name in enumerate(scenes):
+        node = classes[name] # type: ignore
+        construct = construct_of(node)
+        last = i == len(scenes) - 1
+        if not last and (not construct.body or not is_cleanup(construct.body[-1]) or uses_camera_frame(node)): # type: ignore
+            return None
+        # State handed from one scene to the next through `self` can't be split.
+        if any(assigned.get(attr, name) != name for attr in self_attributes(node, ast.Load)):
+            return None
+
+    return scenes # type: ignore
+
+
+# A hash per scene of everything its render depends on: its own class plus the
+# module-level code outside the chained scenes. Formatting and comments don't
+# count, so a fix that leaves a scene alone leaves its fingerprint alone.
+def scene_fingerprints(code: str, scenes: list[str]) -> dict[str, str]:
+    tree = ast.parse(code)
+    classes = {node.name: node for node in tree.body if isinstance(node, ast.ClassDef)}
+    shared = ast.unparse(ast.Module(body=[stmt for stmt in tree.body if not (isinstance(stmt, ast.ClassDef) and (stmt.name in scenes or stmt.name == "Main"))], type_ignores=[]))
+    return {
+        scene: hashlib.sha256(f"{shared}\n{ast.unparse(classes[scene])}".encode()).hexdigest()[:16]
+        for scene in scenes
+    }
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import uuid
+from contextlib import asynccontextmanager
+from enum import Enum
+
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from langchain_core.messages import BaseMessage
+from langchain.messages import HumanMessage
+from langgraph.types import Command, Interrupt
+from pydantic import BaseModel
+
+from agent import app, checkpointer, media_store, prefetcher, router, State, logger, setup_logging
+from metrics import prometheus_text
+from runner import release_workspace
+
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    setup_logging()
+    yield
+
+api = FastAPI(title="Masim Agent", lifespan=lifespan)
+
+# One run at a time per thread; different threads run concurrently and are
+# only bounded by the LLM/render limits in agent.py.
+thread_locks: dict[str, asyncio.Lock] = {}
+
+class StartRequest(BaseModel):
+    message: str
+    max_retry: int = 5
+
+class ResumeRequest(BaseModel):
+    value: str
+
+def thread_config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+def encode(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Interrupt):
+        return {"id": value.id, "value": encode(value.value)}
+    if isinstance(value, BaseMessage):
+        return {"type": value.type, "content": value.content}
+    if isinstance(value, BaseModel):
+        return encode(value.model_dump())
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode(item) for item in value]
+    return value
+
+def dumps(value) -> str:
+    return json.dumps(encode(value), ensure_ascii=False, default=str)
+
+def graph_input(thread_id: str, request: StartRequest | ResumeRequest):
+    if isinstance(request, StartRequest):
+        return State(session_id=thread_id, messages=[HumanMessage(request.message)], max_retry=request.max_retry, retry=0) # type: ignore
+    return Command(resume=request.value)
+
+# Takes the session's lock or answers 409. A free asyncio.Lock is acquired
+# without yielding to the event loop, so no other request can get in between
+# the check and the acquire. The caller releases it.
+async def thread_lock(thread_id: str) -> asyncio.Lock:
+    lock = thread_locks.setdefault(thread_id, asyncio.Lock())
+    if lock.locked():
+        raise HTTPException(status_code=409, detail="This session is already running")
+    await lock.acquire()
+    return lock
+
+async def run_events(thread_id: str, data):
+    async for event in app.astream(data, config=thread_config(thread_id), stream_mode=["updates", "custom"]):
+        yield event
+
+async def sse(thread_id: str, data) -> StreamingResponse:
+    lock = await thread_lock(thread_id)
+    events = run_events(thread_id, data)
+
+    async def stream():
+        try:
+            async for mode, event in events:
+                if mode == "custom":
+                    yield f"event: progress\ndata: {dumps(event)}\n\n"
+                else:
+                    yield f"data: {dumps(event)}\n\n"
+        except Exception as e:
+            logger.error(f"An error occurred: {e}")
+            yield f"event: error\ndata: {json.dumps(str(e))}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    # The background task runs once the response is done, including when the
+    # client went away before the stream started.
+    return StreamingResponse(stream(), media_type="text/event-stream", background=BackgroundTask(lock.release))
+
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
+
+@api.get("/routing")
+async def routing():
+    return router.stats()
+
+@api.post("/sessions")
+async def create_session():
+    return {"thread_id": str(uuid.uuid4())}
+
+@api.get("/sessions/{thread_id}")
+async def get_session(thread_id: str):
+    snapshot = await app.aget_state(thread_config(thread_id))
+    return json.loads(dumps({
+        "values": snapshot.values,
+        "next": snapshot.next,
+        "interrupts": snapshot.interrupts,
+        "running": thread_id in thread_locks and thread_locks[thread_id].locked(),
+    }))
+
+@api.delete("/sessions/{thread_id}")
+async def delete_session(thread_id: str):
+    lock = await thread_lock(thread_id)
+    try:
+        prefetcher.cancel(thread_id)
+        await checkpointer.adelete_thread(thread_id)
+        await asyncio.to_thread(media_store.delete_session, thread_id)
+        await asyncio.to_thread(release_workspace, thread_id)
+    finally:
+        lock.release()
+        thread_locks.pop(thread_id, None)
+    return {"thread_id": thread_id}
+
+# Videos are sent with FileResponse, which answers Range requests (206), so
+# players seek and stream instead of downloading the whole file first.
+@api.get("/media/{root}/{path:path}")
+async def media(root: str, path: str, variant: str | None = None):
+    video = media_store.resolve(root, path)
+    if video is None:
+        raise HTTPException(status_code=404, detail="No such video")
+    media_store.touch(video)
+    if variant is not None:
+        if variant not in ("poster", "preview"):
+            raise HTTPException(status_code=400, detail="variant must be poster or preview")
+        video = await asyncio.to_thread(media_store.variant, video, variant)
+        if video is None:
+            raise HTTPException(status_code=503, detail=f"Could not make a {variant}")
+    media_type = "image/jpeg" if variant == "poster" else "video/mp4"
+    return FileResponse(video, media_type=media_type, headers={"Cache-Control": "private, max-age=3600"})
+
+@api.get("/sessions/{thread_id}/video")
+async def session_video(thread_id: str, variant: str | None = None):
+    snapshot = await app.aget_state(thread_config(thread_id))
+    output_path = snapshot.values.get("output_path")
+    url = media_store.url(output_path) if output_path else None
+    if url is None:
+        raise HTTPException(status_code=404, detail="This session has no video yet")
+    return RedirectResponse(f"{url}?variant={variant}" if variant else url)
+
+@api.post("/sessions/{thread_id}/run")
+async def start_session(thread_id: str, request: StartRequest):
+    return await sse(thread_id, graph_input(thread_id, request))
+
+@api.post("/sessions/{thread_id}/resume")
+async def resume_session(thread_id: str, request: ResumeRequest):
+    return await sse(thread_id, graph_input(thread_id, request))
+
+# Same protocol as the SSE endpoints over one socket: send
+# {"message": ..., "max_retry": ...} to start and {"value": ...} to resume.
+@api.websocket("/sessions/{thread_id}/ws")
+async def session_socket(websocket: WebSocket, thread_id: str):
+    await websocket.accept()
+    try:
+        while True:
+            payload = await websocket.receive_json()
+            request = StartRequest(**payload) if "message" in payload else ResumeRequest(**payload)
+            try:
+                lock = await thread_lock(thread_id)
+                try:
+                    async for mode, event in run_events(thread_id, graph_input(thread_id, request)):
+                        await websocket.send_text(dumps({"__progress__": event} if mode == "custom" else event))
+                finally:
+                    lock.release()
+                await websocket.send_text(dumps({"__end__": True}))
+            except HTTPException as e:
+                await websocket.send_text(dumps({"__error__": e.detail}))
+            except Exception as e:
+                logger.error(f"An error occurred: {e}")
+                await websocket.send_text(dumps({"__error__": str(e)}))
+    except WebSocketDisconnect:
+        pass
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(api, host="0.0.0.0", port=8000)
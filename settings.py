@@ -0,0 +1,131 @@
+from pydantic import BaseModel
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class RenderHost(BaseModel):
+    # Anything docker.DockerClient takes as base_url, e.g. "ssh://render1" or "tcp://10.0.0.5:2376"
+    url: str
+    capacity: int = 4
+
+
+class Settings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="MASIM_", env_file=".env", extra="ignore")
+
+    prompts_dir: str = "prompts"
+
+    # Import-time budget (seconds) checked by `python startup.py`
+    startup_budget: float = 3.0
+
+    # Sessions and code versions survive restarts; older checkpoints of a thread are pruned
+    checkpoint_db: str = "masim.db"
+    checkpoint_keep: int = 20
+
+    # Concurrency bounds shared by every session in the process (async graph)
+    llm_concurrency: int = 16
+    render_concurrency: int = 4
+
+    # Requests `batch.py` runs at once; LLM calls and renders stay bounded by the limits above
+    batch_workers: int = 8
+
+    sandbox_image: str = "sandbox:latest"
+
+    # Where renders run: "docker" (the local daemon plus `render_hosts`) or
+    # "subprocess" (manim installed next to the agent, for tests and benchmarks).
+    # Capacity is the renders a host takes at once; 0 keeps renders off the local daemon.
+    render_backend: str = "docker"
+    render_local_capacity: int = 4
+    # Remote Docker daemons with the sandbox image, e.g. '[{"url": "ssh://render1", "capacity": 8}]'
+    render_hosts: list[RenderHost] = []
+    # Seconds a host that failed is left out of scheduling
+    render_host_cooldown: float = 60.0
+    # Interpreter with manim for the subprocess backend (default: the agent's own)
+    render_python: str = ""
+    sandbox_mem_limit: str = "8g"
+
+    # Render tier used while the fix loop is still running: "validate" or "preview".
+    # The full-quality encode only runs once the human review approves the result.
+    loop_render_tier: str = "preview"
+
+    # Static checks run before the sandbox; failures skip the render entirely
+    preflight_enabled: bool = True
+    symbols_index: str = "manim_symbols.json"
+
+    # Token budget of the render output digest code_analyzer sees
+    analyzer_digest_tokens: int = 600
+
+    # Hard limits per render; a traceback aborts the render after the grace period
+    render_timeout: float = 600.0
+    render_cpu_limit: int = 1800
+    traceback_grace: float = 2.0
+
+    # Render the scenes Main chains together concurrently and concat the results
+    parallel_scenes: bool = False
+    render_workers: int = 4
+
+    # How fix_coding_agent answers: "patch" (search/replace edits, full rewrite
+    # when they don't apply) or "rewrite" (the whole script every time)
+    fix_response_mode: str = "patch"
+
+    # Model routing: nodes use routing.DEFAULT_MODELS unless overridden here,
+    # e.g. '{"planning_agent": "mini"}'. Fixes go to nano when the analyzer
+    # reports at most `routing_simple_max_issues` issues with a simple error,
+    # and to mini once a session is past `routing_escalate_after` retries or
+    # nano's fix success rate (after `routing_min_samples` fixes) drops below
+    # `routing_min_success_rate`, or its mean latency over its success rate is
+    # higher than mini's.
+    model_overrides: dict[str, str] = {}
+    routing_escalate_after: int = 2
+    routing_simple_max_issues: int = 2
+    routing_min_success_rate: float = 0.4
+    routing_min_samples: int = 10
+
+    # Speculative fixing: write and render this many fix candidates at once
+    # (1 disables it), cycling through the models below. The budget caps the
+    # candidates a session may generate; past it fixes go back to one at a time.
+    speculative_candidates: int = 1
+    speculative_models: list[str] = ["mini", "nano"]
+    speculative_budget: int = 12
+
+    # Warm container pool kept on each Docker render host
+    pool_size: int = 2
+    pool_max_jobs: int = 20
+    pool_max_memory_mb: int = 2048
+    pool_start_timeout: float = 60.0
+
+    # LaTeX/SVG cache shared by every sandbox container
+    tex_cache_dir: str = "tex_cache"
+    tex_cache_max_mb: int = 1024
+
+    # While the LLM plans, start a sandbox worker and compile the plan's
+    # formulas (at most this many per plan) into the Tex cache
+    prefetch_enabled: bool = True
+    prefetch_max_expressions: int = 20
+
+    # Finished renders keyed on normalized code, sandbox image digest and tier
+    render_cache_enabled: bool = True
+    render_cache_dir: str = "render_cache"
+    render_cache_max_mb: int = 4096
+
+    # Render attempts under output/ are evicted least recently used first past
+    # this quota; each session's approved final render is always kept
+    media_quota_mb: int = 20480
+    ffmpeg_binary: str = "ffmpeg"
+    media_preview_height: int = 360
+    media_preview_bitrate: str = "500k"
+    # server.py address the web UI plays videos from (empty: through Streamlit)
+    media_base_url: str = ""
+
+    # Per-node spans are appended here as JSONL (empty disables the file);
+    # only this fraction of spans and stream events is logged
+    metrics_path: str = "metrics.jsonl"
+    log_sample_rate: float = 0.1
+
+    # Opt-in SQLite cache of LLM responses for the listed nodes
+    llm_cache_enabled: bool = False
+    llm_cache_nodes: list[str] = ["goal_extractor", "planning_agent", "plan_reviser"]
+    llm_cache_path: str = "llm_cache.sqlite"
+    llm_cache_ttl: float = 7 * 24 * 3600
+    llm_cache_max_entries: int = 10000
+
+
+settings = Settings()
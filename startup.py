@@ -0,0 +1,45 @@
+import statistics
+import subprocess
+import sys
+
+from settings import settings
+
+# Entry-point modules a new web worker imports before it can serve anything
+MODULES = ["agent", "server"]
+RUNS = 5
+
+
+def import_time(module: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"],
+        capture_output=True, text=True, check=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+# Slowest imports by cumulative time, from `python -X importtime`.
+def slowest_imports(module: str, count: int = 10) -> list[tuple[float, str]]:
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True, text=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        rows.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def main() -> int:
+    over_budget = False
+    for module in MODULES:
+        median = statistics.median(import_time(module) for _ in range(RUNS))
+        print(f"import {module}: {median:.3f}s (budget {settings.startup_budget:.1f}s)")
+        if median > settings.startup_budget:
+            over_budget = True
+            for seconds, name in slowest_imports(module):
+                print(f"  {seconds:.3f}s  {name}")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
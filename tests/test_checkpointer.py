@@ -0,0 +1,88 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.graph import END, START, StateGraph
+
+from checkpointer import DurableSaver
+from code_store import CodeStore
+
+
+class State(TypedDict):
+    codes: Annotated[list[str], lambda left, right: (left + right)[-2:]]
+    n: int
+
+
+@pytest.fixture
+def db(tmp_path) -> Path:
+    return tmp_path/"masim.db"
+
+
+def count(db: Path, table: str) -> int:
+    with sqlite3.connect(db) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def run(saver: DurableSaver, store: CodeStore, thread_id: str, steps: int) -> dict:
+    def step(state: State):
+        return {"codes": [store.put(thread_id, f"{thread_id} code {state['n']}")], "n": state["n"] + 1}
+
+    graph = StateGraph(State)
+    graph.add_node("step", step)
+    graph.add_edge(START, "step")
+    graph.add_conditional_edges("step", lambda state: END if state["n"] >= steps else "step")
+    return graph.compile(checkpointer=saver).invoke({"codes": [], "n": 0}, {"configurable": {"thread_id": thread_id}})
+
+
+def test_only_the_latest_checkpoints_and_their_code_are_kept(db):
+    store = CodeStore(db)
+    saver = DurableSaver.open(db, keep=3, code_store=store)
+
+    out = run(saver, store, "t", 12)
+
+    assert count(db, "checkpoints") == 3
+    assert [store.get(ref) for ref in out["codes"]] == ["t code 10", "t code 11"]
+    # The three kept checkpoints still point at codes 8 to 11.
+    assert count(db, "code_blobs") == 4
+
+
+def test_prune_and_delete_release_code(db):
+    store = CodeStore(db)
+    saver = DurableSaver.open(db, keep=3, code_store=store)
+    run(saver, store, "t", 12)
+    run(saver, store, "other", 3)
+
+    saver.prune(["t"])
+
+    assert count(db, "code_blobs") == 2 + 3
+
+    saver.delete_thread("t")
+
+    assert count(db, "code_blobs") == 3
+
+
+def test_retain_keeps_refs_made_after_the_cutoff(db):
+    store = CodeStore(db)
+    old = store.put("t", "old")
+    kept = store.put("t", "kept")
+    cutoff = time.time()
+    new = store.put("t", "new")
+
+    store.retain("t", {kept}, cutoff)
+
+    with pytest.raises(KeyError):
+        store.get(old)
+    assert store.get(kept) == "kept"
+    assert store.get(new) == "new"
+
+
+def test_blobs_shared_with_another_thread_are_kept(db):
+    store = CodeStore(db)
+    ref = store.put("a", "shared")
+    store.put("b", "shared")
+
+    store.retain("a", set(), time.time())
+
+    assert store.get(ref) == "shared"
@@ -0,0 +1,59 @@
+import pytest
+from pydantic import BaseModel
+
+import llm_cache
+from llm_cache import LLMCache
+
+
+class Goal(BaseModel):
+    goal: str
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock.time)
+    return clock
+
+
+def test_key_ignores_message_ids():
+    prompt = "[HumanMessage(content='draw a circle', id='{}')]"
+    key = LLMCache.key("nano", prompt.format("0b7c4a52-3f0e-4c1e-9a77-2f5d1f0c9e11"), Goal)
+
+    assert LLMCache.key("nano", prompt.format("5e2d9a10-8c4b-4f7a-b1d3-6a0e7c2b4f58"), Goal) == key
+    assert LLMCache.key("mini", prompt.format("5e2d9a10-8c4b-4f7a-b1d3-6a0e7c2b4f58"), Goal) != key
+
+
+def test_entries_expire(tmp_path, clock):
+    cache = LLMCache(tmp_path/"llm.db", ttl=60, max_entries=10)
+    cache.put("goal_extractor", "k", Goal(goal="circle"))
+
+    clock.now += 60
+    assert cache.get("goal_extractor", "k", Goal) == Goal(goal="circle")
+
+    clock.now += 1
+    assert cache.get("goal_extractor", "k", Goal) is None
+
+
+def test_least_recently_used_entries_go_first(tmp_path, clock):
+    cache = LLMCache(tmp_path/"llm.db", ttl=3600, max_entries=2)
+    cache.put("goal_extractor", "a", Goal(goal="a"))
+    clock.now += 1
+    cache.put("goal_extractor", "b", Goal(goal="b"))
+    clock.now += 1
+    cache.get("goal_extractor", "a", Goal)
+    clock.now += 1
+
+    cache.put("goal_extractor", "c", Goal(goal="c"))
+
+    assert cache.get("goal_extractor", "a", Goal) == Goal(goal="a")
+    assert cache.get("goal_extractor", "b", Goal) is None
+    assert cache.get("goal_extractor", "c", Goal) == Goal(goal="c")
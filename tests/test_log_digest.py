@@ -0,0 +1,114 @@
+from pathlib import Path
+
+from log_digest import CHARS_PER_TOKEN, ErrorDigest, Frame, extract
+
+CORPUS = Path(__file__).parent.parent / "benchmark" / "corpus"
+
+NAME_ERROR = (CORPUS / "name_error.py").read_text()
+TRANSFORM_TYPO = (CORPUS / "transform_typo.py").read_text()
+
+# What manim's rich traceback handler prints for name_error.py
+RICH_STDERR = """\
+[10/18/26 12:00:00] INFO     Animation 0 : Partial movie file written in '/sandbox/media/videos/tmpab12/480p15/partial_movie_files/Main/1.mp4'
+╭─────────────────────────── Traceback (most recent call last) ────────────────────────────╮
+│ /usr/local/lib/python3.12/site-packages/manim/cli/render/commands.py:120 in render        │
+│                                                                                           │
+│   119 │   │   │   │   scene = SceneClass()                                                │
+│ ❱ 120 │   │   │   │   scene.render()                                                      │
+│                                                                                           │
+│ /usr/local/lib/python3.12/site-packages/manim/scene/scene.py:237 in render                │
+│                                                                                           │
+│ ❱ 237 │   │   │   self.construct()                                                        │
+│                                                                                           │
+│ /sandbox/jobs/tmpab12.py:13 in construct                                                  │
+│                                                                                           │
+│   12 │   │                                                                                │
+│ ❱ 13 │   │   a_square = Sqaure(side_length=2, color=RED, fill_opacity=0.4)                │
+╰───────────────────────────────────────────────────────────────────────────────────────────╯
+NameError: name 'Sqaure' is not defined
+"""
+
+# A plain Python traceback for transform_typo.py, raised inside manim
+PLAIN_STDERR = """\
+WARNING  Font Arial not found, falling back to default
+WARNING  Font Arial not found, falling back to default
+Traceback (most recent call last):
+  File "/usr/local/lib/python3.12/site-packages/manim/scene/scene.py", line 237, in render
+    self.construct()
+  File "/sandbox/jobs/tmpab12.py", line 14, in construct
+    self.play(Transform(triangle))
+              ^^^^^^^^^^^^^^^^^^^
+  File "/usr/local/lib/python3.12/site-packages/manim/animation/transform.py", line 134, in __init__
+    raise TypeError(message)
+TypeError: Transform.__init__() missing 1 required positional argument: 'target_mobject'
+"""
+
+STDOUT = """\
+Manim Community v0.19.0
+Animation 0: Write(Text('Pythagorean theorem')):  45%|####5     | 27/60 [00:01<00:01, 20.00it/s]\rAnimation 0: Write(Text('Pythagorean theorem')): 100%|##########| 60/60 [00:02<00:00, 20.00it/s]
+[10/18/26 12:00:01] INFO     Animation 1 : Partial movie file written
+"""
+
+
+def test_rich_traceback():
+    digest = extract("", RICH_STDERR, NAME_ERROR)
+
+    assert digest.exception == "NameError: name 'Sqaure' is not defined"
+    assert [(frame.line, frame.func) for frame in digest.user_frames] == [(13, "construct")]
+    assert "Sqaure(side_length=2" in digest.user_frames[0].source
+    # The user's script raised it, so no library frame is blamed
+    assert digest.raised_in is None
+
+
+def test_plain_traceback():
+    digest = extract("", PLAIN_STDERR, TRANSFORM_TYPO)
+
+    assert digest.exception == "TypeError: Transform.__init__() missing 1 required positional argument: 'target_mobject'"
+    assert [frame.line for frame in digest.user_frames] == [14]
+    assert digest.user_frames[0].source.strip() == "self.play(Transform(triangle))"
+    assert digest.raised_in is not None
+    assert digest.raised_in.path.endswith("manim/animation/transform.py")
+    assert digest.raised_in.source is None
+
+
+def test_warnings_are_counted_once():
+    digest = extract("", PLAIN_STDERR, TRANSFORM_TYPO)
+
+    assert digest.warnings == {"WARNING  Font Arial not found, falling back to default": 2}
+
+
+def test_stdout_drops_progress_bars_and_log_prefixes():
+    digest = extract(STDOUT, "", TRANSFORM_TYPO)
+
+    assert digest.stdout_tail == ["Manim Community v0.19.0", "INFO     Animation 1 : Partial movie file written"]
+    assert digest.exception is None
+
+
+def test_render_keeps_sections_in_order():
+    text = extract(STDOUT, PLAIN_STDERR, TRANSFORM_TYPO).render(1000)
+
+    sections = ["exception: TypeError", "user code frames", "raised in:", "warnings (1):", "stdout (last lines):"]
+    positions = [text.index(section) for section in sections]
+    assert positions == sorted(positions)
+    assert "line 14 in construct: self.play(Transform(triangle))" in text
+
+
+def test_render_drops_sections_past_the_budget():
+    digest = extract(STDOUT, PLAIN_STDERR, TRANSFORM_TYPO)
+    full = digest.render(1000)
+    cut = full.index("\nwarnings")
+
+    text = digest.render(cut // CHARS_PER_TOKEN + 1)
+
+    assert text == full[:cut]
+    assert len(text) <= (cut // CHARS_PER_TOKEN + 1) * CHARS_PER_TOKEN
+
+
+def test_render_truncates_an_oversized_first_section():
+    digest = ErrorDigest(exception="ValueError: " + "x" * 200, user_frames=[Frame("scene.py", 1, "<module>", "x = 1")])
+
+    text = digest.render(10)
+
+    assert len(text) == 10 * CHARS_PER_TOKEN
+    assert text.startswith("exception: ValueError")
+    assert text.endswith("...")
@@ -0,0 +1,93 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from media import MediaStore
+
+KB = 1024
+
+
+@pytest.fixture
+def output(tmp_path) -> Path:
+    return tmp_path/"output"
+
+
+def store(tmp_path: Path, output: Path, quota_bytes: int, rendering: set[str] | None = None) -> MediaStore:
+    return MediaStore(tmp_path/"media.db", {"output": output}, quota_bytes, "ffmpeg", 360, "500k", rendering=rendering)
+
+
+def video(output: Path, stem: str, name: str = "output.mp4", size: int = KB) -> str:
+    path = output/"videos"/stem/"480p15"/name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(os.urandom(size))
+    return str(path.absolute())
+
+
+def test_least_recently_used_attempt_goes_first(tmp_path, output):
+    media = store(tmp_path, output, quota_bytes=2 * KB)
+    old = video(output, "old")
+    media.record_attempt("s1", old)
+    media.record_attempt("s2", video(output, "other"))
+    media.record_attempt("s1", video(output, "new"))
+
+    assert not Path(old).exists()
+    assert (output/"videos"/"other").exists()
+    assert (output/"videos"/"new").exists()
+
+
+def test_latest_attempt_of_a_session_is_kept(tmp_path, output):
+    media = store(tmp_path, output, quota_bytes=KB)
+    earlier = video(output, "session_a", "earlier.mp4")
+    media.record_attempt("s1", earlier)
+    video(output, "session_a", "partial_movie_files/Main/1.mp4")
+    latest = video(output, "session_a", "latest.mp4")
+    media.record_attempt("s1", latest)
+
+    assert Path(latest).exists()
+    assert not Path(earlier).exists()
+    assert not (output/"videos"/"session_a"/"480p15"/"partial_movie_files"/"Main"/"1.mp4").exists()
+
+
+def test_finals_are_not_counted(tmp_path, output):
+    media = store(tmp_path, output, quota_bytes=2 * KB)
+    final = output/"sessions"/"done"/"final.mp4"
+    final.parent.mkdir(parents=True)
+    final.write_bytes(os.urandom(5 * KB))
+
+    media.record_attempt("s1", video(output, "a"))
+    media.record_attempt("s2", video(output, "b"))
+
+    assert (output/"videos"/"a").exists()
+    assert (output/"videos"/"b").exists()
+    assert final.exists()
+
+
+def test_renders_in_flight_are_not_evicted(tmp_path, output):
+    rendering = {"session_other"}
+    media = store(tmp_path, output, quota_bytes=KB, rendering=rendering)
+    partial = video(output, "session_other", "partial_movie_files/Main/1.mp4", 2 * KB)
+
+    media.record_attempt("s1", video(output, "mine"))
+
+    assert Path(partial).exists()
+
+    rendering.clear()
+    media.record_attempt("s1", video(output, "again"))
+
+    assert not Path(partial).exists()
+
+
+def test_finalize_moves_the_video_and_drops_attempts(tmp_path, output):
+    media = store(tmp_path, output, quota_bytes=100 * KB)
+    first = video(output, "first")
+    second = video(output, "second")
+    media.record_attempt("s1", first)
+    media.record_attempt("s1", second)
+
+    final = media.finalize("s1", second)
+
+    assert Path(final) == (output/"sessions"/"s1"/"final.mp4").absolute()
+    assert Path(final).exists()
+    assert not (output/"videos"/"first").exists()
+    assert not (output/"videos"/"second").exists()
@@ -0,0 +1,78 @@
+from pathlib import Path
+
+from patching import apply_edit, apply_edits
+
+CORPUS = Path(__file__).parent.parent / "benchmark" / "corpus"
+
+TRANSFORM_TYPO = (CORPUS / "transform_typo.py").read_text()
+TRANSFORM_FIXED = (CORPUS / "transform_fixed.py").read_text()
+NAME_ERROR = (CORPUS / "name_error.py").read_text()
+PYTHAGORAS = (CORPUS / "pythagoras.py").read_text()
+
+
+def test_exact_edit():
+    edit = {"search": "Sqaure(", "replace": "Square("}
+
+    assert apply_edit(NAME_ERROR, edit) == PYTHAGORAS
+
+
+def test_edit_written_without_indentation_is_reindented():
+    edit = {
+        "search": "self.play(Transform(triangle))\nself.play(FadeIn(square))\n",
+        "replace": "self.play(Transform(triangle, square))\n",
+    }
+
+    assert apply_edit(TRANSFORM_TYPO, edit) == TRANSFORM_FIXED
+
+
+def test_reindent_keeps_nesting_of_the_replacement():
+    edit = {
+        "search": "    self.wait(1)\n\n    square = Square(side_length=2, color=RED, fill_opacity=0.4)",
+        "replace": "    for _ in range(2):\n        self.wait(0.5)\n\n    square = Square(side_length=2, color=RED, fill_opacity=0.4)",
+    }
+
+    patched = apply_edit(TRANSFORM_TYPO, edit)
+
+    assert "        for _ in range(2):\n            self.wait(0.5)\n\n        square = Square(" in patched
+
+
+def test_fuzzy_edit_tolerates_a_slightly_wrong_search():
+    # The model misremembered the variable name in its search text
+    edit = {
+        "search": "        self.play(Transform(triangel))\n        self.play(FadeIn(square))",
+        "replace": "        self.play(Transform(triangle, square))",
+    }
+
+    assert apply_edit(TRANSFORM_TYPO, edit) == TRANSFORM_FIXED
+
+
+def test_fuzzy_edit_refuses_a_dissimilar_search():
+    edit = {"search": "self.play(Rotate(hexagon, angle=PI))", "replace": "pass"}
+
+    assert apply_edit(TRANSFORM_TYPO, edit) is None
+
+
+def test_ambiguous_search_is_refused():
+    # `self.wait(1)` appears twice in name_error.py
+    edit = {"search": "        self.wait(1)\n", "replace": "        self.wait(2)\n"}
+
+    assert apply_edit(NAME_ERROR, edit) is None
+
+
+def test_apply_edits_runs_edits_in_order():
+    # The second search only exists once the first edit is in
+    edits = [
+        {"search": "Transform(triangle)", "replace": "Transform(triangle, square)"},
+        {"search": "self.play(Transform(triangle, square))\n        self.play(FadeIn(square))", "replace": "self.play(Transform(triangle, square))"},
+    ]
+
+    assert apply_edits(TRANSFORM_TYPO, edits) == TRANSFORM_FIXED
+    assert apply_edits(TRANSFORM_TYPO, edits[::-1]) is None
+
+
+def test_apply_edits_refuses_broken_results():
+    assert apply_edits(TRANSFORM_TYPO, []) is None
+    assert apply_edits(TRANSFORM_TYPO, [{"search": "Sqaure", "replace": "Square"}]) is None
+    assert apply_edits(TRANSFORM_TYPO, [{"search": "self.wait(2)", "replace": "self.wait(2"}]) is None
+    # An edit that changes nothing needs a full rewrite too
+    assert apply_edits(TRANSFORM_TYPO, [{"search": "self.wait(2)", "replace": "self.wait(2)"}]) is None
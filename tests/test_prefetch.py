@@ -0,0 +1,96 @@
+import threading
+import time
+from pathlib import Path
+
+import prefetch
+from executors import Executor, Scheduler
+from prefetch import Prefetcher, tex_expressions
+
+
+class FakeExecutor(Executor):
+    capacity = 2
+    media_root = "/media"
+
+    def __init__(self, name: str, ok: bool = True):
+        super().__init__(Path("/nonexistent"))
+        self.name = name
+        self.ok = ok
+        self.compiled: list[list[str]] = []
+
+    def run_manim(self, args, on_progress=None, cancel=None):
+        return 0, "", ""
+
+    def run_command(self, command):
+        return 0, "", ""
+
+    def image_digest(self) -> str:
+        return "sha256:fake"
+
+    def symbols(self) -> list[str]:
+        return []
+
+    def precompile_tex(self, expressions: list[str], cancel: threading.Event | None = None) -> bool:
+        self.compiled.append(expressions)
+        return self.ok
+
+
+def precompile(prefetcher: Prefetcher, texts: list[str]):
+    prefetcher.precompile("s", texts)
+    deadline = time.monotonic() + 5
+    while prefetcher._pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_tex_expressions():
+    texts = ["Show $A = \\pi r^2$ and $$a^2 + b^2 = c^2$$", "again $A = \\pi r^2$, then \\(x\\)"]
+
+    assert tex_expressions(texts, 10) == ["A = \\pi r^2", "a^2 + b^2 = c^2", "x"]
+    assert tex_expressions(texts, 2) == ["A = \\pi r^2", "a^2 + b^2 = c^2"]
+
+
+def test_compiled_formulas_are_skipped_on_the_same_host():
+    executor = FakeExecutor("a")
+    prefetcher = Prefetcher(Scheduler([executor], cooldown=60), True, 20)
+
+    precompile(prefetcher, ["$x$"])
+    precompile(prefetcher, ["$x$ and $y$"])
+
+    assert executor.compiled == [["x"], ["y"]]
+    assert executor.in_flight == 0
+
+
+def test_failed_formulas_are_tried_again():
+    executor = FakeExecutor("a", ok=False)
+    prefetcher = Prefetcher(Scheduler([executor], cooldown=60), True, 20)
+
+    precompile(prefetcher, ["$x$"])
+    precompile(prefetcher, ["$x$"])
+
+    assert executor.compiled == [["x"], ["x"]]
+
+
+def test_another_host_compiles_its_own_cache():
+    a, b = FakeExecutor("a"), FakeExecutor("b")
+    prefetcher = Prefetcher(Scheduler([a, b], cooldown=60), True, 20)
+
+    precompile(prefetcher, ["$x$"])
+    a.in_flight = a.capacity
+    precompile(prefetcher, ["$x$"])
+
+    assert a.compiled == [["x"]]
+    assert b.compiled == [["x"]]
+
+
+def test_compiled_formulas_are_forgotten(monkeypatch):
+    executor = FakeExecutor("a")
+    prefetcher = Prefetcher(Scheduler([executor], cooldown=60), True, 20)
+
+    monkeypatch.setattr(prefetch, "MAX_COMPILED", 1)
+    precompile(prefetcher, ["$x$"])
+    precompile(prefetcher, ["$y$"])
+    precompile(prefetcher, ["$x$"])
+
+    monkeypatch.setattr(prefetch, "COMPILED_TTL", 0.0)
+    precompile(prefetcher, ["$x$"])
+
+    assert executor.compiled == [["x"], ["y"], ["x"], ["x"]]
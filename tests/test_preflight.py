@@ -0,0 +1,87 @@
+import ast
+from pathlib import Path
+
+from preflight import preflight
+
+CORPUS = Path(__file__).parent.parent / "benchmark" / "corpus"
+
+
+def corpus(name: str) -> str:
+    return (CORPUS / name).read_text()
+
+
+def manim_names() -> set[str]:
+    # Stands in for the sandbox's symbol index: every name the working corpus
+    # scripts use that they don't define themselves.
+    names = set()
+    for path in CORPUS.glob("*.py"):
+        if path.name in ("name_error.py", "transform_typo.py", "camera_frame.py"):
+            continue
+        names |= {node.id for node in ast.walk(ast.parse(path.read_text())) if isinstance(node, ast.Name)}
+    return names
+
+
+def test_working_scripts_pass():
+    symbols = manim_names()
+    for name in ("circle_area.py", "pythagoras.py", "chained_scenes.py", "camera_frame_fixed.py", "transform_fixed.py"):
+        assert preflight(corpus(name), symbols) is None, name
+
+
+def test_undefined_name():
+    error = preflight(corpus("name_error.py"), manim_names())
+
+    assert error is not None
+    assert error.startswith("Traceback (most recent call last):")
+    assert 'File "scene.py", line 13, in <module>' in error
+    assert error.endswith("NameError: name 'Sqaure' is not defined")
+
+
+def test_names_are_not_checked_without_symbols():
+    assert preflight(corpus("name_error.py")) is None
+
+
+def test_unknown_import_from_manim():
+    code = "from manim import Scene, Sqaure\n\nclass Main(Scene):\n    def construct(self):\n        self.add(Sqaure())\n"
+
+    error = preflight(code, manim_names())
+
+    assert "ImportError: cannot import name 'Sqaure' from 'manim'" in error
+
+
+def test_other_star_imports_are_not_guessed():
+    code = "from manim import *\nfrom helpers import *\n\nclass Main(Scene):\n    def construct(self):\n        self.add(Helper())\n"
+
+    assert preflight(code, manim_names()) is None
+
+
+def test_camera_frame_on_a_plain_scene():
+    error = preflight(corpus("camera_frame.py"))
+
+    assert error is not None
+    assert "line 11" in error
+    assert error.endswith("AttributeError: 'Camera' object has no attribute 'frame'")
+
+
+def test_camera_frame_in_a_borrowed_scene():
+    code = corpus("chained_scenes.py").replace("self.wait(2)", "self.play(self.camera.frame.animate.scale(0.5))")
+
+    assert "AttributeError" in preflight(code)
+
+
+def test_camera_frame_under_an_unknown_base_is_allowed():
+    code = corpus("camera_frame.py").replace("class Main(Scene)", "class Main(ThreeDScene)")
+
+    assert preflight(code) is None
+
+
+def test_syntax_error():
+    error = preflight(corpus("pythagoras.py").replace("self.wait(2)", "self.wait(2"))
+
+    assert error.startswith("Traceback (most recent call last):")
+    assert "SyntaxError" in error
+
+
+def test_missing_main():
+    error = preflight(corpus("pythagoras.py").replace("class Main", "class Pythagoras"))
+
+    assert "does not define a top-level `class Main`" in error
@@ -0,0 +1,72 @@
+import os
+from pathlib import Path
+
+from render_cache import RenderCache
+
+KB = 1024
+
+
+def rendered(tmp_path: Path, name: str, size: int = KB) -> dict:
+    video = tmp_path/"renders"/name
+    video.parent.mkdir(exist_ok=True)
+    video.write_bytes(os.urandom(size))
+    return {"stdout": "", "stderr": "", "output_path": str(video)}
+
+
+def age(cache: RenderCache, key: str, mtime: int):
+    os.utime(cache.path/key, (mtime, mtime))
+
+
+def test_key_ignores_formatting_but_not_the_image_or_tier():
+    cache = RenderCache(Path("/nonexistent"), KB)
+    code = "from manim import *\n\nclass Main(Scene):\n    def construct(self):\n        self.wait(1)\n"
+    key = cache.key(code, "sha256:a", "low")
+
+    assert cache.key(code.replace("self.wait(1)", "# pause\n        self.wait( 1 )"), "sha256:a", "low") == key
+    assert cache.key(code.replace("self.wait(1)", "self.wait(2)"), "sha256:a", "low") != key
+    assert cache.key(code, "sha256:b", "low") != key
+    assert cache.key(code, "sha256:a", "high") != key
+
+
+def test_hit_outlives_the_rendered_video(tmp_path):
+    cache = RenderCache(tmp_path/"cache", 10 * KB)
+    result = rendered(tmp_path, "a.mp4")
+    cache.put("a", result)
+    Path(result["output_path"]).unlink()
+
+    hit = cache.get("a")
+
+    assert hit is not None
+    assert Path(hit["output_path"]) == (tmp_path/"cache"/"a"/"output.mp4").absolute()
+    assert Path(hit["output_path"]).exists()
+
+
+def test_failed_renders_are_cached_without_a_video(tmp_path):
+    cache = RenderCache(tmp_path/"cache", KB)
+    cache.put("a", {"stdout": "", "stderr": "boom", "output_path": None})
+
+    assert cache.get("a") == {"stdout": "", "stderr": "boom", "output_path": None}
+    assert cache.get("b") is None
+
+
+def test_least_recently_used_entries_go_first(tmp_path):
+    cache = RenderCache(tmp_path/"cache", 2 * KB + 512)
+    cache.put("a", rendered(tmp_path, "a.mp4"))
+    cache.put("b", rendered(tmp_path, "b.mp4"))
+    age(cache, "a", 1_000)
+    age(cache, "b", 2_000)
+    assert cache.get("a") is not None
+
+    cache.put("c", rendered(tmp_path, "c.mp4"))
+
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+
+
+def test_missing_video_is_a_miss(tmp_path):
+    cache = RenderCache(tmp_path/"cache", 10 * KB)
+    cache.put("a", rendered(tmp_path, "a.mp4"))
+    (tmp_path/"cache"/"a"/"output.mp4").unlink()
+
+    assert cache.get("a") is None
@@ -0,0 +1,66 @@
+import pytest
+
+from metrics import span
+from routing import Router
+from settings import settings
+
+NAME_ERROR = "Traceback (most recent call last):\n  File \"scene.py\", line 5, in construct\nNameError: name 'Circel' is not defined\n"
+
+
+@pytest.fixture(autouse=True)
+def no_metrics_file(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_path", "")
+
+
+def router(**overrides) -> Router:
+    return Router(overrides, "mini", "large", escalate_after=2, simple_max_issues=1, min_success_rate=0.5, min_samples=2)
+
+
+def fixes(router: Router, model: str, seconds: float, outcomes: list[bool]):
+    for success in outcomes:
+        with span("fix_coding_agent", {}):
+            router.record_call(model, seconds)
+        router.record_outcome("fix_coding_agent", model, success)
+
+
+def test_simple_errors_go_to_the_cheap_model():
+    assert router().fix_model({"stderr": NAME_ERROR, "analysis": ["typo"]}) == "mini"
+
+
+def test_complex_errors_and_repeated_failures_escalate():
+    assert router().fix_model({"stderr": NAME_ERROR.replace("NameError", "RuntimeError")}) == "large"
+    assert router().fix_model({"stderr": NAME_ERROR, "analysis": ["typo", "layout"]}) == "large"
+    assert router().fix_model({"stderr": NAME_ERROR, "retry": 3}) == "large"
+
+
+def test_override_wins():
+    assert router(fix_coding_agent="other").fix_model({"stderr": NAME_ERROR, "retry": 3}) == "other"
+
+
+def test_unreliable_cheap_model_is_skipped():
+    r = router()
+    fixes(r, "mini", 1.0, [False])
+    assert r.fix_model({"stderr": NAME_ERROR}) == "mini"
+
+    fixes(r, "mini", 1.0, [False, True])
+    assert r.fix_model({"stderr": NAME_ERROR}) == "large"
+
+
+def test_slower_cheap_model_is_skipped():
+    r = router()
+    fixes(r, "mini", 2.0, [True, False])
+    fixes(r, "large", 3.0, [True, True])
+
+    assert r.fix_model({"stderr": NAME_ERROR}) == "large"
+
+    stats = {entry["model"]: entry for entry in r.stats()}
+    assert stats["mini"]["seconds_per_success"] == pytest.approx(4.0)
+    assert stats["large"]["seconds_per_success"] == pytest.approx(3.0)
+
+
+def test_faster_cheap_model_is_kept():
+    r = router()
+    fixes(r, "mini", 1.0, [True, False])
+    fixes(r, "large", 3.0, [True, True])
+
+    assert r.fix_model({"stderr": NAME_ERROR}) == "mini"
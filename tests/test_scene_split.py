@@ -0,0 +1,76 @@
+from pathlib import Path
+
+from scene_split import scene_fingerprints, split_scenes
+
+CORPUS = Path(__file__).parent.parent / "benchmark" / "corpus"
+
+CHAINED = (CORPUS / "chained_scenes.py").read_text()
+
+
+def test_chained_scenes_are_split():
+    assert split_scenes(CHAINED) == ["Intro", "Waves"]
+
+
+def test_docstring_in_main_is_allowed():
+    code = CHAINED.replace("        Intro.construct(self)", '        """Intro, then the waves."""\n        Intro.construct(self)')
+
+    assert split_scenes(code) == ["Intro", "Waves"]
+
+
+def test_other_cleanups_end_a_segment():
+    for cleanup in ("self.clear()", "self.remove(*self.mobjects)", "self.play(*[FadeOut(m) for m in self.mobjects])"):
+        assert split_scenes(CHAINED.replace("self.play(FadeOut(*self.mobjects))", cleanup)) == ["Intro", "Waves"], cleanup
+
+
+def test_single_scene_is_not_split():
+    assert split_scenes((CORPUS / "pythagoras.py").read_text()) is None
+    assert split_scenes(CHAINED.replace("        Waves.construct(self)\n", "")) is None
+
+
+def test_refuses_when_main_does_more_than_chain():
+    assert split_scenes(CHAINED.replace("        Waves.construct(self)", "        Waves.construct(self)\n        self.wait(1)")) is None
+    assert split_scenes(CHAINED.replace("        Waves.construct(self)", "        Intro.construct(self)")) is None
+    assert split_scenes(CHAINED + "\n    def setup(self):\n        pass\n") is None
+
+
+def test_refuses_a_segment_that_leaves_mobjects_on_screen():
+    assert split_scenes(CHAINED.replace("self.play(FadeOut(*self.mobjects))", "self.play(FadeOut(title))")) is None
+
+
+def test_refuses_a_segment_that_moves_the_camera():
+    code = CHAINED.replace("class Intro(Scene)", "class Intro(MovingCameraScene)").replace("class Waves(Scene)", "class Waves(MovingCameraScene)").replace("class Main(Scene)", "class Main(MovingCameraScene)")
+    assert split_scenes(code) == ["Intro", "Waves"]
+
+    moved = code.replace("self.wait(1)", "self.play(self.camera.frame.animate.scale(0.5))", 1)
+    assert split_scenes(moved) is None
+
+
+def test_refuses_scenes_with_a_different_base():
+    assert split_scenes(CHAINED.replace("class Waves(Scene)", "class Waves(MovingCameraScene)")) is None
+
+
+def test_refuses_state_handed_through_self():
+    code = CHAINED.replace("        circle = Circle(", "        self.circle = circle = Circle(").replace("self.play(Create(axes))", "self.play(Create(axes), FadeIn(self.circle))")
+
+    assert split_scenes(code) is None
+
+
+def test_refuses_invalid_code():
+    assert split_scenes(CHAINED.replace("self.wait(2)", "self.wait(2")) is None
+
+
+def test_fingerprints_follow_each_scene():
+    before = scene_fingerprints(CHAINED, ["Intro", "Waves"])
+    after = scene_fingerprints(CHAINED.replace("self.wait(2)", "self.wait(3)"), ["Intro", "Waves"])
+
+    assert before["Intro"] == after["Intro"]
+    assert before["Waves"] != after["Waves"]
+
+
+def test_fingerprints_ignore_formatting_but_not_shared_code():
+    scenes = ["Intro", "Waves"]
+    reformatted = CHAINED.replace("        self.wait(1)\n", "        # pause\n        self.wait( 1 )\n")
+    shared = CHAINED.replace("from manim import *\n", "from manim import *\n\nconfig.background_color = WHITE\n")
+
+    assert scene_fingerprints(reformatted, scenes) == scene_fingerprints(CHAINED, scenes)
+    assert set(scene_fingerprints(shared, scenes).values()).isdisjoint(scene_fingerprints(CHAINED, scenes).values())
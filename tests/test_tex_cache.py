@@ -0,0 +1,73 @@
+import fcntl
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from sandbox.tex_cache import TexCache
+
+KB = 1024
+
+
+def formula(cache: Path, stem: str, age: int, size: int = KB) -> Path:
+    cache.mkdir(exist_ok=True)
+    svg = cache/f"{stem}.svg"
+    svg.write_bytes(os.urandom(size))
+    (cache/f"{stem}.ok").touch()
+    mtime = 1_000_000 + age
+    os.utime(svg, (mtime, mtime))
+    return svg
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(str(Path(__file__).parent.parent/"sandbox"))
+    import worker
+
+    monkeypatch.setattr(worker, "WORKDIR", str(tmp_path))
+    return worker
+
+
+def test_least_recently_used_formulas_go_first(tmp_path):
+    old = formula(tmp_path, "old", 1)
+    new = formula(tmp_path, "new", 2)
+
+    assert TexCache(tmp_path, max_bytes=KB).evict() == (1, KB)
+
+    assert not old.exists()
+    assert not (tmp_path/"old.ok").exists()
+    assert new.exists()
+
+
+def test_within_budget_nothing_goes(tmp_path):
+    formula(tmp_path, "a", 1)
+
+    assert TexCache(tmp_path, max_bytes=2 * KB).evict() is None
+    assert (tmp_path/"a.svg").exists()
+
+
+def test_formulas_being_compiled_are_kept(tmp_path):
+    busy = formula(tmp_path, "busy", 1)
+    idle = formula(tmp_path, "idle", 2)
+
+    with open(tmp_path/"busy.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        TexCache(tmp_path, max_bytes=KB).evict()
+
+    assert busy.exists()
+    assert (tmp_path/"busy.ok").exists()
+    assert not idle.exists()
+
+
+def test_worker_prunes_with_the_same_rules(tmp_path, worker, capsys):
+    cache = tmp_path/"media"/"Tex"
+    cache.mkdir(parents=True)
+    old = formula(cache, "old", 1)
+    new = formula(cache, "new", 2)
+
+    assert worker.evict_tex_cache(KB) == 0
+
+    assert not old.exists()
+    assert new.exists()
+    assert capsys.readouterr().out == "evicted 1 formulas, 0.0MB left\n"